@@ -24,7 +24,20 @@ if "%1" NEQ "" (
     set PROFILE_NAME=%1
 )
 
+REM Launch profile (second argument): default or performance
+REM Keep in sync with LAUNCH_PROFILES in task/browser_manager.py
+set LAUNCH_PROFILE=default
+if "%2" NEQ "" (
+    set LAUNCH_PROFILE=%2
+)
+
+set PROFILE_FLAGS=--disable-background-timer-throttling --disable-features=TranslateUI
+if /i "%LAUNCH_PROFILE%"=="performance" (
+    set PROFILE_FLAGS=--disable-background-timer-throttling --disable-renderer-backgrounding --disable-backgrounding-occluded-windows --disable-features=TranslateUI,CalculateNativeWinOcclusion,IntensiveWakeUpThrottling --renderer-process-limit=32
+)
+
 echo Profile: %PROFILE_NAME%
+echo Launch profile: %LAUNCH_PROFILE%
 echo User Data: %USERPROFILE%\chrome-debug
 
 set CHROME_PATH="C:\Program Files\Google\Chrome\Application\chrome.exe"
@@ -41,7 +54,7 @@ if not exist %CHROME_PATH% (
 
 REM Start Chrome with CDP
 echo Starting Chrome...
-start "" %CHROME_PATH% --remote-debugging-port=9222 --user-data-dir="%USERPROFILE%\chrome-debug" --profile-directory=%PROFILE_NAME% --no-first-run --disable-default-apps --disable-background-timer-throttling --disable-features=TranslateUI
+start "" %CHROME_PATH% --remote-debugging-port=9222 --user-data-dir="%USERPROFILE%\chrome-debug" --profile-directory=%PROFILE_NAME% --no-first-run --disable-default-apps %PROFILE_FLAGS%
 
 echo ✅ Chrome started with CDP on port 9222
 
@@ -72,12 +85,14 @@ echo Now you can run:
 echo   python task/l2-sheets-ui-edit-history.py
 echo.
 echo Profile used: %PROFILE_NAME%
+echo Launch profile: %LAUNCH_PROFILE%
 echo Chrome will stay open for CDP connections.
 echo.
 echo Usage examples:
 echo   start-chrome-cdp-simple.bat                  (Default profile)
 echo   start-chrome-cdp-simple.bat "Profile 1"     (Custom profile)
 echo   start-chrome-cdp-simple.bat "Person 1"      (Named profile)
+echo   start-chrome-cdp-simple.bat Default performance  (Parallel-tab performance profile)
 echo.
 echo Close this window or press Ctrl+C to exit.
 echo.
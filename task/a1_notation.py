@@ -0,0 +1,282 @@
+import re
+from functools import lru_cache
+from typing import Optional, List, Tuple, Dict, Any, Iterator, Iterable, Union
+
+# A1 addressing shared by the levels. Everything converts to zero-based,
+# inclusive (row, col) indices: "A1" is (0, 0), "AA10" is (9, 26).
+# Supported references: cells ("D2", "$D$2"), ranges ("B2:C3"), whole
+# columns ("D:F"), whole rows ("2:5"), open-ended ranges ("A2:B") and
+# sheet-qualified forms of all of them ("Sheet1!A1:B2", "'My sheet'!D:D").
+
+_SHEET_RE = re.compile(r"^(?:'((?:[^']|'')+)'|([^'!]+))!(.+)$")
+_PART_RE = re.compile(r"^\$?([A-Za-z]*)\$?(\d*)$")
+_PLAIN_SHEET_NAME_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+@lru_cache(maxsize=4096)
+def column_to_index(column: str) -> int:
+    """"A" -> 0, "Z" -> 25, "AA" -> 26."""
+    if not column or not column.isalpha() or not column.isascii():
+        raise ValueError(f"Invalid column: {column!r}")
+
+    number = 0
+    for char in column.upper():
+        number = number * 26 + (ord(char) - ord('A') + 1)
+    return number - 1
+
+
+@lru_cache(maxsize=4096)
+def index_to_column(index: int) -> str:
+    if index < 0:
+        raise ValueError(f"Invalid column index: {index}")
+
+    column = ""
+    number = index + 1
+    while number > 0:
+        number, remainder = divmod(number - 1, 26)
+        column = chr(ord('A') + remainder) + column
+    return column
+
+
+@lru_cache(maxsize=65536)
+def cell_to_index(cell_reference: str) -> Tuple[int, int]:
+    """Convert an A1 cell ("D2", "$D$2") to zero-based (row, col) indices."""
+    match = _PART_RE.fullmatch(cell_reference.strip())
+    if not match or not match.group(1) or not match.group(2) or int(match.group(2)) < 1:
+        raise ValueError(f"Invalid A1 cell: {cell_reference}")
+    return int(match.group(2)) - 1, column_to_index(match.group(1))
+
+
+@lru_cache(maxsize=65536)
+def index_to_cell(row: int, col: int) -> str:
+    """Convert zero-based (row, col) indices to an A1 cell."""
+    if row < 0:
+        raise ValueError(f"Invalid row index: {row}")
+    return f"{index_to_column(col)}{row + 1}"
+
+
+def format_sheet_name(sheet: str) -> str:
+    if _PLAIN_SHEET_NAME_RE.fullmatch(sheet):
+        return sheet
+    return "'" + sheet.replace("'", "''") + "'"
+
+
+class A1Range:
+    """A parsed A1 reference.
+
+    Bounds are zero-based and inclusive. An end of None means the range is
+    open in that direction: whole columns ("D:F") have end_row None, whole
+    rows ("2:5") have end_col None.
+    """
+
+    def __init__(self, start_row: int, start_col: int, end_row: Optional[int],
+                 end_col: Optional[int], sheet: Optional[str] = None):
+        if end_row is not None and end_row < start_row:
+            start_row, end_row = end_row, start_row
+        if end_col is not None and end_col < start_col:
+            start_col, end_col = end_col, start_col
+
+        self.start_row = start_row
+        self.start_col = start_col
+        self.end_row = end_row
+        self.end_col = end_col
+        self.sheet = sheet
+
+    @property
+    def is_bounded(self) -> bool:
+        return self.end_row is not None and self.end_col is not None
+
+    @property
+    def is_cell(self) -> bool:
+        return self.start_row == self.end_row and self.start_col == self.end_col
+
+    @property
+    def top_left(self) -> str:
+        return index_to_cell(self.start_row, self.start_col)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        self._require_bounded("shape")
+        return self.end_row - self.start_row + 1, self.end_col - self.start_col + 1
+
+    def _require_bounded(self, operation: str) -> None:
+        if not self.is_bounded:
+            raise ValueError(f"{operation} needs a bounded range, got {self}; use bounded() first")
+
+    def bounded(self, rows: int, cols: int) -> "A1Range":
+        """Close open ends against a grid of rows x cols."""
+        return A1Range(
+            self.start_row,
+            self.start_col,
+            rows - 1 if self.end_row is None else self.end_row,
+            cols - 1 if self.end_col is None else self.end_col,
+            self.sheet
+        )
+
+    def slices(self) -> Tuple[slice, slice]:
+        """(row_slice, col_slice) for indexing a grid, e.g. grid.iloc[rows, cols]."""
+        return (
+            slice(self.start_row, None if self.end_row is None else self.end_row + 1),
+            slice(self.start_col, None if self.end_col is None else self.end_col + 1)
+        )
+
+    def contains(self, row: int, col: int) -> bool:
+        return (self.start_row <= row and (self.end_row is None or row <= self.end_row)
+                and self.start_col <= col and (self.end_col is None or col <= self.end_col))
+
+    def cells(self) -> Iterator[str]:
+        """A1 cells of the range, row by row."""
+        self._require_bounded("cells")
+        for row in range(self.start_row, self.end_row + 1):
+            for col in range(self.start_col, self.end_col + 1):
+                yield index_to_cell(row, col)
+
+    def blocks(self, max_rows: Optional[int] = None, max_cols: Optional[int] = None) -> List["A1Range"]:
+        """Split into contiguous sub-ranges of at most max_rows x max_cols, row-major."""
+        self._require_bounded("blocks")
+        row_step = max_rows or (self.end_row - self.start_row + 1)
+        col_step = max_cols or (self.end_col - self.start_col + 1)
+
+        return [
+            A1Range(
+                row,
+                col,
+                min(row + row_step - 1, self.end_row),
+                min(col + col_step - 1, self.end_col),
+                self.sheet
+            )
+            for row in range(self.start_row, self.end_row + 1, row_step)
+            for col in range(self.start_col, self.end_col + 1, col_step)
+        ]
+
+    def __str__(self) -> str:
+        whole_columns = self.end_row is None and self.start_row == 0
+        whole_rows = self.end_col is None and self.start_col == 0
+
+        start = ("" if whole_rows else index_to_column(self.start_col)) + \
+                ("" if whole_columns else str(self.start_row + 1))
+        if self.is_cell:
+            reference = start
+        else:
+            end = ("" if self.end_col is None else index_to_column(self.end_col)) + \
+                  ("" if self.end_row is None else str(self.end_row + 1))
+            reference = f"{start}:{end}"
+
+        if self.sheet:
+            return f"{format_sheet_name(self.sheet)}!{reference}"
+        return reference
+
+    def __repr__(self) -> str:
+        return f"A1Range({str(self)!r})"
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, A1Range):
+            return NotImplemented
+        return (self.start_row, self.start_col, self.end_row, self.end_col, self.sheet) == \
+               (other.start_row, other.start_col, other.end_row, other.end_col, other.sheet)
+
+    def __hash__(self) -> int:
+        return hash((self.start_row, self.start_col, self.end_row, self.end_col, self.sheet))
+
+
+def _parse_part(part: str, reference: str) -> Tuple[Optional[int], Optional[int]]:
+    match = _PART_RE.fullmatch(part.strip())
+    if not match or not (match.group(1) or match.group(2)):
+        raise ValueError(f"Invalid A1 reference: {reference}")
+    letters, digits = match.groups()
+    if digits and int(digits) < 1:
+        raise ValueError(f"Invalid A1 reference: {reference}")
+    return (int(digits) - 1 if digits else None), (column_to_index(letters) if letters else None)
+
+
+@lru_cache(maxsize=4096)
+def parse_range(reference: str) -> A1Range:
+    """Parse any supported A1 reference into an A1Range."""
+    text = reference.strip()
+    sheet = None
+
+    match = _SHEET_RE.fullmatch(text)
+    if match:
+        quoted, plain, text = match.groups()
+        sheet = quoted.replace("''", "'") if quoted is not None else plain.strip()
+
+    parts = text.split(":")
+    if len(parts) > 2:
+        raise ValueError(f"Invalid A1 reference: {reference}")
+
+    start_row, start_col = _parse_part(parts[0], reference)
+    if len(parts) == 1:
+        if start_row is None or start_col is None:
+            raise ValueError(f"Invalid A1 reference: {reference}")
+        return A1Range(start_row, start_col, start_row, start_col, sheet)
+
+    end_row, end_col = _parse_part(parts[1], reference)
+
+    # "D:F" and "2:5" leave one dimension out entirely
+    if start_row is None and end_row is None:
+        return A1Range(0, start_col if start_col is not None else 0, None, end_col, sheet)
+    if start_col is None and end_col is None:
+        return A1Range(start_row, 0, end_row, None, sheet)
+    if start_row is None or start_col is None:
+        raise ValueError(f"Invalid A1 reference: {reference}")
+
+    return A1Range(start_row, start_col, end_row, end_col, sheet)
+
+
+def expand_ranges(ranges: Union[str, Iterable[str]]) -> List[str]:
+    """Expand A1 cells and ranges ("D2", "D2:D50", "B2:C3") into a list of cells.
+
+    Accepts a list or a comma separated string. Order is preserved and
+    duplicates are dropped. Open-ended ranges cannot be expanded.
+    """
+    if isinstance(ranges, str):
+        ranges = ranges.split(',')
+
+    cells, seen = [], set()
+    for reference in ranges:
+        if not reference.strip():
+            continue
+        for cell in parse_range(reference).cells():
+            if cell not in seen:
+                seen.add(cell)
+                cells.append(cell)
+    return cells
+
+
+def group_cells_into_blocks(cell_values: Dict[str, Any]) -> List[Tuple[str, List[List[Any]]]]:
+    """Group {A1: value} into rectangular blocks of adjacent cells.
+
+    Each row is split into runs of consecutive columns, then runs spanning
+    the same columns on consecutive rows are stacked. Returns a list of
+    (top_left, rows_of_values) ready for a range write.
+    """
+    by_row: Dict[int, Dict[int, Any]] = {}
+    for cell_reference, value in cell_values.items():
+        row, col = cell_to_index(cell_reference)
+        by_row.setdefault(row, {})[col] = value
+
+    runs = []
+    for row in sorted(by_row):
+        columns = sorted(by_row[row])
+        start = previous = columns[0]
+        for col in columns[1:] + [None]:
+            if col is not None and col == previous + 1:
+                previous = col
+                continue
+            runs.append((row, start, previous, [by_row[row][c] for c in range(start, previous + 1)]))
+            if col is not None:
+                start = previous = col
+
+    blocks = []
+    open_blocks = {}
+    for row, first_col, last_col, values in runs:
+        block = open_blocks.get((first_col, last_col))
+        if block is not None and block["last_row"] == row - 1:
+            block["rows"].append(values)
+            block["last_row"] = row
+        else:
+            block = {"top": row, "left": first_col, "last_row": row, "rows": [values]}
+            open_blocks[(first_col, last_col)] = block
+            blocks.append(block)
+
+    return [(index_to_cell(block["top"], block["left"]), block["rows"]) for block in blocks]
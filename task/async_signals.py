@@ -0,0 +1,32 @@
+import asyncio
+from typing import Optional, Dict, Awaitable
+
+# Confirmation by racing several independent signals (a network response, a
+# UI indicator, ...) under one deadline, instead of sleeping a fixed time.
+
+async def first_signal(signals: Dict[str, Awaitable], deadline_ms: float) -> Optional[str]:
+    """Return the name of the first signal that completes without error before the deadline, or None.
+
+    Signals that fail (e.g. a wait that times out on its own) are ignored;
+    whatever is still pending at the end is cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + deadline_ms / 1000
+    tasks = {asyncio.ensure_future(signal): name for name, signal in signals.items()}
+    pending = set(tasks)
+
+    try:
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None:
+                    return tasks[task]
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,72 @@
+import sys
+import asyncio
+from datetime import datetime
+from browser_manager import BrowserManager
+
+# Each tab runs a timer-driven loop (the same kind of work Sheets/Gmail do while
+# we wait on them) and reports how many ticks it managed in the time window.
+TIMER_WORKLOAD_JS = """
+async (durationMs) => {
+    const end = performance.now() + durationMs;
+    let ticks = 0;
+    while (performance.now() < end) {
+        await new Promise(resolve => setTimeout(resolve, 10));
+        ticks++;
+    }
+    return ticks;
+}
+"""
+
+# Port that is not used by the CDP browser, so BrowserManager launches a fresh
+# Chrome with the profile's flags instead of attaching to an existing one.
+BENCH_CDP_PORT = 9333
+
+
+async def run_parallel_tabs(profile, tabs, duration_ms, headless):
+    manager = BrowserManager(BENCH_CDP_PORT, debug=False, profile=profile)
+    await manager.setup_browser(headless=headless)
+
+    try:
+        pages = [manager.get_page()]
+        for _ in range(tabs - 1):
+            pages.append(await manager.new_page())
+
+        for page in pages:
+            await page.goto("about:blank")
+
+        # Only the last tab is in front, the others are background tabs
+        await pages[-1].bring_to_front()
+
+        started = datetime.now()
+        ticks = await asyncio.gather(*[
+            page.evaluate(TIMER_WORKLOAD_JS, duration_ms) for page in pages
+        ])
+        elapsed = (datetime.now() - started).total_seconds()
+
+        return ticks, elapsed
+    finally:
+        await manager.cleanup_browser(keep_browser_open=False)
+
+
+async def main():
+    tabs = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    duration_ms = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    headless = "--headless" in sys.argv
+
+    print(f"🏁 Parallel tab benchmark: {tabs} tabs, {duration_ms}ms timer workload")
+
+    results = {}
+    for profile in ["default", "performance"]:
+        ticks, elapsed = await run_parallel_tabs(profile, tabs, duration_ms, headless)
+        results[profile] = sum(ticks) / elapsed
+
+        print(f"\n📊 Profile: {profile}")
+        for i, tab_ticks in enumerate(ticks):
+            print(f"  tab {i + 1}: {tab_ticks} ticks ({tab_ticks / elapsed:.1f}/s)")
+        print(f"  total throughput: {results[profile]:.1f} ticks/s")
+
+    if results["default"]:
+        print(f"\n⚡ Speed-up with performance profile: {results['performance'] / results['default']:.2f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+import sys
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from snapshot_history import SnapshotHistoryBackend, diff_grids
+
+# Offline benchmark of the snapshot diff backend on generated sheets.
+# Usage: python bench-snapshot-diff.py [rows] [cols] [snapshots] [change_ratio]
+
+
+def make_snapshots(rows, cols, count, change_ratio, seed=7):
+    rng = np.random.default_rng(seed)
+    grid = rng.integers(0, 1_000_000, size=(rows, cols)).astype(str).astype(object)
+    snapshots = [pd.DataFrame(grid.copy())]
+
+    for _ in range(count - 1):
+        changed = rng.random((rows, cols)) < change_ratio
+        grid = grid.copy()
+        grid[changed] = rng.integers(0, 1_000_000, size=int(changed.sum())).astype(str)
+        snapshots.append(pd.DataFrame(grid))
+
+    return snapshots
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    cols = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    count = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    change_ratio = float(sys.argv[4]) if len(sys.argv) > 4 else 0.01
+
+    print(f"🏁 Snapshot diff benchmark: {rows}x{cols} = {rows * cols:,} cells, "
+          f"{count} snapshots, {change_ratio:.1%} changed per snapshot")
+
+    snapshots = make_snapshots(rows, cols, count, change_ratio)
+
+    started = time.perf_counter()
+    changed_cells = 0
+    for previous, current in zip(snapshots, snapshots[1:]):
+        changed_cells += len(diff_grids(previous, current)[0])
+    diff_seconds = time.perf_counter() - started
+    pairs = count - 1
+    print(f"  diff_grids: {diff_seconds / pairs * 1000:.1f} ms per snapshot pair "
+          f"({changed_cells:,} changed cells in total)")
+
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        backend = SnapshotHistoryBackend(
+            "https://docs.google.com/spreadsheets/d/benchmark/edit",
+            snapshot_dir=snapshot_dir
+        )
+        taken_at = datetime(2025, 1, 1)
+        for snapshot in snapshots:
+            backend.save_snapshot(snapshot, taken_at)
+            taken_at += timedelta(hours=1)
+
+        started = time.perf_counter()
+        results = backend.compute_cell_results()
+        full_seconds = time.perf_counter() - started
+        print(f"  compute_cell_results (all cells, incl. CSV load): {full_seconds:.2f} s "
+              f"-> {len(results):,} cells with history")
+
+        started = time.perf_counter()
+        backend.compute_cell_results(["D2", "D7"])
+        selected_seconds = time.perf_counter() - started
+        print(f"  compute_cell_results (D2, D7): {selected_seconds:.2f} s")
+
+if __name__ == "__main__":
+    main()
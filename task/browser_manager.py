@@ -11,11 +11,39 @@ load_dotenv()
 class BrowserManagerError(Exception):
     pass
 
+# Named Chrome launch profiles. "performance" keeps background tabs running at
+# full speed so several Sheets/Gmail tabs can work in parallel; the same flags
+# are used by start-chrome-cdp-simple.bat when it is started with "performance".
+LAUNCH_PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {
+        "args": [],
+        "focus_emulation": False,
+    },
+    "performance": {
+        "args": [
+            "--disable-background-timer-throttling",
+            "--disable-renderer-backgrounding",
+            "--disable-backgrounding-occluded-windows",
+            "--disable-features=CalculateNativeWinOcclusion,IntensiveWakeUpThrottling",
+            # Keep one renderer per tab instead of folding same-site tabs into
+            # a shared process once Chrome's memory-based limit is reached.
+            "--renderer-process-limit=32",
+        ],
+        "focus_emulation": True,
+    },
+}
+
 class BrowserManager:
-    def __init__(self, cdp_port: int = 9222, debug: bool = True):
+    def __init__(self, cdp_port: int = 9222, debug: bool = True, profile: Optional[str] = None):
         self.cdp_port = cdp_port
         self.debug = debug
         
+        self.profile = profile or os.getenv('LAUNCH_PROFILE', 'default')
+        if self.profile not in LAUNCH_PROFILES:
+            raise BrowserManagerError(
+                f"Unknown launch profile '{self.profile}' (available: {', '.join(LAUNCH_PROFILES)})"
+            )
+        
         self.playwright: Optional[Playwright] = None
         self.browser: Optional[Browser] = None
         self.context: Optional[BrowserContext] = None
@@ -23,6 +51,7 @@ class BrowserManager:
         
         # State tracking
         self.is_connected = False
+        self.setup_lock = asyncio.Lock()
         self.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
         self.screenshot_counter = 0
         
@@ -31,7 +60,7 @@ class BrowserManager:
         self.default_wait_time = 3000
         
         if self.debug:
-            print(f"🎯 BrowserManager initialized (Session: {self.session_id})")
+            print(f"🎯 BrowserManager initialized (Session: {self.session_id}, Profile: {self.profile})")
     
     def _log(self, message: str, level: str = "INFO") -> None:
         if self.debug:
@@ -68,9 +97,23 @@ class BrowserManager:
             return False
     
     async def setup_browser(self, new_page: bool = False, headless: bool = False) -> bool:
+        """Connect to (or launch) the browser once; later calls reuse the live session.
+        
+        Safe to call from every level or stage sharing this manager: only the
+        first call connects, concurrent callers wait for it.
+        """
+        async with self.setup_lock:
+            if self.is_browser_ready() and not self.page.is_closed():
+                return True
+            return await self._connect_browser(new_page, headless)
+    
+    async def _connect_browser(self, new_page: bool, headless: bool) -> bool:
         try:
             self._log("Setting up browser connection...")
             
+            # A page from an earlier, cleaned-up connection is not usable
+            self.page = None
+            
             self.playwright = await async_playwright().start()
             
             cdp_available = await self.check_cdp_connection()
@@ -81,7 +124,13 @@ class BrowserManager:
                     f"http://localhost:{self.cdp_port}"
                 )
                 self._log("Connected to existing browser via CDP", "SUCCESS")
-                
+                if LAUNCH_PROFILES[self.profile]["args"]:
+                    self._log(
+                        f"Launch flags of profile '{self.profile}' only apply if Chrome was started with them "
+                        f"(start-chrome-cdp-simple.bat <profile> {self.profile})",
+                        "INFO"
+                    )
+
                 # Get context and page with error handling
                 try:
                     if len(self.browser.contexts) > 0:
@@ -114,9 +163,12 @@ class BrowserManager:
             else:
                 # Launch new browser
                 self._log("Launching new browser instance...", "INFO")
+                launch_args = list(LAUNCH_PROFILES[self.profile]["args"])
+                if not headless:
+                    launch_args.insert(0, f'--remote-debugging-port={self.cdp_port}')
                 self.browser = await self.playwright.chromium.launch(
                     headless=headless,
-                    args=['--remote-debugging-port=9222'] if not headless else []
+                    args=launch_args
                 )
                 self.context = await self.browser.new_context()
                 self.page = await self.context.new_page()
@@ -133,6 +185,8 @@ class BrowserManager:
             except Exception as e:
                 self._log(f"Page configuration failed: {e}", "WARNING")
             
+            await self.apply_page_profile(self.page)
+            
             self.is_connected = True
             self._log("Browser setup completed", "SUCCESS")
             return True
@@ -143,18 +197,51 @@ class BrowserManager:
             await self._cleanup_on_error()
             raise BrowserManagerError(f"Failed to setup browser: {e}")
     
-    async def navigate_to_url(self, url: str, wait_time: Optional[int] = None) -> bool:
+    async def apply_page_profile(self, page: Page) -> bool:
+        """Apply the per-page part of the launch profile.
+        
+        Launch flags only take effect when Chrome is started with them, so for
+        an existing CDP browser this is the part of the profile we can still
+        apply: focus emulation makes every tab behave like the focused one.
+        """
+        if not LAUNCH_PROFILES[self.profile]["focus_emulation"]:
+            return False
+        
+        try:
+            cdp_session = await page.context.new_cdp_session(page)
+            await cdp_session.send("Emulation.setFocusEmulationEnabled", {"enabled": True})
+            await cdp_session.send("Page.enable")
+            await cdp_session.send("Page.setWebLifecycleState", {"state": "active"})
+            self._log(f"Applied '{self.profile}' profile to page", "DEBUG")
+            return True
+        except Exception as e:
+            self._log(f"Could not apply page profile: {e}", "WARNING")
+            return False
+    
+    async def new_page(self) -> Page:
+        """Open an extra tab in the current context for parallel work."""
+        if not self.is_browser_ready() or not self.context:
+            raise BrowserManagerError("Browser not ready. Call setup_browser() first.")
+        
+        page = await self.context.new_page()
+        page.set_default_timeout(self.default_timeout)
+        await self.apply_page_profile(page)
+        return page
+    
+    async def navigate_to_url(self, url: str, wait_time: Optional[int] = None,
+                              page: Optional[Page] = None) -> bool:
         if not self.is_browser_ready():
             raise BrowserManagerError("Browser not ready. Call setup_browser() first.")
         
+        page = page or self.page
         try:
             wait_time = wait_time or self.default_wait_time
             self._log(f"Navigating to: {url}")
             
-            await self.page.goto(url, timeout=self.default_timeout)
-            await self.page.wait_for_timeout(wait_time)
+            await page.goto(url, timeout=self.default_timeout)
+            await page.wait_for_timeout(wait_time)
             
-            current_url = self.page.url
+            current_url = page.url
             if url in current_url or current_url.startswith(url.split('?')[0]):
                 self._log(f"Navigation successful to: {current_url}", "SUCCESS")
                 return True
@@ -250,6 +337,86 @@ class BrowserManager:
             self._log(f"Fill failed on {selector}: {e}", "ERROR")
             return False
     
+    @staticmethod
+    def _same_text(actual: str, expected: str) -> bool:
+        # innerText turns newlines/nbsp into layout-specific whitespace
+        return " ".join((actual or "").split()) == " ".join((expected or "").split())
+    
+    async def read_field_text(self, element) -> str:
+        return await element.evaluate(
+            "(el) => (typeof el.value === 'string') ? el.value : (el.innerText || el.textContent || '')"
+        )
+    
+    async def insert_text(self, text: str, element=None, page: Optional[Page] = None) -> bool:
+        """Insert text into the focused field in one go, typing only as a fallback.
+        
+        Uses CDP Input.insertText (a single input event for the whole string)
+        instead of one key event per character. When element is given, its
+        content is read back; on mismatch the field is cleared and the text is
+        typed key by key.
+        """
+        page = page or self.page
+        try:
+            await page.keyboard.insert_text(text)
+            if element is None or self._same_text(await self.read_field_text(element), text):
+                return True
+            self._log("Bulk insert could not be verified, falling back to typing", "WARNING")
+        except Exception as e:
+            self._log(f"Bulk insert failed, falling back to typing: {e}", "WARNING")
+        
+        try:
+            await page.keyboard.press('Control+a')
+            await page.keyboard.type(text)
+            if element is None:
+                return True
+            return self._same_text(await self.read_field_text(element), text)
+        except Exception as e:
+            self._log(f"Typing fallback failed: {e}", "ERROR")
+            return False
+    
+    async def paste_text(self, text: str, html: Optional[str] = None, page: Optional[Page] = None) -> bool:
+        """Paste text into the focused element as a single clipboard operation.
+        
+        Writes the system clipboard and presses Ctrl+V. If clipboard access is
+        refused, a synthetic paste event carrying the same data is dispatched
+        on the focused element instead. html, when given, is offered as the
+        text/html flavour alongside text/plain.
+        """
+        page = page or self.page
+        try:
+            origin = "/".join(page.url.split("/")[:3])
+            await page.context.grant_permissions(["clipboard-read", "clipboard-write"], origin=origin)
+            await page.evaluate(
+                """async ([text, html]) => {
+                    const items = {'text/plain': new Blob([text], {type: 'text/plain'})};
+                    if (html) items['text/html'] = new Blob([html], {type: 'text/html'});
+                    await navigator.clipboard.write([new ClipboardItem(items)]);
+                }""",
+                [text, html]
+            )
+            await page.keyboard.press('Control+v')
+            return True
+        except Exception as e:
+            self._log(f"Clipboard paste unavailable, dispatching paste event: {e}", "WARNING")
+        
+        try:
+            return await page.evaluate(
+                """([text, html]) => {
+                    const target = document.activeElement || document.body;
+                    const data = new DataTransfer();
+                    data.setData('text/plain', text);
+                    if (html) data.setData('text/html', html);
+                    target.dispatchEvent(new ClipboardEvent('paste', {
+                        clipboardData: data, bubbles: true, cancelable: true
+                    }));
+                    return true;
+                }""",
+                [text, html]
+            )
+        except Exception as e:
+            self._log(f"Paste event failed: {e}", "ERROR")
+            return False
+    
     def is_browser_ready(self) -> bool:
         return self.is_connected and self.page is not None
     
@@ -290,15 +457,16 @@ class BrowserManager:
 
 class BrowserContext:
     def __init__(self, cdp_port: int = 9222, new_page: bool = False, 
-                 keep_open: bool = True, debug: bool = True):
+                 keep_open: bool = True, debug: bool = True, profile: Optional[str] = None):
         self.cdp_port = cdp_port
         self.new_page = new_page
         self.keep_open = keep_open
         self.debug = debug
+        self.profile = profile
         self.manager: Optional[BrowserManager] = None
     
     async def __aenter__(self) -> BrowserManager:
-        self.manager = BrowserManager(self.cdp_port, self.debug)
+        self.manager = BrowserManager(self.cdp_port, self.debug, self.profile)
         await self.manager.setup_browser(self.new_page)
         return self.manager
     
@@ -309,8 +477,8 @@ class BrowserContext:
 
 # Convenience functions
 async def get_browser_manager(cdp_port: int = 9222, new_page: bool = False, 
-                            debug: bool = True) -> BrowserManager:
-    manager = BrowserManager(cdp_port, debug)
+                            debug: bool = True, profile: Optional[str] = None) -> BrowserManager:
+    manager = BrowserManager(cdp_port, debug, profile)
     
     if not await manager.check_cdp_connection():
         raise BrowserManagerError(f"No browser found on CDP port {cdp_port}")
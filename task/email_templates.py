@@ -0,0 +1,151 @@
+import os
+import html
+from string import Formatter
+from typing import Optional, Dict, Any, List, Tuple
+
+# L3 email templates. A template lives in templates/<name>.txt (plain text)
+# with an optional templates/<name>.html variant, and uses {placeholder}
+# names from TEMPLATE_FIELDS. Templates are parsed once into literal/field
+# segments, so rendering a record is a single join.
+
+# placeholder -> (source, key, default); source is "record" (L1 row) or
+# "history" (L2 data). A default of None makes the field required.
+TEMPLATE_FIELDS = {
+    "user_name": ("record", "User Name", "User"),
+    "email": ("record", "Email", None),
+    "subject": ("record", "Subject", ""),
+    "content_prev": ("history", "content_prev", None),
+    "requirements_prev": ("history", "requirements_prev", None),
+    "timestamp_prev": ("history", "timestamp_prev", ""),
+    "requirements_timestamp_prev": ("history", "requirements_timestamp_prev", ""),
+}
+
+class TemplateError(Exception):
+    pass
+
+
+def default_template_dir():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(current_dir), "templates")
+
+
+def _html_value(value: str) -> str:
+    return html.escape(value).replace("\n", "<br>\n")
+
+
+class CompiledTemplate:
+    """One template variant split into literal text and placeholder slots."""
+
+    def __init__(self, source: str, escape=None):
+        self.literals: List[str] = []
+        self.fields: List[str] = []
+        self.escape = escape
+
+        literal = []
+        try:
+            for text, field_name, format_spec, conversion in Formatter().parse(source):
+                literal.append(text)
+                if field_name is None:
+                    continue
+                if format_spec or conversion:
+                    raise TemplateError(f"Placeholder {{{field_name}}} must not use format specs or conversions")
+                if field_name not in TEMPLATE_FIELDS:
+                    raise TemplateError(f"Unknown placeholder {{{field_name}}} "
+                                        f"(available: {', '.join(sorted(TEMPLATE_FIELDS))})")
+                self.literals.append("".join(literal))
+                self.fields.append(field_name)
+                literal = []
+        except ValueError as e:
+            raise TemplateError(f"Malformed template: {e}")
+        self.literals.append("".join(literal))
+
+    def render(self, values: Dict[str, str]) -> str:
+        parts = [self.literals[0]]
+        for field_name, literal in zip(self.fields, self.literals[1:]):
+            value = values[field_name]
+            parts.append(self.escape(value) if self.escape else value)
+            parts.append(literal)
+        return "".join(parts)
+
+
+class EmailTemplate:
+    def __init__(self, text: str, html_source: Optional[str] = None, name: str = "inline"):
+        self.name = name
+        self.text = CompiledTemplate(text)
+        self.html = CompiledTemplate(html_source, escape=_html_value) if html_source is not None else None
+
+        used = set(self.text.fields) | set(self.html.fields if self.html else [])
+        self.fields = [field_name for field_name in TEMPLATE_FIELDS if field_name in used]
+
+    @classmethod
+    def load(cls, name: Optional[str] = None, template_dir: Optional[str] = None) -> "EmailTemplate":
+        name = name or os.getenv('EMAIL_TEMPLATE', 'default')
+        template_dir = template_dir or default_template_dir()
+
+        text_path = os.path.join(template_dir, f"{name}.txt")
+        if not os.path.exists(text_path):
+            raise TemplateError(f"Template not found: {text_path}")
+        with open(text_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+
+        html_source = None
+        html_path = os.path.join(template_dir, f"{name}.html")
+        if os.path.exists(html_path):
+            with open(html_path, 'r', encoding='utf-8') as f:
+                html_source = f.read().rstrip("\n")
+
+        return cls(text.rstrip("\n"), html_source, name)
+
+    def _field_values(self, fields, record, history) -> Tuple[Dict[str, str], List[str]]:
+        values, missing = {}, []
+        for field_name in fields:
+            source, key, default = TEMPLATE_FIELDS[field_name]
+            value = (record if source == "record" else history).get(key)
+            if value is None or value == "":
+                if default is None:
+                    missing.append(field_name)
+                    value = ""
+                else:
+                    value = default
+            values[field_name] = str(value)
+        return values, missing
+
+    def validate(self, records: List[Dict[str, Any]], history: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """One problem entry per record with required fields missing; empty when all render."""
+        history = history or {}
+        history_fields = [f for f in self.fields if TEMPLATE_FIELDS[f][0] == "history"]
+        record_fields = [f for f in self.fields if TEMPLATE_FIELDS[f][0] == "record"]
+
+        # History is shared by every record, so it is checked once
+        _, history_missing = self._field_values(history_fields, {}, history)
+
+        problems = []
+        for index, record in enumerate(records):
+            _, missing = self._field_values(record_fields, record, history)
+            if missing or history_missing:
+                problems.append({
+                    "index": index,
+                    "email": record.get('Email', ''),
+                    "missing": missing + history_missing
+                })
+        return problems
+
+    def render(self, record: Dict[str, Any], history: Dict[str, Any]) -> Dict[str, Optional[str]]:
+        return self.render_batch([record], history)[0]
+
+    def render_batch(self, records: List[Dict[str, Any]], history: Dict[str, Any]) -> List[Dict[str, Optional[str]]]:
+        """Render text (and html when the template has it) for every record in one pass."""
+        history = history or {}
+        history_fields = [f for f in self.fields if TEMPLATE_FIELDS[f][0] == "history"]
+        record_fields = [f for f in self.fields if TEMPLATE_FIELDS[f][0] == "record"]
+        shared_values, _ = self._field_values(history_fields, {}, history)
+
+        rendered = []
+        for record in records:
+            values, _ = self._field_values(record_fields, record, history)
+            values.update(shared_values)
+            rendered.append({
+                "text": self.text.render(values),
+                "html": self.html.render(values) if self.html else None
+            })
+        return rendered
@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+# Local cache of captured edit history. An entry is keyed by sheet, cell and a
+# hash of the cell's current value (from the CSV export), so a cell whose value
+# has not changed since the last capture can skip the blame view entirely.
+
+class EditHistoryCache:
+    def __init__(self, path: Optional[str] = None, ttl_seconds: int = 24 * 3600,
+                 max_entries: int = 5000):
+        if path is None:
+            current_dir = os.path.dirname(os.path.abspath(__file__))
+            path = os.path.join(os.path.dirname(current_dir), "data", "history_cache.json")
+
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        # Least recently used entries first
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.load()
+
+    @staticmethod
+    def fingerprint(value) -> str:
+        return hashlib.sha256(str(value).encode('utf-8')).hexdigest()[:16]
+
+    def _key(self, sheet_id, cell_reference, value) -> str:
+        return f"{sheet_id}:{cell_reference.upper()}:{self.fingerprint(value)}"
+
+    def get(self, sheet_id, cell_reference, value) -> Optional[Dict[str, Any]]:
+        key = self._key(sheet_id, cell_reference, value)
+        entry = self.entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if time.time() - entry["stored_at"] > self.ttl_seconds:
+            del self.entries[key]
+            self.evictions += 1
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry["result"]
+
+    def put(self, sheet_id, cell_reference, value, result: Dict[str, Any]) -> None:
+        key = self._key(sheet_id, cell_reference, value)
+        self.entries[key] = {"stored_at": time.time(), "result": result}
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+
+            now = time.time()
+            for key, entry in stored.get("entries", []):
+                if now - entry["stored_at"] <= self.ttl_seconds:
+                    self.entries[key] = entry
+        except Exception as e:
+            print(f"⚠️ Could not load history cache, starting empty: {e}")
+            self.entries.clear()
+
+    def save(self) -> bool:
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+            # Write to a temp file first so a crash never leaves a corrupt cache
+            temp_path = self.path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({"entries": list(self.entries.items())}, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+            return True
+        except Exception as e:
+            print(f"⚠️ Could not save history cache: {e}")
+            return False
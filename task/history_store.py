@@ -0,0 +1,246 @@
+import os
+import sqlite3
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Iterable
+from history_timestamps import parse_history_timestamp, is_relative_timestamp
+
+# Append-only store for captured edit history. Every capture adds rows; nothing
+# is overwritten, and consumers query the latest entry per cell or the changes
+# since a point in time through indexes instead of reloading a JSON file.
+
+# Legacy history.json fields that L3/L4 read, derived from fixed cells
+LEGACY_HISTORY_FIELDS = {
+    "D2": ("content_prev", "timestamp_prev", "No previous content found"),
+    "D7": ("requirements_prev", "requirements_timestamp_prev", "No previous requirements found"),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history_entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sheet_id TEXT NOT NULL,
+    cell TEXT NOT NULL,
+    revision INTEGER NOT NULL DEFAULT 0,
+    author TEXT NOT NULL DEFAULT '',
+    content TEXT NOT NULL DEFAULT '',
+    timestamp_raw TEXT NOT NULL DEFAULT '',
+    timestamp_normalized TEXT,
+    sort_time TEXT NOT NULL,
+    captured_at TEXT NOT NULL,
+    source TEXT NOT NULL DEFAULT '',
+    time_key TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_history_cell_time
+    ON history_entries (sheet_id, cell, sort_time);
+CREATE INDEX IF NOT EXISTS idx_history_sheet_time
+    ON history_entries (sheet_id, sort_time);
+"""
+
+ENTRY_COLUMNS = [
+    "sheet_id", "cell", "revision", "author", "content", "timestamp_raw",
+    "timestamp_normalized", "sort_time", "captured_at", "source", "time_key"
+]
+
+# An entry is stored once per (sheet_id, cell, author, content, time_key).
+# time_key is the parsed time of an absolute timestamp, so "Today, 09:15" and
+# "Sep 20, 9:15 AM" for the same edit match. Relative ("2 hours ago") and
+# unparsable timestamps name no fixed time: their time_key is "", so they are
+# keyed on author and content alone and sort after dated entries.
+# Version 2 replaced the (sheet_id, cell, timestamp_raw, content) key.
+SCHEMA_VERSION = 2
+
+def build_history_payload(cell_results: Dict[str, Dict[str, Any]], method: str,
+                          sheet_url: str, session_id: str) -> Dict[str, Any]:
+    """history.json payload from cell-keyed results, shared by all L2 backends.
+
+    The legacy D2/D7 fields are kept so L3/L4 keep working unchanged.
+    """
+    history_data = {"cells": cell_results}
+
+    for cell_reference, (content_key, timestamp_key, missing_text) in LEGACY_HISTORY_FIELDS.items():
+        if cell_reference in cell_results:
+            result = cell_results[cell_reference]
+            history_data[content_key] = result.get("content") or missing_text
+            history_data[timestamp_key] = result.get("timestamp") or "No timestamp found"
+
+    history_data.update({
+        "capture_date": datetime.now().isoformat(),
+        "method": method,
+        "session_id": session_id,
+        "sheet_url": sheet_url
+    })
+    return history_data
+
+def default_store_path():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(current_dir), "data", "history.sqlite3")
+
+
+class HistoryStore:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or default_store_path()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self.connection = sqlite3.connect(self.path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def _migrate(self) -> None:
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+
+        columns = {row["name"] for row in self.connection.execute("PRAGMA table_info(history_entries)")}
+        with self.connection:
+            if "time_key" not in columns:
+                self.connection.execute("ALTER TABLE history_entries ADD COLUMN time_key TEXT NOT NULL DEFAULT ''")
+                rows = self.connection.execute(
+                    "SELECT id, timestamp_raw, timestamp_normalized FROM history_entries"
+                ).fetchall()
+                self.connection.executemany(
+                    "UPDATE history_entries SET time_key = ? WHERE id = ?",
+                    [(self._time_key(row["timestamp_raw"], row["timestamp_normalized"]), row["id"]) for row in rows]
+                )
+
+            # Keep the first capture of entries the old key stored repeatedly
+            self.connection.execute(
+                """
+                DELETE FROM history_entries WHERE id NOT IN (
+                    SELECT MIN(id) FROM history_entries GROUP BY sheet_id, cell, author, content, time_key
+                )
+                """
+            )
+            self.connection.execute("DROP INDEX IF EXISTS idx_history_unique")
+            self.connection.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_history_entry "
+                "ON history_entries (sheet_id, cell, author, content, time_key)"
+            )
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @staticmethod
+    def _time_key(timestamp_raw: str, normalized: Optional[str]) -> str:
+        if not normalized or is_relative_timestamp(timestamp_raw):
+            return ""
+        return normalized
+
+    def _normalize(self, entry: Dict[str, Any], captured_at: datetime) -> tuple:
+        # Timestamps are parsed once, here, relative to when they were captured
+        timestamp_raw = (entry.get("timestamp") or "").strip()
+        parsed = parse_history_timestamp(timestamp_raw, now=captured_at)
+        normalized = parsed.isoformat() if parsed else None
+
+        return (
+            entry["sheet_id"],
+            entry["cell"].upper(),
+            entry.get("revision", 0),
+            entry.get("author", "") or "",
+            entry.get("content", "") or "",
+            timestamp_raw,
+            normalized,
+            normalized or captured_at.isoformat(),
+            captured_at.isoformat(),
+            entry.get("source", "") or "",
+            self._time_key(timestamp_raw, normalized)
+        )
+
+    def add_entries(self, entries: Iterable[Dict[str, Any]],
+                    captured_at: Optional[datetime] = None) -> int:
+        """Insert a batch of entries in one transaction; returns rows added.
+
+        Each entry needs sheet_id and cell, plus optional content, timestamp,
+        author, revision and source. Entries already stored are ignored.
+        """
+        captured_at = captured_at or datetime.now()
+        rows = [self._normalize(entry, captured_at) for entry in entries]
+        if not rows:
+            return 0
+
+        with self.connection:
+            before = self.connection.total_changes
+            self.connection.executemany(
+                f"INSERT OR IGNORE INTO history_entries ({', '.join(ENTRY_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in ENTRY_COLUMNS)})",
+                rows
+            )
+            return self.connection.total_changes - before
+
+    def add_cell_results(self, sheet_id: str, cell_results: Dict[str, Dict[str, Any]],
+                         captured_at: Optional[datetime] = None, source: str = "") -> int:
+        """Store L2 cell-keyed results, skipping cells that found no history."""
+        entries = [
+            {"sheet_id": sheet_id, "cell": cell_reference, "source": source, **result}
+            for cell_reference, result in cell_results.items()
+            if result.get("content") or result.get("timestamp")
+        ]
+        return self.add_entries(entries, captured_at)
+
+    def latest_per_cell(self, sheet_id: str) -> Dict[str, Dict[str, Any]]:
+        rows = self.connection.execute(
+            """
+            SELECT * FROM (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY cell ORDER BY time_key = '', sort_time DESC, id DESC
+                ) AS position
+                FROM history_entries WHERE sheet_id = ?
+            ) WHERE position = 1
+            """,
+            (sheet_id,)
+        ).fetchall()
+        return {row["cell"]: self._row_to_entry(row) for row in rows}
+
+    def changes_since(self, sheet_id: str, since: datetime,
+                      cell: Optional[str] = None) -> List[Dict[str, Any]]:
+        query = "SELECT * FROM history_entries WHERE sheet_id = ? AND sort_time >= ?"
+        params = [sheet_id, since.isoformat()]
+        if cell:
+            query += " AND cell = ?"
+            params.append(cell.upper())
+        query += " ORDER BY time_key = '', sort_time, id"
+
+        return [self._row_to_entry(row) for row in self.connection.execute(query, params)]
+
+    @staticmethod
+    def _row_to_entry(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "cell": row["cell"],
+            "revision": row["revision"],
+            "author": row["author"],
+            "content": row["content"],
+            "timestamp": row["timestamp_raw"],
+            "timestamp_normalized": row["timestamp_normalized"],
+            "captured_at": row["captured_at"],
+            "source": row["source"]
+        }
+
+
+def load_history_snapshot(sheet_id: str, path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Latest history per cell in the history.json shape, or None if nothing is stored."""
+    if not sheet_id:
+        return None
+
+    store_path = path or default_store_path()
+    if not os.path.exists(store_path):
+        return None
+
+    with HistoryStore(store_path) as store:
+        cells = store.latest_per_cell(sheet_id)
+
+    if not cells:
+        return None
+
+    snapshot = {"cells": cells}
+    for cell_reference, (content_key, timestamp_key, missing_text) in LEGACY_HISTORY_FIELDS.items():
+        entry = cells.get(cell_reference, {})
+        snapshot[content_key] = entry.get("content") or missing_text
+        snapshot[timestamp_key] = entry.get("timestamp") or "No timestamp found"
+    snapshot["source"] = store_path
+    return snapshot
@@ -0,0 +1,107 @@
+import re
+from datetime import datetime, timedelta
+from typing import Optional
+
+# Parsing for the timestamps shown in the Sheets blame view, which follow the
+# account locale, e.g. "17:52, 20 tháng 9", "September 20, 5:52 PM",
+# "Sep 20, 2024, 5:52 PM", "Yesterday, 09:15" or "2 hours ago".
+
+ENGLISH_MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12
+}
+
+RELATIVE_UNITS = {
+    "second": "seconds", "minute": "minutes", "hour": "hours", "day": "days", "week": "weeks",
+    "giây": "seconds", "phút": "minutes", "giờ": "hours", "ngày": "days", "tuần": "weeks"
+}
+
+TIME_PATTERN = re.compile(r'(\d{1,2}):(\d{2})(?::(\d{2}))?\s*(AM|PM|SA|CH)?', re.IGNORECASE)
+VIETNAMESE_DATE_PATTERN = re.compile(r'(\d{1,2})\s+tháng\s+(\d{1,2})(?:,?\s*(?:năm\s+)?(\d{4}))?', re.IGNORECASE)
+ENGLISH_DATE_PATTERN = re.compile(r'([A-Za-z]{3,9})\.?\s+(\d{1,2})(?:,\s*(\d{4}))?')
+NUMERIC_DATE_PATTERN = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})|(\d{1,2})/(\d{1,2})/(\d{4})')
+RELATIVE_PATTERN = re.compile(r'(\d+)\s+([^\s\d]+)\s+(?:ago|trước)', re.IGNORECASE)
+
+
+def _parse_time(text):
+    match = TIME_PATTERN.search(text)
+    if not match:
+        return 0, 0, 0
+
+    hour, minute = int(match.group(1)), int(match.group(2))
+    second = int(match.group(3) or 0)
+    meridiem = (match.group(4) or "").upper()
+    if meridiem in ("PM", "CH") and hour < 12:
+        hour += 12
+    elif meridiem in ("AM", "SA") and hour == 12:
+        hour = 0
+    return hour, minute, second
+
+
+def is_relative_timestamp(text: str) -> bool:
+    """Whether text counts back from when it was read ("2 hours ago"), so it
+    names a different moment, and reads differently, on every capture."""
+    return bool(text) and RELATIVE_PATTERN.search(text.lower()) is not None
+
+
+def parse_history_timestamp(text: str, now: Optional[datetime] = None) -> Optional[datetime]:
+    """Parse a blame view timestamp into a datetime, or None if unrecognised.
+
+    Dates without a year are placed in the most recent year that does not
+    put them in the future.
+    """
+    if not text:
+        return None
+
+    now = now or datetime.now()
+    text = text.strip()
+    lower = text.lower()
+
+    relative = RELATIVE_PATTERN.search(lower)
+    if relative:
+        amount, unit = int(relative.group(1)), relative.group(2).rstrip('s')
+        for unit_name, delta_name in RELATIVE_UNITS.items():
+            if unit.startswith(unit_name):
+                return now - timedelta(**{delta_name: amount})
+
+    hour, minute, second = _parse_time(text)
+
+    if lower.startswith(("today", "hôm nay")) or (TIME_PATTERN.fullmatch(text) is not None):
+        return now.replace(hour=hour, minute=minute, second=second, microsecond=0)
+    if lower.startswith(("yesterday", "hôm qua")):
+        day = now - timedelta(days=1)
+        return day.replace(hour=hour, minute=minute, second=second, microsecond=0)
+
+    year = month = day = None
+
+    numeric = NUMERIC_DATE_PATTERN.search(text)
+    vietnamese = VIETNAMESE_DATE_PATTERN.search(text)
+    if numeric:
+        if numeric.group(1):
+            year, month, day = int(numeric.group(1)), int(numeric.group(2)), int(numeric.group(3))
+        else:
+            month, day, year = int(numeric.group(4)), int(numeric.group(5)), int(numeric.group(6))
+    elif vietnamese:
+        day, month = int(vietnamese.group(1)), int(vietnamese.group(2))
+        year = int(vietnamese.group(3)) if vietnamese.group(3) else None
+    else:
+        for english in ENGLISH_DATE_PATTERN.finditer(text):
+            month_number = ENGLISH_MONTHS.get(english.group(1)[:3].lower())
+            if month_number:
+                month, day = month_number, int(english.group(2))
+                year = int(english.group(3)) if english.group(3) else None
+                break
+
+    if not month or not day:
+        return None
+
+    try:
+        if year:
+            return datetime(year, month, day, hour, minute, second)
+
+        parsed = datetime(now.year, month, day, hour, minute, second)
+        if parsed > now:
+            parsed = parsed.replace(year=now.year - 1)
+        return parsed
+    except ValueError:
+        return None
@@ -1,16 +1,10 @@
 import os
 import pandas as pd
 import json
-
-def extract_sheet_id_from_url(url):
-    start = url.find('/d/') + 3
-    end = url.find('/edit')
-    if start != -1 and end != -1:
-        return url[start:end]
-    return None
+from sheet_export import extract_sheet_id_from_url, sheet_csv_url, open_sheet_csv_stream
 
 def read_google_sheet_with_pandas(sheet_id):
-    csv_url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv&gid=0"
+    csv_url = sheet_csv_url(sheet_id)
     
     try:
         df = pd.read_csv(csv_url)
@@ -39,6 +33,56 @@ def extract_specific_data_with_pandas(df):
     except Exception as e:
         return None
 
+def record_from_row(row_data):
+    return {
+        "User Name": str(row_data.iloc[0]) if len(row_data) > 0 and pd.notna(row_data.iloc[0]) else "",
+        "Email": str(row_data.iloc[1]) if len(row_data) > 1 and pd.notna(row_data.iloc[1]) else "",
+        "Subject": str(row_data.iloc[2]) if len(row_data) > 2 and pd.notna(row_data.iloc[2]) else "",
+        "Content": str(row_data.iloc[3]) if len(row_data) > 3 and pd.notna(row_data.iloc[3]) else ""
+    }
+
+def extract_all_records_with_pandas(df):
+    if df is None or df.empty:
+        return []
+    
+    records = []
+    for _, row_data in df.iterrows():
+        record = record_from_row(row_data)
+        if record["Email"]:
+            records.append(record)
+    
+    return records
+
+def iter_record_chunks(sheet_id, chunksize=200):
+    """Parse the CSV export chunk by chunk, yielding [(sheet_row, record)] per chunk.
+    
+    sheet_row is the 1-based row in the sheet (the header is row 1). Blank
+    rows are kept while parsing so the numbering matches the sheet, but
+    only records with an email are yielded. The export is parsed as it
+    downloads, so only one chunk is held in memory at a time.
+    """
+    sheet_row = 1
+    with open_sheet_csv_stream(sheet_id) as stream, \
+            pd.read_csv(stream, chunksize=chunksize, skip_blank_lines=False) as reader:
+        for chunk in reader:
+            batch = []
+            for _, row_data in chunk.iterrows():
+                sheet_row += 1
+                record = record_from_row(row_data)
+                if record["Email"]:
+                    batch.append((sheet_row, record))
+            yield batch
+
+def create_records_file(records):
+    os.makedirs("data", exist_ok=True)
+    
+    try:
+        with open("data/rows.json", 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+        return True
+    except Exception as e:
+        return False
+
 def create_output_files_with_pandas(data):
     if not data:
         return False, False
@@ -91,6 +135,11 @@ def main():
     # Create output files using pandas
     json_success, csv_success = create_output_files_with_pandas(data)
     
+    # Every row with an email, for L3 mail merge
+    records = extract_all_records_with_pandas(df)
+    if create_records_file(records):
+        print(f"\nSaved {len(records)} recipient records to data/rows.json")
+    
     if json_success and csv_success:
         print("\nSuccessfully created both output files:")
         print("  - data/basic_row.json")
@@ -1,18 +1,168 @@
 import os
+import re
 import json
 import asyncio
 from datetime import datetime
 from dotenv import load_dotenv
 from browser_manager import BrowserManager
+from history_cache import EditHistoryCache
+from history_store import HistoryStore, build_history_payload
+from snapshot_history import SnapshotHistoryBackend
+from history_timestamps import parse_history_timestamp
+from a1_notation import expand_ranges
+from sheets_name_box import NAME_BOX_SELECTORS, NameBox
+from sheet_export import extract_sheet_id_from_url, extract_gid_from_url, read_sheet_grid, get_cell_values
 
 load_dotenv()
 
+# Cells captured by default; L3/L4 read D2 as content and D7 as requirements
+DEFAULT_HISTORY_CELLS = "D2,D7"
+
+# Waits for the blame popup with a MutationObserver, lets it settle and
+# extracts everything in one evaluate() call instead of one CDP round trip
+# per selector.
+BLAME_VIEW_EXTRACT_JS = """
+async ({ timeoutMs, settleMs, changedFrom }) => {
+    const VIEW_SELECTOR = '.docs-blameview-content';
+    const deadline = performance.now() + timeoutMs;
+
+    const waitForView = () => new Promise(resolve => {
+        const existing = document.querySelector(VIEW_SELECTOR);
+        if (existing) return resolve(existing);
+        const observer = new MutationObserver(() => {
+            const found = document.querySelector(VIEW_SELECTOR);
+            if (found) { observer.disconnect(); clearTimeout(timer); resolve(found); }
+        });
+        const timer = setTimeout(() => { observer.disconnect(); resolve(null); }, timeoutMs);
+        observer.observe(document.body, { childList: true, subtree: true });
+    });
+
+    // Resolve once the popup text differs from the revision read before
+    const waitForChange = (view) => new Promise(resolve => {
+        if (view.innerText !== changedFrom) return resolve(true);
+        const observer = new MutationObserver(() => {
+            if (view.innerText !== changedFrom) { observer.disconnect(); clearTimeout(timer); resolve(true); }
+        });
+        const timer = setTimeout(() => { observer.disconnect(); resolve(false); },
+            Math.max(0, deadline - performance.now()));
+        observer.observe(view, { childList: true, subtree: true, characterData: true });
+    });
+
+    // Resolve once the popup had no DOM changes for settleMs
+    const waitForSettle = (view) => new Promise(resolve => {
+        let quiet = setTimeout(done, settleMs);
+        const limit = setTimeout(done, Math.max(0, deadline - performance.now()));
+        const observer = new MutationObserver(() => {
+            clearTimeout(quiet);
+            quiet = setTimeout(done, settleMs);
+        });
+        observer.observe(view, { childList: true, subtree: true, characterData: true });
+        function done() {
+            observer.disconnect();
+            clearTimeout(quiet);
+            clearTimeout(limit);
+            resolve();
+        }
+    });
+
+    const view = await waitForView();
+    if (!view) return null;
+    if (changedFrom && !(await waitForChange(view))) return null;
+    await waitForSettle(view);
+
+    const texts = (selector) => Array.from(view.querySelectorAll(selector))
+        .map(el => el.innerText.trim())
+        .filter(text => text);
+
+    const authors = texts('.docs-blameview-author');
+    const timestamps = texts('.docs-blameview-timestamp');
+    const contents = texts('.docs-blameview-value-content');
+    const fullText = view.innerText || '';
+
+    const entries = [];
+    const count = Math.max(authors.length, timestamps.length, contents.length);
+    for (let i = 0; i < count; i++) {
+        entries.push({
+            author: authors[i] || '',
+            timestamp: timestamps[i] || '',
+            content: contents[i] || ''
+        });
+    }
+
+    let timestamp = timestamps[0] || '';
+    let content = contents[0] || '';
+
+    // Fallback for layouts without the usual class names
+    if (!timestamp && !content) {
+        for (const rawLine of fullText.split('\\n')) {
+            const line = rawLine.trim();
+            const lower = line.toLowerCase();
+            if ([':', 'tháng', 'AM', 'PM', 'ago'].some(marker => line.includes(marker))) {
+                if (!timestamp) timestamp = line;
+            } else if (lower.includes('thay thế') || lower.includes('replaced')) {
+                if (!content) content = line;
+            }
+        }
+    }
+
+    return {
+        author: authors[0] || '',
+        timestamp: timestamp,
+        content: content,
+        entries: entries,
+        text: fullText
+    };
+}
+"""
+
+# "Show edit history" in the UI languages we run against
+EDIT_HISTORY_MENU_TEXT = re.compile(r'edit history|lịch sử chỉnh sửa', re.IGNORECASE)
+
+# Ways to open the cell context menu, quickest first
+HISTORY_MENU_TRIGGERS = ["keyboard", "right_click"]
+
+# Controls of the blame view that step to the previous (older) revision
+BLAME_VIEW_PREVIOUS_SELECTORS = [
+    '.docs-blameview-prev-button',
+    '.docs-blameview-navigation [aria-label*="Previous"]',
+    '[aria-label="Previous edit"]',
+    '[data-tooltip="Previous edit"]',
+    '[aria-label="Chỉnh sửa trước"]',  # Vietnamese
+    '[data-tooltip="Chỉnh sửa trước"]'
+]
+
 class SheetsEditHistoryCapture:
-    def __init__(self, sheet_url, cdp_port=9222, profile_name="Default"):
+    def __init__(self, sheet_url, cdp_port=9222, profile_name="Default", cells=None, tabs=None, browser_manager=None):
         self.sheet_url = sheet_url
         self.history_data = {}
-        self.browser_manager = BrowserManager(cdp_port, debug=True)
+        self.cell_results = {}
+        
+        # A shared manager (pipeline.py) stays open; only one created here is cleaned up
+        self.owns_browser = browser_manager is None
+        self.browser_manager = browser_manager or BrowserManager(cdp_port, debug=True)
         self.profile_name = profile_name
+        self.cells = cells or os.getenv('HISTORY_CELLS', DEFAULT_HISTORY_CELLS)
+        self.tabs = tabs or int(os.getenv('HISTORY_TABS', '2'))
+        
+        # Full revision walk (off unless HISTORY_REVISIONS is set)
+        self.capture_revisions = os.getenv('HISTORY_REVISIONS', '').lower() in ('1', 'true', 'yes')
+        self.revision_max_depth = int(os.getenv('HISTORY_MAX_DEPTH', '50'))
+        since = os.getenv('HISTORY_SINCE')
+        self.revision_since = datetime.fromisoformat(since) if since else None
+        
+        # Skip the blame view for cells whose value is unchanged since the last capture
+        self.sheet_id = extract_sheet_id_from_url(sheet_url)
+        self.sheet_gid = extract_gid_from_url(sheet_url)
+        # Context menu trigger that last opened the history popup
+        self.history_trigger = None
+        # Name box of each tab, keyed by id(page)
+        self.name_boxes = {}
+        
+        self.cache = None
+        if os.getenv('HISTORY_CACHE', 'true').lower() in ('1', 'true', 'yes'):
+            self.cache = EditHistoryCache(
+                ttl_seconds=int(float(os.getenv('HISTORY_CACHE_TTL_HOURS', '24')) * 3600)
+            )
     
     async def check_cdp_connection(self):
         return await self.browser_manager.check_cdp_connection()
@@ -43,24 +193,15 @@ class SheetsEditHistoryCapture:
         """Get context from browser manager"""
         return self.browser_manager.get_context()
     
-    async def select_cell_using_name_box(self, cell_reference):
+    async def select_cell_using_name_box(self, cell_reference, page=None):
+        page = page or self.page
         try:
-            await self.page.wait_for_timeout(2000)
-            
-            name_box_selectors = [
-                'input.waffle-name-box',
-                '#t-name-box',
-                'input[class*="waffle-name-box"]',
-                'input[id*="name-box"]',
-                '.jfk-textinput.waffle-name-box',
-                '[data-tooltip*="Name box"]',
-                'input[placeholder*="A1"]'
-            ]
+            await page.wait_for_timeout(2000)
             
             name_box = None
-            for selector in name_box_selectors:
+            for selector in NAME_BOX_SELECTORS:
                 try:
-                    name_box = await self.page.wait_for_selector(selector, timeout=5000)
+                    name_box = await page.wait_for_selector(selector, timeout=5000)
                     if name_box:
                         print(f"Found name box with selector: {selector}")
                         break
@@ -76,21 +217,21 @@ class SheetsEditHistoryCapture:
             
             # Clear and enter cell reference
             await name_box.click()
-            await self.page.wait_for_timeout(500)
+            await page.wait_for_timeout(500)
             
             # Select all and clear
-            await self.page.keyboard.press('Control+a')
-            await self.page.wait_for_timeout(200)
+            await page.keyboard.press('Control+a')
+            await page.wait_for_timeout(200)
             
             # Type the cell reference
             await name_box.type(cell_reference)
-            await self.page.wait_for_timeout(500)
+            await page.wait_for_timeout(500)
             
             # Press Enter to navigate to cell
-            await self.page.keyboard.press('Enter')
+            await page.keyboard.press('Enter')
             
             # Wait for cell to be selected
-            await self.page.wait_for_timeout(3000)
+            await page.wait_for_timeout(3000)
             
             # Verify cell is selected by checking if name box shows our cell reference
             try:
@@ -109,18 +250,19 @@ class SheetsEditHistoryCapture:
             print(f"Error selecting cell {cell_reference}: {e}")
             return False
     
-    async def right_click_selected_cell(self):
+    async def right_click_selected_cell(self, page=None):
+        page = page or self.page
         try:
-            await self.page.wait_for_timeout(1000)
+            await page.wait_for_timeout(1000)
             
             try:
-                elements = await self.page.query_selector_all('.active-cell-border')
+                elements = await page.query_selector_all('.active-cell-border')
                 if len(elements) > 0:
                     print(f"Found {len(elements)} active cell border elements")
                     await elements[0].click(button='right', force=True)
-                    await self.page.wait_for_timeout(1000)
+                    await page.wait_for_timeout(1000)
                     
-                    menu_items = await self.page.query_selector_all('[role="menuitem"], .goog-menuitem, .goog-menu-item')
+                    menu_items = await page.query_selector_all('[role="menuitem"], .goog-menuitem, .goog-menu-item')
                     if len(menu_items) > 0:
                         print(f"✅ Context menu opened with {len(menu_items)} items")
                         return True
@@ -132,7 +274,8 @@ class SheetsEditHistoryCapture:
             print(f"Error right-clicking selected cell: {e}")
             return False
     
-    async def click_show_edit_history(self):
+    async def click_show_edit_history(self, page=None):
+        page = page or self.page
         try:
             # Look for edit history options
             edit_history_selectors = [
@@ -147,11 +290,11 @@ class SheetsEditHistoryCapture:
             
             for selector in edit_history_selectors:
                 try:
-                    element = await self.page.wait_for_selector(selector, timeout=3000)
+                    element = await page.wait_for_selector(selector, timeout=3000)
                     if element:
                         print(f"Found edit history option with selector: {selector}")
                         await element.click()
-                        await self.page.wait_for_timeout(3000)
+                        # No fixed sleep: extraction waits for the popup itself
                         return True
                 except:
                     continue
@@ -161,164 +304,435 @@ class SheetsEditHistoryCapture:
             print(f"Error clicking show edit history: {e}")
             return False
     
-    async def extract_edit_history_data(self):
+    async def extract_edit_history_record(self, page=None, timeout=5000, changed_from=None):
+        """Wait for the blame popup and read it in a single round trip.
+        
+        Returns a dict with author, timestamp, content, entries (every visible
+        revision) and text, or None if the popup did not appear in time. With
+        changed_from (the text of a previous record) it waits for the popup to
+        show a different revision first.
+        """
+        page = page or self.page
         try:
-            # Look for the blame view content
-            blame_view_selector = '.docs-blameview-content'
-            blame_view = await self.page.wait_for_selector(blame_view_selector, timeout=5000)
-            
-            if not blame_view:
-                return "", ""
-            
-            timestamp = ""
-            timestamp_selectors = [
-                '.docs-blameview-timestamp',
-                '.docs-blameview-authortimestamp .docs-blameview-timestamp'
-            ]
+            record = await page.evaluate(
+                BLAME_VIEW_EXTRACT_JS,
+                {"timeoutMs": timeout, "settleMs": 150, "changedFrom": changed_from}
+            )
+            if record:
+                record["content"] = record["content"].strip()
+                record["timestamp"] = record["timestamp"].strip()
+            return record
+        except Exception as e:
+            print(f"Error extracting edit history data: {e}")
+            return None
+    
+    async def extract_edit_history_data(self, page=None):
+        record = await self.extract_edit_history_record(page)
+        if not record:
+            return "", ""
+        
+        if record["timestamp"]:
+            print(f"Found timestamp: {record['timestamp']}")
+        if record["content"]:
+            print(f"Found content: {record['content']}")
+        else:
+            print(f"Blame view full text: {record['text']}")
+        
+        return record["content"], record["timestamp"]
+    
+    def name_box(self, page):
+        name_box = self.name_boxes.get(id(page))
+        if name_box is None or name_box.page is not page:
+            name_box = NameBox(page)
+            self.name_boxes[id(page)] = name_box
+        return name_box
+    
+    async def fast_select_cell(self, cell_reference, page=None):
+        """Jump to a cell through the tab's cached name box, waiting on the name box instead of sleeps."""
+        page = page or self.page
+        name_box = self.name_box(page)
+        if not name_box.element:
+            # First use on this tab: give Sheets time to render the name box
+            await page.wait_for_selector(', '.join(NAME_BOX_SELECTORS), timeout=5000)
+        
+        if not await name_box.select(cell_reference):
+            raise RuntimeError("Name box not found")
+    
+    async def _open_history_menu_item(self, page, trigger):
+        if trigger == "keyboard":
+            await page.keyboard.press('Shift+F10')
+        else:
+            await page.click('.active-cell-border', button='right', force=True, timeout=2000)
+        
+        menu_item = page.locator('[role="menuitem"]').filter(has_text=EDIT_HISTORY_MENU_TEXT).first
+        await menu_item.wait_for(state='visible', timeout=1500)
+        await menu_item.click()
+    
+    async def open_edit_history(self, cell_reference, page=None):
+        """Open a cell's edit history popup by the quickest route that works.
+        
+        Tries the trigger that worked last time first, then the others, and
+        only falls back to the full menu scan when none of them opens it.
+        The popup itself is waited for by extract_edit_history_record().
+        """
+        page = page or self.page
+        try:
+            await self.fast_select_cell(cell_reference, page)
             
-            for selector in timestamp_selectors:
+            triggers = sorted(HISTORY_MENU_TRIGGERS, key=lambda trigger: trigger != self.history_trigger)
+            for trigger in triggers:
                 try:
-                    timestamp_element = await blame_view.query_selector(selector)
-                    if timestamp_element:
-                        timestamp = await timestamp_element.inner_text()
-                        print(f"Found timestamp: {timestamp}")
-                        break
-                except:
-                    continue
+                    await self._open_history_menu_item(page, trigger)
+                    self.history_trigger = trigger
+                    return True
+                except Exception:
+                    await page.keyboard.press('Escape')
+        except Exception as e:
+            print(f"⚠️ Fast path failed for {cell_reference}: {e}")
+        
+        print(f"🔄 Falling back to context menu scan for {cell_reference}")
+        if not await self.select_cell_using_name_box(cell_reference, page):
+            return False
+        
+        if not await self.right_click_selected_cell(page):
+            return False
+        
+        return await self.click_show_edit_history(page)
+    
+    async def capture_cell_edit_record(self, cell_reference, page=None):
+        page = page or self.page
+        try:
+            if not await self.open_edit_history(cell_reference, page):
+                return None
             
-            content = ""
-            content_selectors = [
-                '.docs-blameview-value-content',
-                '.docs-blameview-valuecontainer .docs-blameview-value-content'
-            ]
+            return await self.extract_edit_history_record(page)
             
-            for selector in content_selectors:
-                try:
-                    content_element = await blame_view.query_selector(selector)
-                    if content_element:
-                        content = await content_element.inner_text()
-                        print(f"Found content: {content}")
-                        break
-                except:
+        except Exception as e:
+            print(f"Error capturing edit history for {cell_reference}: {e}")
+            return None
+    
+    async def capture_cell_edit_history(self, cell_reference, page=None):
+        record = await self.capture_cell_edit_record(cell_reference, page)
+        if not record:
+            return "", ""
+        return record["content"], record["timestamp"]
+    
+    async def click_previous_revision(self, page=None):
+        page = page or self.page
+        for selector in BLAME_VIEW_PREVIOUS_SELECTORS:
+            try:
+                button = await page.query_selector(selector)
+                if not button or not await button.is_visible():
                     continue
-            
-            if not content and not timestamp:
-                all_text = await blame_view.inner_text()
-                print(f"Blame view full text: {all_text}")
                 
-                lines = all_text.split('\n')
-                for line in lines:
-                    if any(time_indicator in line for time_indicator in [':', 'tháng', 'AM', 'PM', 'ago']):
-                        if not timestamp:
-                            timestamp = line.strip()
-                    elif 'thay thế' in line.lower() or 'replaced' in line.lower():
-                        if not content:
-                            content = line.strip()
+                disabled = await button.evaluate(
+                    "(el) => el.getAttribute('aria-disabled') === 'true' || el.className.includes('disabled')"
+                )
+                if disabled:
+                    return False
+                
+                await button.click()
+                return True
+            except:
+                continue
+        
+        return False
+    
+    async def iter_cell_revisions(self, cell_reference, max_depth=None, since=None, page=None):
+        """Walk a cell's blame view from the latest edit backwards.
+        
+        Async generator yielding one revision dict at a time, so deep
+        histories are never held in memory. Stops after max_depth revisions,
+        at the first revision older than since (a datetime), or when there is
+        no older revision.
+        """
+        page = page or self.page
+        record = await self.capture_cell_edit_record(cell_reference, page)
+        depth = 0
+        
+        while record:
+            revision_time = parse_history_timestamp(record["timestamp"])
+            if since and revision_time and revision_time < since:
+                break
+            
+            yield {
+                "cell": cell_reference,
+                "revision": depth,
+                "author": record["author"],
+                "timestamp": record["timestamp"],
+                "timestamp_normalized": revision_time.isoformat() if revision_time else None,
+                "content": record["content"]
+            }
             
-            return content.strip(), timestamp.strip()
+            depth += 1
+            if max_depth and depth >= max_depth:
+                break
             
-        except Exception as e:
-            print(f"Error extracting edit history data: {e}")
-            return "", ""
-    
-    async def capture_cell_edit_history(self, cell_reference):
-        try:
-            if not await self.select_cell_using_name_box(cell_reference):
-                return "", ""
+            if not await self.click_previous_revision(page):
+                break
             
-            if not await self.right_click_selected_cell():
-                return "", ""
+            record = await self.extract_edit_history_record(page, changed_from=record["text"])
+        
+        try:
+            await page.keyboard.press('Escape')
+        except Exception:
+            pass
+    
+    async def stream_revisions_to_file(self, ranges, filename=None, max_depth=None, since=None):
+        """Append every revision of the given cells to a JSON Lines file as it is read."""
+        if filename is None:
+            current_dir = os.path.dirname(os.path.abspath(__file__))
+            data_dir = os.path.join(os.path.dirname(current_dir), "data")
+            filename = os.path.join(data_dir, "history_revisions.jsonl")
+        
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        
+        written = 0
+        batch = []
+        with open(filename, 'a', encoding='utf-8') as f, HistoryStore() as store:
+            for cell_reference in expand_ranges(ranges):
+                async for revision in self.iter_cell_revisions(cell_reference, max_depth, since):
+                    revision["capture_date"] = datetime.now().isoformat()
+                    revision["sheet_url"] = self.sheet_url
+                    f.write(json.dumps(revision, ensure_ascii=False) + "\n")
+                    f.flush()
+                    written += 1
+                    print(f"🕘 {cell_reference} revision {revision['revision']}: {revision['timestamp']}")
+                    
+                    batch.append(dict(revision, sheet_id=self.sheet_id, source="revision_walk"))
+                    if len(batch) >= 50:
+                        store.add_entries(batch)
+                        batch = []
             
-            if not await self.click_show_edit_history():
-                return "", ""
+            store.add_entries(batch)
+        
+        print(f"✅ Appended {written} revision(s) to {filename}")
+        return written
+    
+    async def _open_worker_pages(self, tabs):
+        """Return the main page plus up to tabs - 1 extra tabs with the sheet loaded."""
+        pages = [self.page]
+        
+        async def open_tab():
+            try:
+                page = await self.browser_manager.new_page()
+                if await self.browser_manager.navigate_to_url(self.sheet_url, 8000, page=page):
+                    return page
+                await page.close()
+            except Exception as e:
+                print(f"⚠️ Could not open extra tab: {e}")
+            return None
+        
+        extra_pages = await asyncio.gather(*[open_tab() for _ in range(tabs - 1)])
+        pages.extend(page for page in extra_pages if page)
+        
+        if len(pages) < tabs:
+            print(f"⚠️ Running with {len(pages)} of {tabs} requested tabs")
+        return pages
+    
+    async def _history_worker(self, page, pending, results):
+        while True:
+            try:
+                cell_reference = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
             
-            content, timestamp = await self.extract_edit_history_data()
+            started = datetime.now()
+            try:
+                record = await self.capture_cell_edit_record(cell_reference, page) or {}
+                error = None if record.get("content") or record.get("timestamp") else "No edit history found"
+            except Exception as e:
+                record, error = {}, str(e)
             
-            return content, timestamp
+            # Close the blame popup so the next cell starts from a clean grid
+            try:
+                await page.keyboard.press('Escape')
+            except Exception:
+                pass
+            
+            await results.put((cell_reference, {
+                "content": record.get("content", ""),
+                "timestamp": record.get("timestamp", ""),
+                "author": record.get("author", ""),
+                "entries": record.get("entries", []),
+                "error": error,
+                "duration_seconds": round((datetime.now() - started).total_seconds(), 3)
+            }))
+    
+    async def capture_cells_history(self, ranges, tabs=None):
+        """Capture edit history for any A1 cells/ranges, spread over several tabs.
+        
+        Async generator yielding (cell, result) as soon as each cell completes.
+        A failing cell yields a result with "error" set and does not stop the
+        other cells. Requires setup_browser() and the sheet loaded in self.page.
+        """
+        cells = expand_ranges(ranges)
+        if not cells:
+            return
+        
+        tabs = max(1, min(tabs or self.tabs, len(cells)))
+        
+        pending = asyncio.Queue()
+        for cell_reference in cells:
+            pending.put_nowait(cell_reference)
+        results = asyncio.Queue()
+        
+        pages = await self._open_worker_pages(tabs)
+        print(f"📋 Capturing edit history for {len(cells)} cell(s) across {len(pages)} tab(s)...")
+        
+        workers = [
+            asyncio.create_task(self._history_worker(page, pending, results))
+            for page in pages
+        ]
+        
+        try:
+            for _ in range(len(cells)):
+                cell_reference, result = await results.get()
+                self.cell_results[cell_reference] = result
+                yield cell_reference, result
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
             
+            for page in pages[1:]:
+                try:
+                    await page.close()
+                except Exception:
+                    pass
+    
+    def build_history_data(self, cell_results, method="parallel_tab_playwright_automation"):
+        """Build the history.json payload from cell-keyed results."""
+        return build_history_payload(cell_results, method, self.sheet_url, self.browser_manager.session_id)
+    
+    async def load_cell_values(self, cells):
+        """Current values of cells from the CSV export, or {} if it can't be read."""
+        try:
+            grid = await asyncio.to_thread(read_sheet_grid, self.sheet_id, self.sheet_gid)
+            return get_cell_values(grid, cells)
         except Exception as e:
-            print(f"Error capturing edit history for {cell_reference}: {e}")
-            return "", ""
+            print(f"⚠️ Could not read cell values from CSV export, cache skipped: {e}")
+            return {}
+    
+    def lookup_cached_history(self, cells, cell_values):
+        """Cached results for cells whose value fingerprint is unchanged."""
+        cached = {}
+        if not self.cache:
+            return cached
+        
+        for cell_reference in cells:
+            if cell_reference not in cell_values:
+                continue
+            result = self.cache.get(self.sheet_id, cell_reference, cell_values[cell_reference])
+            if result is not None:
+                cached[cell_reference] = dict(result, cached=True)
+        return cached
+    
+    async def open_sheet(self):
+        # Setup browser with enhanced manager
+        if not await self.setup_browser():
+            print("Failed to setup browser")
+            return False
+        
+        if not self.browser_manager.is_browser_ready():
+            print("Browser is not ready")
+            return False
+        
+        try:
+            # Navigate using enhanced navigation
+            success = await self.browser_manager.navigate_to_url(self.sheet_url, 8000)
+            if not success:
+                print("Failed to navigate to sheet")
+                return False
+                
+            await self.browser_manager.take_screenshot("sheet_loaded", "Google Sheets loaded")
+            return True
+        except Exception as e:
+            print(f"Error navigating to sheet: {e}")
+            return False
     
     async def capture_all_history(self):
         try:
-            # Setup browser with enhanced manager
-            if not await self.setup_browser():
-                print("Failed to setup browser")
-                return
+            cells = expand_ranges(self.cells)
+            cell_values = await self.load_cell_values(cells) if self.cache else {}
             
-            if not self.browser_manager.is_browser_ready():
-                print("Browser is not ready")
-                return
+            cell_results = self.lookup_cached_history(cells, cell_values)
+            for cell_reference, result in cell_results.items():
+                print(f"♻️ {cell_reference} unchanged, using cached history: {result['content']}")
             
-            try:
-                # Navigate using enhanced navigation
-                success = await self.browser_manager.navigate_to_url(self.sheet_url, 8000)
-                if not success:
-                    print("Failed to navigate to sheet")
+            missing_cells = [cell for cell in cells if cell not in cell_results]
+            
+            if missing_cells or self.capture_revisions:
+                if not await self.open_sheet():
                     return
-                    
-                await self.browser_manager.take_screenshot("sheet_loaded", "Google Sheets loaded")
-            except Exception as e:
-                print(f"Error navigating to sheet: {e}")
-                return
             
-            # Capture D2 edit history
-            try:
-                print("📋 Capturing D2 cell edit history...")
-                d2_content, d2_timestamp = await self.capture_cell_edit_history("D2")
-                if d2_content:
-                    print(f"✅ D2 Content: {d2_content}")
-                else:
-                    print("⚠️ No D2 content found")
-            except Exception as e:
-                print(f"Error capturing D2 history: {e}")
-                d2_content, d2_timestamp = "", ""
+            if missing_cells:
+                async for cell_reference, result in self.capture_cells_history(missing_cells):
+                    cell_results[cell_reference] = result
+                    if result["content"]:
+                        print(f"✅ {cell_reference} Content: {result['content']}")
+                        if self.cache and cell_reference in cell_values and not result["error"]:
+                            self.cache.put(self.sheet_id, cell_reference, cell_values[cell_reference], result)
+                    else:
+                        print(f"⚠️ No {cell_reference} content found ({result['error']})")
+            else:
+                print("♻️ All cells unchanged since last capture, skipping the Sheets UI")
             
-            # Wait between operations
-            await self.page.wait_for_timeout(3000)
+            self.history_data = self.build_history_data(
+                {cell: cell_results[cell] for cell in cells if cell in cell_results}
+            )
             
-            # Capture D7 edit history
-            try:
-                print("📋 Capturing D7 cell edit history...")
-                d7_content, d7_timestamp = await self.capture_cell_edit_history("D7")
-                if d7_content:
-                    print(f"✅ D7 Content: {d7_content}")
-                else:
-                    print("⚠️ No D7 content found")
-            except Exception as e:
-                print(f"Error capturing D7 history: {e}")
-                d7_content, d7_timestamp = "", ""
-            
-            # Store results with enhanced data structure
-            self.history_data = {
-                "content_prev": d2_content or "No previous content found",
-                "timestamp_prev": d2_timestamp or "No timestamp found",
-                "requirements_prev": d7_content or "No previous requirements found",
-                "requirements_timestamp_prev": d7_timestamp or "No timestamp found",
-                "capture_date": datetime.now().isoformat(),
-                "method": "enhanced_playwright_automation",
-                "session_id": self.browser_manager.session_id,
-                "sheet_url": self.sheet_url
-            }
+            if self.cache:
+                self.cache.save()
+                self.history_data["cache_stats"] = self.cache.stats()
+                print(f"📦 History cache: {self.cache.stats()}")
+            
+            if self.capture_revisions:
+                await self.stream_revisions_to_file(
+                    self.cells,
+                    max_depth=self.revision_max_depth,
+                    since=self.revision_since
+                )
             
             # Log final results
             print("\n📊 CAPTURE RESULTS:")
             print("=" * 50)
             for key, value in self.history_data.items():
-                print(f"{key}: {value}")
+                if key == "cells":
+                    for cell_reference, result in value.items():
+                        print(f"{cell_reference}: {result.get('content', '')} ({result.get('timestamp', '')})")
+                else:
+                    print(f"{key}: {value}")
             print("=" * 50)
             
             # Take final screenshot only
-            await self.browser_manager.take_screenshot("capture_completed", "Edit history capture completed")
+            if self.browser_manager.is_browser_ready():
+                await self.browser_manager.take_screenshot("capture_completed", "Edit history capture completed")
             
         except Exception as e:
             print(f"Error in capture process: {e}")
         
         finally:
-            await self.browser_manager.cleanup_browser(keep_browser_open=True)
+            if self.owns_browser:
+                await self.browser_manager.cleanup_browser(keep_browser_open=True)
     
     def save_history_data(self, filename=None):
+        """Append the captured cells to the history store and write history.json.
+        
+        The store is the durable record; history.json is only the snapshot of
+        this run for anyone still reading the file directly.
+        """
+        try:
+            with HistoryStore() as store:
+                added = store.add_cell_results(
+                    self.sheet_id,
+                    self.history_data.get("cells", {}),
+                    source=self.history_data.get("method", "")
+                )
+                print(f"🗄️ Stored {added} new history entries in {store.path}")
+        except Exception as e:
+            print(f"Error storing history entries: {e}")
+        
         try:
             if filename is None:
                 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -347,6 +761,41 @@ class SheetsEditHistoryCapture:
             print(f"Attempted path: {filename}")
             return False
 
+async def capture_history(capture):
+    """Fill capture.history_data with the backend HISTORY_BACKEND selects.
+    
+    ui reads the blame view through the browser; snapshot diffs stored CSV
+    snapshots offline, taking a fresh one first unless HISTORY_SNAPSHOT_FETCH
+    is off. Returns the name of the backend used.
+    """
+    if os.getenv('HISTORY_BACKEND', 'ui') == 'snapshot':
+        backend = SnapshotHistoryBackend(capture.sheet_url)
+        if os.getenv('HISTORY_SNAPSHOT_FETCH', 'true').lower() in ('1', 'true', 'yes'):
+            try:
+                await asyncio.to_thread(backend.take_snapshot)
+            except Exception as e:
+                # The snapshots already stored still give a history
+                print(f"⚠️ Could not take a new snapshot: {e}")
+        
+        try:
+            capture.history_data = backend.compute_history(expand_ranges(capture.cells))
+        except Exception as e:
+            print(f"❌ Error computing history from snapshots: {e}")
+            capture.history_data = {}
+        return 'snapshot'
+    
+    if capture.owns_browser:
+        # Check CDP connection first
+        cdp_available = await capture.check_cdp_connection()
+        if cdp_available:
+            print("🔗 Connection priority: Using existing browser via CDP")
+        else:
+            print("🚀 Connection priority: Starting new persistent browser")
+    
+    # Run the capture process
+    await capture.capture_all_history()
+    return 'ui'
+
 async def main():
     sheet_url = os.getenv('SHEET_URL', "https://docs.google.com/spreadsheets/d/1lNsIW2A1gmurYZ-DJt65xuX_yEsxyvoqPx84Q2B8rEM/edit?gid=0#gid=0")
     
@@ -360,21 +809,16 @@ async def main():
     capture = SheetsEditHistoryCapture(sheet_url)
     
     try:
-        # Check CDP connection first
-        cdp_available = await capture.check_cdp_connection()
-        if cdp_available:
-            print("🔗 Connection priority: Using existing browser via CDP")
-        else:
-            print("🚀 Connection priority: Starting new persistent browser")
-        
-        # Run the capture process
-        await capture.capture_all_history()
+        backend = await capture_history(capture)
+        if not capture.history_data:
+            print(f"\nTask completed with errors (no history from the {backend} backend)")
+            return
         
         # Save results
         success = capture.save_history_data()
         
         if success:
-            print("\n✅ Task completed successfully!")
+            print(f"\n✅ Task completed successfully ({backend} backend)!")
         else:
             print("\nTask completed with errors")
             
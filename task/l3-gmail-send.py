@@ -1,23 +1,293 @@
 import os
+import re
 import json
 import asyncio
-from datetime import datetime
+import urllib.parse
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from async_signals import first_signal
 from browser_manager import BrowserManager
+from email_templates import EmailTemplate, TemplateError
+from history_store import load_history_snapshot
+from mail_transport import create_transport
+from rate_limit import TokenBucket
+from send_ledger import SendLedger
+from sheet_export import extract_sheet_id_from_url
 
 load_dotenv()
 
+COMPOSE_BUTTON_SELECTORS = [
+    '[data-tooltip="Compose"]',
+    '[aria-label="Compose"]',
+    '[role="button"]:has-text("Compose")',
+    '.T-I.T-I-KE.L3',  # Gmail's compose button class
+    '[data-tooltip="Soạn"]',  # Vietnamese
+    '[aria-label="Soạn"]',
+    'div[role="button"]:has-text("Compose")',
+    'button:has-text("Compose")'
+]
+
+COMPOSE_DIALOG_SELECTOR = '[role="dialog"]:has(input[name="subjectbox"])'
+
+TO_FIELD_SELECTORS = [
+    # Most common Gmail selectors
+    '[name="to"] [contenteditable="true"]',
+    '[aria-label="To recipients"] [contenteditable="true"]',
+    'div[aria-label="To recipients"] [contenteditable="true"]',
+    '[role="combobox"][aria-label*="To"]',
+    
+    # Fallback selectors
+    'input[name="to"]',
+    'textarea[name="to"]',
+    '[aria-label="To"]',
+    '.oL.aDm [contenteditable="true"]',
+    '[role="textbox"][aria-label*="To"]',
+    '[data-hovercard-id*="to"]',
+    
+    # Generic contenteditable in compose area
+    '.nH [contenteditable="true"]',
+    '.aYF [contenteditable="true"]'
+]
+
+SUBJECT_FIELD_SELECTORS = [
+    'input[name="subjectbox"]',
+    'input[aria-label="Subject"]',
+    '[placeholder*="Subject"]',
+    '[aria-label="Subject"] input',
+    '.aoT input',  # Gmail subject field class
+    '[role="textbox"][aria-label*="Subject"]'
+]
+
+BODY_FIELD_SELECTORS = [
+    '[role="textbox"][aria-label*="Message"]',
+    '[contenteditable="true"][role="textbox"]',
+    '.Am.Al.editable',  # Gmail body editor
+    '[aria-label*="Message body"] [contenteditable="true"]',
+    '.ii.gt .a3s',
+    'div[contenteditable="true"][role="textbox"]'
+]
+
+SEND_BUTTON_SELECTORS = [
+    '[role="button"][aria-label*="Send"]',
+    '[data-tooltip="Send"]',
+    '.T-I.J-J5-Ji.aoO.v7.T-I-atl.L3', 
+    '[role="button"]:has-text("Send")'
+]
+
+DISCARD_DRAFT_SELECTORS = [
+    '[aria-label^="Discard draft"]',
+    '[data-tooltip^="Discard draft"]',
+    '[aria-label^="Hủy bản nháp"]'  # Vietnamese
+]
+
+SENT_TOAST_SELECTOR = '[role="alert"], .vh, .bAq'
+SENT_TOAST_TEXT = re.compile(r'message sent|your message has been sent|đã gửi thư', re.IGNORECASE)
+
+# How long to let the previous send's toast clear before clicking Send
+TOAST_CLEAR_TIMEOUT_MS = 3000
+
+class ComposeDialog:
+    """An open compose dialog with its field handles resolved once."""
+    
+    def __init__(self, element, to_field, subject_field, body_field, send_button):
+        self.element = element
+        self.to_field = to_field
+        self.subject_field = subject_field
+        self.body_field = body_field
+        self.send_button = send_button
+    
+    @property
+    def complete(self):
+        return all([self.to_field, self.subject_field, self.body_field, self.send_button])
+
+class ComposeSession:
+    """Keeps one Gmail tab ready to send, so each email costs only fill + send.
+    
+    Gmail stays loaded, the compose button and each dialog's fields are
+    resolved once, and (with prewarm on) the next compose dialog is opened
+    while the current send is still being confirmed. Dialogs this session
+    owns are tagged with data-compose-claimed so a new one is easy to tell
+    apart from those already open.
+    """
+    
+    def __init__(self, sender, page, prewarm=True):
+        self.sender = sender
+        self.page = page
+        self.prewarm_enabled = prewarm
+        self.started = False
+        self.compose_button = None
+        self.next_dialog = None
+    
+    async def start(self):
+        if "mail.google.com" not in self.page.url:
+            if not await self.sender.navigate_to_gmail(self.page):
+                return False
+        
+        # Dialogs left open by an earlier run are never reused
+        await self.page.evaluate(
+            "(selector) => document.querySelectorAll(selector).forEach("
+            "(el) => el.setAttribute('data-compose-claimed', 'stale'))",
+            COMPOSE_DIALOG_SELECTOR
+        )
+        self.started = True
+        return True
+    
+    async def _find_compose_button(self):
+        try:
+            if self.compose_button and await self.compose_button.is_visible():
+                return self.compose_button
+        except Exception:
+            pass
+        
+        self.compose_button = None
+        for selector in COMPOSE_BUTTON_SELECTORS:
+            try:
+                self.compose_button = await self.page.wait_for_selector(selector, timeout=3000)
+                if self.compose_button:
+                    break
+            except:
+                continue
+        return self.compose_button
+    
+    @staticmethod
+    async def _query_first(element, selectors):
+        for selector in selectors:
+            handle = await element.query_selector(selector)
+            if handle:
+                return handle
+        return None
+    
+    async def open_dialog(self):
+        try:
+            compose_button = await self._find_compose_button()
+            if not compose_button:
+                print("Could not find compose button")
+                return None
+            
+            unclaimed = self.page.locator(f'{COMPOSE_DIALOG_SELECTOR}:not([data-compose-claimed])').first
+            await compose_button.click()
+            element = await unclaimed.element_handle(timeout=5000)
+            await element.evaluate("(el) => el.setAttribute('data-compose-claimed', 'session')")
+            
+            dialog = ComposeDialog(
+                element,
+                await self._query_first(element, TO_FIELD_SELECTORS),
+                await self._query_first(element, SUBJECT_FIELD_SELECTORS),
+                await self._query_first(element, BODY_FIELD_SELECTORS),
+                await self._query_first(element, SEND_BUTTON_SELECTORS)
+            )
+            if not dialog.complete:
+                print("Compose dialog is missing fields, discarding it")
+                await self.discard(dialog)
+                return None
+            return dialog
+        
+        except Exception as e:
+            print(f"Error opening compose dialog: {e}")
+            return None
+    
+    def prewarm(self):
+        if self.prewarm_enabled and self.next_dialog is None:
+            self.next_dialog = asyncio.ensure_future(self.open_dialog())
+    
+    async def _take_prewarmed(self):
+        task, self.next_dialog = self.next_dialog, None
+        if task is None:
+            return None
+        try:
+            return await task
+        except Exception:
+            return None
+    
+    async def acquire(self):
+        return await self._take_prewarmed() or await self.open_dialog()
+    
+    async def discard(self, dialog):
+        try:
+            button = await self._query_first(dialog.element, DISCARD_DRAFT_SELECTORS)
+            if button:
+                await button.click()
+        except Exception:
+            pass
+    
+    async def send(self, record, message=None):
+        if not self.started and not await self.start():
+            return False, "Gmail did not load"
+        
+        dialog = await self.acquire()
+        if dialog is None:
+            return False, "Could not open compose window"
+        
+        if not await self.sender.fill_email_fields(record, self.page, dialog):
+            await self.discard(dialog)
+            return False, "Could not fill email fields"
+        
+        if not await self.sender.send_email(self.page, dialog, after_click=self.prewarm, message=message):
+            return False, "Send not confirmed"
+        
+        return True, None
+    
+    async def close(self):
+        dialog = await self._take_prewarmed()
+        if dialog:
+            await self.discard(dialog)
+
 class GmailAutoSender:
-    def __init__(self, cdp_port=9222):
-        self.browser_manager = BrowserManager(cdp_port, debug=True)
+    def __init__(self, cdp_port=9222, transport=None, browser_manager=None):
+        # A shared manager (pipeline.py) stays open; only one created here is cleaned up
+        self.owns_browser = browser_manager is None
+        self.browser_manager = browser_manager or BrowserManager(cdp_port, debug=True)
+        self.gmail_page = None
+        
+        # browser (Gmail UI, default) or smtp; see mail_transport.py
+        self.transport = transport or create_transport(self)
         
         self.recipient_contact_data = None
         self.email_content_data = None
         self.sent_proof_path = None
+        
+        # templates/<EMAIL_TEMPLATE>.txt (+ optional .html), compiled once by load_email_template()
+        self.email_template = None
+        
+        # Mail merge settings; the default rate stays well under Gmail's daily sending quota
+        self.recipient_records = []
+        self.merge_concurrency = int(os.getenv('MAIL_MERGE_CONCURRENCY', '3'))
+        self.send_rate_per_minute = float(os.getenv('GMAIL_SEND_RATE_PER_MINUTE', '20'))
+        self.send_burst = int(os.getenv('GMAIL_SEND_BURST', '3'))
+        self.daily_quota = int(os.getenv('GMAIL_DAILY_QUOTA', '500'))
+        
+        # Sends counted against daily_quota: confirmed in the last 24h plus those in flight
+        self.quota_used = 0
+        
+        # Send confirmation: first signal within the deadline wins; the Sent
+        # folder visit is an optional, slower extra check
+        self.send_confirm_deadline_ms = int(os.getenv('GMAIL_SEND_CONFIRM_DEADLINE_MS', '15000'))
+        self.verify_sent_folder = os.getenv('GMAIL_VERIFY_SENT_FOLDER', 'false').lower() in ('1', 'true', 'yes')
+        
+        # One compose session per Gmail tab, keyed by id(page)
+        self.compose_sessions = {}
+        self.prewarm_compose = os.getenv('GMAIL_PREWARM_COMPOSE', 'true').lower() in ('1', 'true', 'yes')
+        
+        # Durable record of confirmed sends so reruns never send twice
+        self.ledger = None
+        if os.getenv('SEND_LEDGER', 'true').lower() in ('1', 'true', 'yes'):
+            self.ledger = SendLedger(os.getenv('SEND_LEDGER_PATH') or None)
+        
+        # A send left "attempted" (interrupted between clicking Send and its
+        # confirmation) may have gone out. It is held back until a Sent folder
+        # search (browser transport) or SEND_LEDGER_RELEASE_UNCONFIRMED clears it.
+        self.held_records = []
+        self.check_sent_folder_for_held = os.getenv('SEND_LEDGER_CHECK_SENT_FOLDER', 'true').lower() in ('1', 'true', 'yes')
+        self.release_unconfirmed = os.getenv('SEND_LEDGER_RELEASE_UNCONFIRMED', 'false').lower() in ('1', 'true', 'yes')
     
     @property
     def page(self):
-        return self.browser_manager.get_page()
+        # A dedicated Gmail tab (pipeline.py pre-loads one) takes the place of the main page
+        return self.gmail_page or self.browser_manager.get_page()
+    
+    def on_gmail(self):
+        page = self.page
+        return page is not None and not page.is_closed() and "mail.google.com" in page.url
     
     @property 
     def browser(self):
@@ -39,8 +309,33 @@ class GmailAutoSender:
         except Exception as e:
             return False
     
+    def load_all_recipient_records(self, file_path=None):
+        """Load every L1 record (data/rows.json), falling back to basic_row.json."""
+        try:
+            if file_path is None:
+                current_dir = os.path.dirname(os.path.abspath(__file__))
+                file_path = os.path.join(os.path.dirname(current_dir), "data", "rows.json")
+            
+            if os.path.exists(file_path):
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    self.recipient_records = [record for record in json.load(f) if record.get('Email')]
+            elif self.load_recipient_contact_data():
+                self.recipient_records = [self.recipient_contact_data]
+            
+            return len(self.recipient_records) > 0
+        except Exception as e:
+            print(f"Error loading recipient records: {e}")
+            return False
+    
     def load_history_content_data(self, file_path=None):
         try:
+            if file_path is None:
+                sheet_id = extract_sheet_id_from_url(os.getenv('SHEET_URL', ''))
+                stored_history = load_history_snapshot(sheet_id)
+                if stored_history:
+                    self.email_content_data = stored_history
+                    return True
+            
             if file_path is None:
                 current_dir = os.path.dirname(os.path.abspath(__file__))
                 data_dir = os.path.join(os.path.dirname(current_dir), "data")
@@ -57,29 +352,20 @@ class GmailAutoSender:
         except Exception as e:
             return False
     
-    async def navigate_to_gmail(self):
+    async def navigate_to_gmail(self, page=None):
+        page = page or self.page
         try:
             gmail_url = os.getenv('GMAIL_URL', 'https://mail.google.com')
             
-            await self.browser_manager.navigate_to_url(gmail_url, 8000)
+            await self.browser_manager.navigate_to_url(gmail_url, 8000, page=page)
             
-            await self.browser_manager.take_screenshot("debug_gmail_loaded.png", "Gmail loaded")
-            
-            compose_selectors = [
-                '[data-tooltip="Compose"]',
-                '[aria-label="Compose"]',
-                '[role="button"]:has-text("Compose")',
-                '.T-I.T-I-KE.L3',  # Gmail's compose button class
-                '[data-tooltip="Soạn"]',  # Vietnamese
-                '[aria-label="Soạn"]',
-                'div[role="button"]:has-text("Compose")',
-                'button:has-text("Compose")'
-            ]
+            if page is self.browser_manager.get_page():
+                await self.browser_manager.take_screenshot("debug_gmail_loaded.png", "Gmail loaded")
             
             compose_found = False
-            for i, selector in enumerate(compose_selectors):
+            for i, selector in enumerate(COMPOSE_BUTTON_SELECTORS):
                 try:
-                    await self.page.wait_for_selector(selector, timeout=3000)
+                    await page.wait_for_selector(selector, timeout=3000)
                     compose_found = True
                     break
                 except:
@@ -88,25 +374,19 @@ class GmailAutoSender:
             if compose_found:
                 return True
             
-            await self.page.screenshot(path="debug_gmail_no_compose.png")
+            await page.screenshot(path="debug_gmail_no_compose.png")
             
         except Exception as e:
-            await self.page.screenshot(path="debug_gmail_navigation_error.png")
+            await page.screenshot(path="debug_gmail_navigation_error.png")
             return False
     
-    async def open_compose_window(self):
+    async def open_compose_window(self, page=None):
+        page = page or self.page
         try:
-            compose_selectors = [
-                '[data-tooltip="Compose"]',
-                '[aria-label="Compose"]',
-                '[role="button"]:has-text("Compose")',
-                '.T-I.T-I-KE.L3'  # Gmail's compose button class
-            ]
-            
             compose_button = None
-            for selector in compose_selectors:
+            for selector in COMPOSE_BUTTON_SELECTORS:
                 try:
-                    compose_button = await self.page.wait_for_selector(selector, timeout=3000)
+                    compose_button = await page.wait_for_selector(selector, timeout=3000)
                     if compose_button:
                         print(f"Found compose button with selector: {selector}")
                         break
@@ -114,11 +394,11 @@ class GmailAutoSender:
                     continue
             
             if not compose_button:
-                await self.page.screenshot(path="debug_no_compose_button.png")
+                await page.screenshot(path="debug_no_compose_button.png")
                 return False
             
             await compose_button.click()
-            await self.page.wait_for_timeout(2000)
+            await page.wait_for_timeout(2000)
             
             compose_window_selectors = [
                 '[role="dialog"]',
@@ -130,81 +410,94 @@ class GmailAutoSender:
             compose_window = None
             for selector in compose_window_selectors:
                 try:
-                    compose_window = await self.page.wait_for_selector(selector, timeout=5000)
+                    compose_window = await page.wait_for_selector(selector, timeout=5000)
                     if compose_window:
                         break
                 except:
                     continue
             
             if not compose_window:
-                await self.page.screenshot(path="debug_no_compose_window.png")
+                await page.screenshot(path="debug_no_compose_window.png")
                 return False
             
-            await self.page.screenshot(path="debug_compose_window_opened.png")
+            await page.screenshot(path="debug_compose_window_opened.png")
             return True
             
         except Exception as e:
-            await self.page.screenshot(path="debug_compose_error.png")
+            await page.screenshot(path="debug_compose_error.png")
             return False
     
-    async def fill_contenteditable_field(self, element, text):
+    async def fill_contenteditable_field(self, element, text, page=None):
+        page = page or self.page
         try:
             await element.click()
-            await self.page.wait_for_timeout(500)
-            
-            await self.page.keyboard.press('Control+a')
-            await self.page.wait_for_timeout(200)
+            await page.wait_for_timeout(500)
             
-            await self.page.keyboard.type(text)
-            await self.page.wait_for_timeout(500)
+            await page.keyboard.press('Control+a')
             
-            return True
+            return await self.browser_manager.insert_text(text, element, page)
         except Exception as e:
             print(f"Error filling contenteditable field: {e}")
             return False
     
-    async def fill_email_fields(self):
+    def build_email_body(self, record):
+        return self.email_template.render(record, self.email_content_data)["text"]
+    
+    def load_email_template(self):
+        """Load and compile the template on first use; False (reported) if it is missing or malformed."""
+        if self.email_template is not None:
+            return True
+        try:
+            self.email_template = EmailTemplate.load()
+            return True
+        except TemplateError as e:
+            print(f"❌ Email template error: {e}")
+            return False
+    
+    def validate_email_template(self, records):
+        """Check every record renders before any browser or transport work."""
+        if not self.load_email_template():
+            return False
+        
+        problems = self.email_template.validate(records, self.email_content_data)
+        for problem in problems[:20]:
+            print(f"❌ Record {problem['index'] + 1} ({problem['email'] or 'no email'}): "
+                  f"missing {', '.join(problem['missing'])} for template '{self.email_template.name}'")
+        if len(problems) > 20:
+            print(f"❌ ... and {len(problems) - 20} more record(s) with missing fields")
+        return not problems
+    
+    async def _wait_for_first(self, page, selectors, timeout):
+        for i, selector in enumerate(selectors):
+            try:
+                element = await page.wait_for_selector(selector, timeout=timeout)
+                if element:
+                    return element, i, selector
+            except:
+                continue
+        return None, None, None
+    
+    async def fill_email_fields(self, record=None, page=None, dialog=None):
+        """Fill To/Subject/Body; with a ComposeDialog its cached handles are used instead of probing."""
+        page = page or self.page
+        record = record or self.recipient_contact_data
         try:
-            if not self.recipient_contact_data or not self.email_content_data:
+            if not record or not self.email_content_data:
                 return False
             
-            to_email = self.recipient_contact_data.get('Email', '')
+            to_email = record.get('Email', '')
             if to_email:
-                to_selectors = [
-                    # Most common Gmail selectors
-                    '[name="to"] [contenteditable="true"]',
-                    '[aria-label="To recipients"] [contenteditable="true"]',
-                    'div[aria-label="To recipients"] [contenteditable="true"]',
-                    '[role="combobox"][aria-label*="To"]',
-                    
-                    # Fallback selectors
-                    'input[name="to"]',
-                    'textarea[name="to"]',
-                    '[aria-label="To"]',
-                    '.oL.aDm [contenteditable="true"]',
-                    '[role="textbox"][aria-label*="To"]',
-                    '[data-hovercard-id*="to"]',
-                    
-                    # Generic contenteditable in compose area
-                    '.nH [contenteditable="true"]',
-                    '.aYF [contenteditable="true"]'
-                ]
-                
-                to_field = None
-                used_selector = None
-                for i, selector in enumerate(to_selectors):
-                    try:
-                        to_field = await self.page.wait_for_selector(selector, timeout=2000)
-                        if to_field:
-                            print(f"Found To field with selector {i+1}: {selector}")
-                            break
-                    except:
-                        continue
+                if dialog:
+                    to_field = dialog.to_field
+                else:
+                    to_field, i, selector = await self._wait_for_first(page, TO_FIELD_SELECTORS, 2000)
+                    if to_field:
+                        print(f"Found To field with selector {i+1}: {selector}")
                 
                 if to_field:
                     try:
                         await to_field.fill(to_email)
-                        await self.page.wait_for_timeout(1000)
+                        await page.wait_for_timeout(1000)
                         
                         value = await to_field.input_value() if hasattr(to_field, 'input_value') else ""
                         if to_email in value:
@@ -212,36 +505,24 @@ class GmailAutoSender:
                     except Exception as e:
                         print(f"Method 1 failed: {e}")
                 else:
-                    await self.page.screenshot(path="debug_no_to_field.png")
+                    await page.screenshot(path="debug_no_to_field.png")
                     return False
             
-            subject = self.recipient_contact_data.get('Subject', '')
+            subject = record.get('Subject', '')
             if subject:
-                subject_selectors = [
-                    'input[name="subjectbox"]',
-                    'input[aria-label="Subject"]',
-                    '[placeholder*="Subject"]',
-                    '[aria-label="Subject"] input',
-                    '.aoT input',  # Gmail subject field class
-                    '[role="textbox"][aria-label*="Subject"]'
-                ]
-                
-                subject_field = None
-                for selector in subject_selectors:
-                    try:
-                        subject_field = await self.page.wait_for_selector(selector, timeout=3000)
-                        if subject_field:
-                            print(f"Found Subject field with selector: {selector}")
-                            break
-                    except:
-                        continue
+                if dialog:
+                    subject_field = dialog.subject_field
+                else:
+                    subject_field, _, selector = await self._wait_for_first(page, SUBJECT_FIELD_SELECTORS, 3000)
+                    if subject_field:
+                        print(f"Found Subject field with selector: {selector}")
                 
                 if subject_field:
                     try:
                         await subject_field.fill(subject)
-                        await self.page.wait_for_timeout(1000)
+                        await page.wait_for_timeout(1000)
                     except:
-                        if await self.fill_contenteditable_field(subject_field, subject):
+                        if await self.fill_contenteditable_field(subject_field, subject, page):
                             print(f"Filled Subject field (contenteditable): {subject}")
                         else:
                             print("Could not fill Subject field")
@@ -251,37 +532,17 @@ class GmailAutoSender:
                     return False
             
             # Fill Body field
-            user_name = self.recipient_contact_data.get('User Name', 'User')
-            content_prev = self.email_content_data.get('content_prev', '')
-            requirements_prev = self.email_content_data.get('requirements_prev', '')
-            
-            email_body = f"""Dear {user_name},
+            email_body = self.build_email_body(record)
             
-            {content_prev}
-
-            {requirements_prev}"""
-            
-            body_selectors = [
-                '[role="textbox"][aria-label*="Message"]',
-                '[contenteditable="true"][role="textbox"]',
-                '.Am.Al.editable',  # Gmail body editor
-                '[aria-label*="Message body"] [contenteditable="true"]',
-                '.ii.gt .a3s',
-                'div[contenteditable="true"][role="textbox"]'
-            ]
-            
-            body_field = None
-            for selector in body_selectors:
-                try:
-                    body_field = await self.page.wait_for_selector(selector, timeout=3000)
-                    if body_field:
-                        print(f"Found Body field with selector: {selector}")
-                        break
-                except:
-                    continue
+            if dialog:
+                body_field = dialog.body_field
+            else:
+                body_field, _, selector = await self._wait_for_first(page, BODY_FIELD_SELECTORS, 3000)
+                if body_field:
+                    print(f"Found Body field with selector: {selector}")
             
             if body_field:
-                if await self.fill_contenteditable_field(body_field, email_body):
+                if await self.fill_contenteditable_field(body_field, email_body, page):
                     print(f"Filled Body field")
                 else:
                     print("Could not fill Body field")
@@ -290,7 +551,8 @@ class GmailAutoSender:
                 print("Could not find Body field")
                 return False
             
-            await self.page.screenshot(path="debug_email_filled.png")
+            if not dialog:
+                await page.screenshot(path="debug_email_filled.png")
             
             try:
                 to_verification_selectors = [
@@ -300,10 +562,12 @@ class GmailAutoSender:
                     '.vR .go span'  # Another recipient indicator
                 ]
                 
+                # Scope to the dialog so another open compose window cannot satisfy the check
+                scope = dialog.element if dialog else page
                 to_verified = False
                 for selector in to_verification_selectors:
                     try:
-                        elements = await self.page.query_selector_all(selector)
+                        elements = await scope.query_selector_all(selector)
                         if len(elements) > 0:
                             print(f"To field verification passed: found {len(elements)} recipient(s)")
                             to_verified = True
@@ -320,103 +584,98 @@ class GmailAutoSender:
             
         except Exception as e:
             print(f"Error filling email fields: {e}")
-            await self.page.screenshot(path="debug_fill_fields_error.png")
+            await page.screenshot(path="debug_fill_fields_error.png")
             return False
     
-    async def send_email(self):
+    def _is_send_response(self, response, clicked_at_ms):
+        # Gmail submits the message as a POST to its sync endpoint; only
+        # requests issued after the click count, so an earlier draft save
+        # finishing late is not mistaken for the send
+        request = response.request
+        if request.method != "POST" or not response.ok:
+            return False
+        if "mail.google.com" not in response.url:
+            return False
+        if not ("/sync/" in response.url and "/i/s" in response.url) and "act=sm" not in response.url:
+            return False
         try:
-            send_selectors = [
-                '[role="button"][aria-label*="Send"]',
-                '[data-tooltip="Send"]',
-                '.T-I.J-J5-Ji.aoO.v7.T-I-atl.L3', 
-                '[role="button"]:has-text("Send")'
-            ]
-            
-            send_button = None
-            for selector in send_selectors:
-                try:
-                    send_button = await self.page.wait_for_selector(selector, timeout=3000)
-                    if send_button:
-                        print(f"Found Send button with selector: {selector}")
-                        break
-                except:
-                    continue
+            return request.timing["startTime"] >= clicked_at_ms
+        except Exception:
+            return True
+    
+    async def confirm_email_sent(self, signals, deadline_ms):
+        """Return the name of the first signal that fires before the deadline, or None."""
+        return await first_signal(signals, deadline_ms)
+    
+    async def _toast_after_click(self, toast, stale):
+        # A toast still showing from the previous send must go away first
+        if stale:
+            await toast.wait_for(state='hidden', timeout=self.send_confirm_deadline_ms)
+        await toast.wait_for(state='visible', timeout=self.send_confirm_deadline_ms)
+    
+    async def send_email(self, page=None, dialog=None, after_click=None, message=None):
+        """Click Send and wait for confirmation.
+        
+        Confirmed by the send request or by a "Message sent" toast shown after
+        the click; the compose dialog closing proves nothing with Undo send.
+        With a ComposeDialog its cached Send button is used. after_click runs
+        right after the click, before confirmation is awaited (ComposeSession
+        uses it to pre-open the next dialog). With the message, an unconfirmed
+        send (or every send, with GMAIL_VERIFY_SENT_FOLDER) is looked up in Sent.
+        """
+        page = page or self.page
+        try:
+            if dialog:
+                send_button = dialog.send_button
+            else:
+                send_button, _, selector = await self._wait_for_first(page, SEND_BUTTON_SELECTORS, 3000)
+                if not send_button:
+                    await page.screenshot(path="debug_no_send_button.png")
+                    return False
+                print(f"Found Send button with selector: {selector}")
+                
+                await page.screenshot(path="debug_before_send.png")
             
-            if not send_button:
-                await self.page.screenshot(path="debug_no_send_button.png")
-                return False
+            # The tab is reused across sends: the last "Message sent" may still be up
+            sent_toast = page.locator(SENT_TOAST_SELECTOR).filter(has_text=SENT_TOAST_TEXT).first
+            try:
+                await sent_toast.wait_for(state='hidden', timeout=TOAST_CLEAR_TIMEOUT_MS)
+                stale_toast = False
+            except Exception:
+                stale_toast = True
             
-            await self.page.screenshot(path="debug_before_send.png")
+            # Listen for the send request before clicking so it cannot be missed
+            clicked_at_ms = datetime.now().timestamp() * 1000
+            network_signal = asyncio.ensure_future(page.wait_for_event(
+                "response",
+                predicate=lambda response: self._is_send_response(response, clicked_at_ms),
+                timeout=self.send_confirm_deadline_ms
+            ))
+            await asyncio.sleep(0)
             
             await send_button.click()
+            if after_click:
+                after_click()
             
-            await self.page.wait_for_timeout(5000)
-            
-            sent_indicators = [
-                '[role="alert"]:has-text("sent")',
-                '.aOy:has-text("sent")',
-                '.b7.J-M',  # Gmail sent notification
-                ':has-text("Message sent")',
-                ':has-text("Your message has been sent")',
-                '[data-tooltip*="sent"]',
-                '.kv:has-text("sent")'  # Gmail status indicator
-            ]
-            
-            sent_confirmed = False
-            for selector in sent_indicators:
-                try:
-                    element = await self.page.wait_for_selector(selector, timeout=5000)
-                    if element:
-                        sent_confirmed = True
-                        break
-                except:
-                    continue
-            
-            if not sent_confirmed:
-                try:
-                    inbox_indicators = [
-                        '[aria-label="Inbox"]',
-                        '.TO.zE',  # Gmail inbox
-                        ':has-text("Inbox")',
-                        '.nZ:has-text("Inbox")'
-                    ]
-                    
-                    for selector in inbox_indicators:
-                        try:
-                            element = await self.page.wait_for_selector(selector, timeout=3000)
-                            if element:
-                                sent_confirmed = True
-                                break
-                        except:
-                            continue
-                except:
-                    pass
+            signals = {
+                "sent_toast": self._toast_after_click(sent_toast, stale_toast),
+                "send_request": network_signal
+            }
             
-            navigated_to_sent = False
-            try:
-                sent_folder_selectors = [
-                    '[href*="sent"]',
-                    '[title="Sent"]',
-                    '.TK .nZ:has-text("Sent")',
-                    '[aria-label="Sent"]'
-                ]
-                
-                for selector in sent_folder_selectors:
-                    try:
-                        sent_folder = await self.page.wait_for_selector(selector, timeout=3000)
-                        if sent_folder:
-                            await sent_folder.click()
-                            await self.page.wait_for_timeout(3000)
-                            navigated_to_sent = True
-                            break
-                    except:
-                        continue
-            except:
-                print("Could not navigate to Sent folder")
+            confirmed_by = await self.confirm_email_sent(signals, self.send_confirm_deadline_ms)
+            sent_confirmed = confirmed_by is not None
+            if sent_confirmed:
+                print(f"✅ Send confirmed by {confirmed_by}")
+            else:
+                print(f"⚠️ No send confirmation within {self.send_confirm_deadline_ms}ms")
             
-            if navigated_to_sent and not sent_confirmed:
-                print("Email likely sent successfully (navigated to Sent folder)")
-                sent_confirmed = True
+            if message and (self.verify_sent_folder or not sent_confirmed):
+                found = await self.find_in_sent_folder(message, page)
+                if found and not sent_confirmed:
+                    print(f"📤 {message['to']}: found in Sent, send confirmed")
+                    sent_confirmed = True
+                elif not found and sent_confirmed:
+                    print(f"⚠️ {message['to']}: confirmed by {confirmed_by} but not (yet) found in Sent")
             
             # Capture final proof screenshot
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -425,7 +684,7 @@ class GmailAutoSender:
             self.sent_proof_path = os.path.join(data_dir, f"../data/sent_proof_{timestamp}.png")
             
             os.makedirs(data_dir, exist_ok=True)
-            await self.page.screenshot(path=self.sent_proof_path)
+            await page.screenshot(path=self.sent_proof_path)
 
             print(f"Proof screenshot saved: {self.sent_proof_path}")
 
@@ -433,25 +692,56 @@ class GmailAutoSender:
             
         except Exception as e:
             print(f"Error sending email: {e}")
-            await self.page.screenshot(path="debug_send_error.png")
+            await page.screenshot(path="debug_send_error.png")
             return False
     
     async def send_email_workflow(self):
         try:
-            # Load data from previous levels
-            if not self.load_recipient_contact_data():
+            # Load data from previous levels unless it was handed over in memory (pipeline.py)
+            if self.recipient_contact_data is None and not self.load_recipient_contact_data():
+                return False
+            
+            if self.email_content_data is None and not self.load_history_content_data():
                 return False
             
-            if not self.load_history_content_data():
+            if not self.validate_email_template([self.recipient_contact_data]):
                 return False
             
+            message = self.build_message(self.recipient_contact_data)
+            if not self.unsent_records([self.recipient_contact_data]):
+                if not self.held_records:
+                    print(f"✅ Email to {message['to']} already confirmed in the send ledger, skipping")
+                    return True
+                if not self.can_check_sent_folder():
+                    return False
+            
+            if not self.transport.needs_browser:
+                await self.transport.start()
+                try:
+                    self.record_send_attempt(message)
+                    success, error = await self.transport.send(message)
+                    self.record_send_result(message, success, error)
+                finally:
+                    await self.transport.close()
+                
+                if not success:
+                    print(f"❌ {self.transport.name} transport failed: {error}")
+                    return False
+                
+                print(f"✅ Email sent successfully via {self.transport.name}!")
+                return True
+            
             # Setup browser
             await self.browser_manager.setup_browser()
             
-            # Navigate to Gmail
-            if not await self.browser_manager.navigate_to_url("https://mail.google.com", 8000):
+            # Navigate to Gmail unless the tab is already there
+            if not self.on_gmail() and not await self.browser_manager.navigate_to_url("https://mail.google.com", 8000, page=self.page):
                 return False
             
+            if self.held_records and not await self.clear_held_records():
+                # Found in Sent (now confirmed), or still undecided
+                return not self.held_records
+            
             # Open compose window
             if not await self.open_compose_window():
                 return False
@@ -461,8 +751,11 @@ class GmailAutoSender:
                 return False
             
             # Send email
-            if not await self.send_email():
+            self.record_send_attempt(message)
+            if not await self.send_email(message=message):
+                self.record_send_result(message, False, "Send not confirmed")
                 return False
+            self.record_send_result(message, True)
             
             print("✅ Email sent successfully!")
             return True
@@ -474,24 +767,364 @@ class GmailAutoSender:
         finally:
             await self.cleanup_browser()
     
+    def compose_session(self, page=None):
+        page = page or self.page
+        session = self.compose_sessions.get(id(page))
+        if session is None:
+            session = ComposeSession(self, page, prewarm=self.prewarm_compose)
+            self.compose_sessions[id(page)] = session
+        return session
+    
+    async def close_compose_sessions(self):
+        sessions, self.compose_sessions = list(self.compose_sessions.values()), {}
+        for session in sessions:
+            await session.close()
+    
+    async def send_to_record(self, record, page=None, message=None):
+        """Compose and send one email for an L1 record through the tab's compose session."""
+        return await self.compose_session(page).send(record, message)
+    
+    def build_messages(self, records):
+        """Messages for a batch of records, rendered in one pass (text body plus optional html)."""
+        rendered = self.email_template.render_batch(records, self.email_content_data)
+        return [
+            {
+                "to": record.get('Email', ''),
+                "subject": record.get('Subject', ''),
+                "body": bodies["text"],
+                "html": bodies["html"],
+                "record": record
+            }
+            for record, bodies in zip(records, rendered)
+        ]
+    
+    def build_message(self, record):
+        return self.build_messages([record])[0]
+    
+    def message_key(self, message):
+        return SendLedger.message_key(message["to"], message["subject"], message["body"])
+    
+    def unsent_records(self, records):
+        """Records still to send: drops ledger-confirmed messages and in-run duplicates.
+        
+        One batched ledger lookup, so a rerun over a mostly-sent list costs
+        milliseconds and no browser. Records whose last send was left
+        unconfirmed go to held_records instead (see clear_held_records).
+        """
+        keyed = [(self.message_key(message), message["record"]) for message in self.build_messages(records)]
+        entries = self.ledger.lookup(key for key, _ in keyed) if self.ledger else {}
+        
+        unsent, held, seen = [], [], set()
+        for key, record in keyed:
+            status = entries[key]["status"] if key in entries else None
+            if status == "confirmed" or key in seen:
+                continue
+            seen.add(key)
+            if status == "attempted" and not self.release_unconfirmed:
+                held.append(record)
+            else:
+                unsent.append(record)
+        
+        self.held_records = held
+        if held:
+            print(f"⏸️ Holding {len(held)} record(s) whose earlier send was never confirmed: "
+                  + ", ".join(record.get('Email', '') for record in held[:10]) + (" ..." if len(held) > 10 else ""))
+            print("   They may already have gone out. Check the Sent folder, or set "
+                  "SEND_LEDGER_RELEASE_UNCONFIRMED=true to send them again.")
+        return unsent
+    
+    def can_check_sent_folder(self):
+        return self.transport.needs_browser and self.check_sent_folder_for_held
+    
+    async def find_in_sent_folder(self, message, page=None):
+        """Search Sent for this recipient and subject: True if a result row shows
+        both, False if Gmail reports no match, None if the search could not be
+        confirmed (held records stay held)."""
+        page = page or self.page
+        gmail_url = os.getenv('GMAIL_URL', 'https://mail.google.com').split('#')[0].rstrip('/')
+        if '/mail/' not in gmail_url:
+            gmail_url += '/mail/u/0'
+        # Quotes would end the phrase early; Gmail search ignores punctuation anyway
+        subject = " ".join(message["subject"].replace('"', ' ').split())
+        recipient = message["to"].replace('"', '').strip()
+        query = f'in:sent to:{recipient} subject:"{subject}"'
+        results = 'div[role="main"] tr.zA, div[role="main"] td.TC'
+        
+        try:
+            # Mark what the tab shows now: a hash change alone leaves the old list
+            # on screen until the search view replaces it
+            await page.evaluate(
+                "selector => document.querySelectorAll(selector).forEach(e => e.setAttribute('data-stale', '1'))",
+                results
+            )
+            await page.goto(f"{gmail_url}/#search/{urllib.parse.quote_plus(query)}")
+            await page.wait_for_function("() => location.hash.startsWith('#search/')", timeout=10000)
+            await page.wait_for_selector(
+                'div[role="main"] tr.zA:not([data-stale]), div[role="main"] td.TC:not([data-stale])',
+                state="visible", timeout=10000
+            )
+            return await page.evaluate(
+                """([recipient, subject]) => {
+                    const fresh = [...document.querySelectorAll('div[role="main"] tr.zA:not([data-stale])')]
+                        .filter(row => row.offsetParent !== null);
+                    if (!fresh.length) {
+                        const empty = [...document.querySelectorAll('div[role="main"] td.TC:not([data-stale])')];
+                        return empty.some(cell => cell.offsetParent !== null) ? false : null;
+                    }
+                    const normalize = text => (text || '').replace(/"/g, ' ').replace(/\\s+/g, ' ').trim().toLowerCase();
+                    const found = fresh.some(row =>
+                        [...row.querySelectorAll('[email]')].some(e => e.getAttribute('email').toLowerCase() === recipient.toLowerCase())
+                        && [...row.querySelectorAll('span.bog, span.bqe')].some(e => normalize(e.textContent) === normalize(subject))
+                    );
+                    // Results that do not show this message exactly: cannot tell either way
+                    return found ? true : null;
+                }""",
+                [recipient, subject]
+            )
+        except Exception as e:
+            print(f"⚠️ Sent folder search for {message['to']} failed: {e}")
+            return None
+    
+    async def clear_held_records(self, page=None):
+        """Settle held records against the Sent folder; returns the ones safe to send.
+        
+        Found in Sent: marked confirmed in the ledger. Not found: released.
+        Search failed: still held.
+        """
+        if not self.held_records or not self.can_check_sent_folder():
+            return []
+        
+        released, still_held = [], []
+        for record in self.held_records:
+            message = self.build_message(record)
+            found = await self.find_in_sent_folder(message, page)
+            if found:
+                print(f"📤 {message['to']}: found in Sent, marking confirmed")
+                self.record_send_result(message, True)
+            elif found is False:
+                print(f"🔁 {message['to']}: not in Sent, sending again")
+                released.append(record)
+            else:
+                still_held.append(record)
+        
+        self.held_records = still_held
+        return released
+    
+    def record_send_attempt(self, message):
+        if self.ledger:
+            self.ledger.record_attempt(self.message_key(message), message["to"], message["subject"], self.transport.name)
+    
+    def record_send_result(self, message, success, error=None):
+        if self.ledger:
+            self.ledger.record_result(self.message_key(message), success, error)
+    
+    def load_quota_usage(self):
+        """Seed quota_used from the ledger's confirmations in the last 24 hours."""
+        self.quota_used = self.ledger.confirmed_since(datetime.now() - timedelta(days=1)) if self.ledger else 0
+        if self.quota_used:
+            print(f"📮 {self.quota_used}/{self.daily_quota} of the daily quota used in the last 24h")
+    
+    def reserve_quota_slot(self):
+        if self.quota_used >= self.daily_quota:
+            return False
+        self.quota_used += 1
+        return True
+    
+    async def send_merge_message(self, index, message, page, bucket):
+        """Send one mail merge message under the rate limit and record it in the ledger.
+        
+        A quota slot is reserved before waiting for a token, so concurrent
+        workers can never overshoot daily_quota; a failed send gives it back.
+        Returns the result entry written to the mail merge report.
+        """
+        started = datetime.now()
+        if not self.reserve_quota_slot():
+            success, error = False, "Daily sending quota reached"
+        else:
+            success, error = False, None
+            try:
+                await bucket.acquire()
+                started = datetime.now()
+                self.record_send_attempt(message)
+                try:
+                    success, error = await self.transport.send(message, page)
+                except Exception as e:
+                    success, error = False, str(e)
+                self.record_send_result(message, success, error)
+            finally:
+                # Only a confirmed send uses up the quota
+                if not success:
+                    self.quota_used -= 1
+        latency = (datetime.now() - started).total_seconds()
+        
+        return {
+            "index": index,
+            "email": message["to"],
+            "subject": message["subject"],
+            "success": success,
+            "error": error,
+            "latency_seconds": round(latency, 3),
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    def report_merge_result(self, result, report_file):
+        # Stream each result as soon as it is known
+        report_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+        report_file.flush()
+        print(f"{'✅' if result['success'] else '❌'} [{result['index'] + 1}] {result['email']} "
+              f"in {result['latency_seconds']:.1f}s" + (f" - {result['error']}" if result['error'] else ""))
+    
+    async def _merge_worker(self, page, pending, bucket, report_file, results):
+        while True:
+            try:
+                index, message = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            
+            result = await self.send_merge_message(index, message, page, bucket)
+            results.append(result)
+            self.report_merge_result(result, report_file)
+    
+    def merge_report_path(self):
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        return os.path.join(os.path.dirname(current_dir), "data", "level3_mailmerge_report.jsonl")
+    
+    def new_send_bucket(self):
+        return TokenBucket(self.send_rate_per_minute / 60, self.send_burst)
+    
+    async def open_merge_pages(self, workers):
+        """One page per worker: the Gmail tab plus extra tabs for the browser
+        transport, or None placeholders for transports that need no page."""
+        if not self.transport.needs_browser:
+            return [None] * workers
+        
+        pages = [self.page]
+        for _ in range(workers - 1):
+            try:
+                page = await self.browser_manager.new_page()
+                await self.navigate_to_gmail(page)
+                pages.append(page)
+            except Exception as e:
+                print(f"⚠️ Could not open extra Gmail tab: {e}")
+        return pages
+    
+    async def close_merge_pages(self, pages):
+        await self.close_compose_sessions()
+        for page in pages[1:]:
+            if page is None:
+                continue
+            try:
+                await page.close()
+            except Exception:
+                pass
+    
+    async def send_mail_merge(self, report_path=None):
+        """Send one email per L1 record through a queue of workers.
+        
+        MAIL_MERGE_CONCURRENCY workers (compose tabs for the browser
+        transport) work the queue in parallel and share a token bucket of
+        GMAIL_SEND_RATE_PER_MINUTE. Per-recipient results are appended to
+        data/level3_mailmerge_report.jsonl as they complete. The browser
+        transport requires setup_browser(); returns the list of results.
+        """
+        report_path = report_path or self.merge_report_path()
+        os.makedirs(os.path.dirname(report_path), exist_ok=True)
+        
+        pending = asyncio.Queue()
+        for index, message in enumerate(self.build_messages(self.recipient_records)):
+            pending.put_nowait((index, message))
+        
+        bucket = self.new_send_bucket()
+        self.load_quota_usage()
+        
+        workers = max(1, min(self.merge_concurrency, len(self.recipient_records)))
+        pages = await self.open_merge_pages(workers)
+        
+        print(f"📨 Mail merge: {len(self.recipient_records)} recipient(s), {len(pages)} {self.transport.name} worker(s), "
+              f"{self.send_rate_per_minute:g}/min")
+        
+        results = []
+        try:
+            with open(report_path, 'a', encoding='utf-8') as report_file:
+                await asyncio.gather(*[
+                    self._merge_worker(page, pending, bucket, report_file, results)
+                    for page in pages
+                ])
+        finally:
+            await self.close_merge_pages(pages)
+        
+        sent = sum(1 for result in results if result["success"])
+        print(f"📊 Mail merge finished: {sent}/{len(results)} sent, report: {report_path}")
+        return results
+    
+    async def send_mail_merge_workflow(self):
+        try:
+            if not self.recipient_records and not self.load_all_recipient_records():
+                return False
+            
+            if self.email_content_data is None and not self.load_history_content_data():
+                return False
+            
+            if not self.validate_email_template(self.recipient_records):
+                return False
+            
+            unsent = self.unsent_records(self.recipient_records)
+            skipped = len(self.recipient_records) - len(unsent) - len(self.held_records)
+            if skipped:
+                print(f"⏭️ Skipping {skipped} record(s) already confirmed in the send ledger")
+            if not unsent and not (self.held_records and self.can_check_sent_folder()):
+                print("✅ Nothing left to send")
+                return not self.held_records
+            
+            await self.transport.start()
+            
+            if self.transport.needs_browser:
+                await self.browser_manager.setup_browser()
+                
+                if not self.on_gmail() and not await self.navigate_to_gmail():
+                    return False
+                
+                if self.held_records:
+                    unsent += await self.clear_held_records()
+                    if not unsent:
+                        return not self.held_records
+            
+            self.recipient_records = unsent
+            results = await self.send_mail_merge()
+            return bool(results) and all(result["success"] for result in results) and not self.held_records
+            
+        except Exception as e:
+            print(f"❌ Error in mail merge workflow: {e}")
+            return False
+        
+        finally:
+            await self.transport.close()
+            await self.cleanup_browser()
+    
     async def cleanup_browser(self):
         """Clean up browser resources using browser manager"""
-        await self.browser_manager.cleanup_browser(keep_browser_open=True)
+        await self.close_compose_sessions()
+        if self.owns_browser:
+            await self.browser_manager.cleanup_browser(keep_browser_open=True)
+    
+    def build_send_report(self, success=True):
+        """The level3_send_report.json payload L4 reads."""
+        return {
+            "level3_execution": {
+                "timestamp": datetime.now().isoformat(),
+                "success": success,
+                "recipient": self.recipient_contact_data.get('Email', '') if self.recipient_contact_data else '',
+                "subject": self.recipient_contact_data.get('Subject', '') if self.recipient_contact_data else '',
+                "proof_screenshot": self.sent_proof_path,
+                "level1_data_used": self.recipient_contact_data,
+                "level2_data_used": self.email_content_data
+            }
+        }
     
     def save_send_report(self, success=True):
         """Save sending report with proof"""
         try:
-            report = {
-                "level3_execution": {
-                    "timestamp": datetime.now().isoformat(),
-                    "success": success,
-                    "recipient": self.recipient_contact_data.get('Email', '') if self.recipient_contact_data else '',
-                    "subject": self.recipient_contact_data.get('Subject', '') if self.recipient_contact_data else '',
-                    "proof_screenshot": self.sent_proof_path,
-                    "level1_data_used": self.recipient_contact_data,
-                    "level2_data_used": self.email_content_data
-                }
-            }
+            report = self.build_send_report(success)
             
             current_dir = os.path.dirname(os.path.abspath(__file__))
             data_dir = os.path.join(os.path.dirname(current_dir), "data")
@@ -511,13 +1144,16 @@ async def main():
     sender = GmailAutoSender()
 
     cdp_available = await sender.browser_manager.check_cdp_connection()
-    if not cdp_available:
+    if sender.transport.needs_browser and not cdp_available:
         print("No browser found via CDP. Please start Chrome with CDP enabled.")
         print("Run: start-chrome-cdp-simple.bat")
         return
     
     try:
-        success = await sender.send_email_workflow()
+        if os.getenv('MAIL_MERGE', '').lower() in ('1', 'true', 'yes'):
+            success = await sender.send_mail_merge_workflow()
+        else:
+            success = await sender.send_email_workflow()
         sender.save_send_report(success)
         
         if success:
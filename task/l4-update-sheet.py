@@ -1,21 +1,142 @@
 import os
+import re
 import json
+import time
 import asyncio
 from datetime import datetime
 from playwright.async_api import async_playwright
 from dotenv import load_dotenv
+from async_signals import first_signal
 from browser_manager import BrowserManager
+from history_store import load_history_snapshot
+from a1_notation import A1Range, cell_to_index, index_to_cell, group_cells_into_blocks
+from sheets_name_box import NameBox
+from sheet_export import (
+    extract_sheet_id_from_url, extract_gid_from_url, read_sheet_grid, diff_cell_values, compare_cell_values
+)
 
 load_dotenv()
 
+# Status block written by L4: headers in row 1, values from row 2 on
+STATUS_HEADERS = ["Status", "Send Date", "History Content", "History Date"]
+STATUS_TOP_LEFT = "E1"
+
+# Ways select_cell can reach a cell, in default order; see select_cell
+SELECT_CELL_METHODS = ["name_box", "go_to", "direct_click"]
+
+# A method that fails this many times without ever succeeding is dropped for the session
+SELECT_METHOD_MAX_FAILURES = 2
+
+# Sheets persists edits with POSTs to /spreadsheets/d/<id>/save
+SAVE_REQUEST_PATTERN = re.compile(r'/spreadsheets/d/[^/]+/save\b')
+
+# Title-bar save status ("Saving..." -> "All changes saved in Drive")
+SAVE_INDICATOR_SELECTOR = '.docs-save-indicator-badge, #docs-save-indicator-badge, .docs-title-save-label-text'
+SAVED_INDICATOR_PATTERN = r'all changes saved|saved to drive|đã lưu'
+
+# Becomes true once the indicator has left the saved state and come back to it
+SAVED_INDICATOR_JS = """
+([selector, pattern]) => {
+    const indicator = document.querySelector(selector);
+    const text = indicator ? (indicator.innerText || indicator.getAttribute('aria-label') || '') : '';
+    const saved = new RegExp(pattern, 'i').test(text);
+    if (!saved) window.__l4SawUnsaved = true;
+    return saved && window.__l4SawUnsaved === true;
+}
+"""
+
+class SaveTracker:
+    """Follows the Sheets save requests of one page.
+    
+    A batch is persisted once at least one save request issued after it
+    has finished and none is still in flight. Requests are numbered as they
+    start, so a save that was already in flight when the batch was made
+    never counts for it.
+    """
+    
+    def __init__(self, page):
+        self.page = page
+        self.in_flight = {}
+        self.started = 0
+        self.last_finished = 0
+        self.changed = asyncio.Event()
+        
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_request_done)
+        page.on("requestfailed", self._on_request_done)
+    
+    def _is_save_request(self, request):
+        return request.method == "POST" and SAVE_REQUEST_PATTERN.search(request.url) is not None
+    
+    def _on_request(self, request):
+        if self._is_save_request(request):
+            self.started += 1
+            self.in_flight[request] = self.started
+            self.changed.set()
+    
+    def _on_request_done(self, request):
+        if request in self.in_flight:
+            sequence = self.in_flight.pop(request)
+            if request.failure is None:
+                self.last_finished = max(self.last_finished, sequence)
+            self.changed.set()
+    
+    async def wait_saved(self, since_started):
+        """Wait for a save request numbered above since_started to finish, with none in flight."""
+        while self.last_finished <= since_started or self.in_flight:
+            self.changed.clear()
+            await self.changed.wait()
+
+def values_to_tsv(values):
+    """Serialize a 2D block as the tab-separated text Sheets parses on paste.
+    
+    Rows are padded to the same width; values containing tabs, newlines or
+    quotes are quoted so they stay in one cell.
+    """
+    width = max((len(row) for row in values), default=0)
+    lines = []
+    for row in values:
+        fields = []
+        for value in list(row) + [""] * (width - len(row)):
+            value = "" if value is None else str(value)
+            if any(char in value for char in '\t\n\r"'):
+                value = '"' + value.replace('"', '""') + '"'
+            fields.append(value)
+        lines.append("\t".join(fields))
+    return "\n".join(lines)
+
 class SheetsUpdater:
-    def __init__(self, sheet_url, cdp_port=9222):
+    def __init__(self, sheet_url, cdp_port=9222, browser_manager=None):
         self.sheet_url = sheet_url
-        self.browser_manager = BrowserManager(cdp_port, debug=True)
+        
+        # A shared manager (pipeline.py) stays open; only one created here is cleaned up
+        self.owns_browser = browser_manager is None
+        self.browser_manager = browser_manager or BrowserManager(cdp_port, debug=True)
         self.updated_sheet_url = None
         self.email_send_data = None
         self.history_data = None
         
+        # Planned (top_left, values) writes; None means write the whole status block
+        self.pending_writes = None
+        
+        # A1 ranges written so far; on_range_written(written_ranges) lets a caller checkpoint them
+        self.written_ranges = []
+        self.on_range_written = None
+        
+        # Every write waits for Sheets to confirm the save; latencies are reported per batch
+        self.save_timeout_ms = int(os.getenv('SHEETS_SAVE_TIMEOUT_MS', '15000'))
+        self.save_tracker = None
+        self.persist_latencies = []
+        
+        # Read-back verification: failed cells are rewritten up to this many extra times
+        self.verify_retries = int(os.getenv('SHEETS_VERIFY_RETRIES', '2'))
+        self.verification_report = None
+        
+        # Date order of the sheet's locale, for reading back dates Sheets reformats
+        self.date_dayfirst = os.getenv('SHEETS_DATE_DAYFIRST', 'false').lower() in ('1', 'true', 'yes')
+        
+        self.reset_selection_cache()
+        
     async def setup_browser(self):
         try:
             success = await self.browser_manager.setup_browser()
@@ -50,7 +171,10 @@ class SheetsUpdater:
                 }
             
             history_file_path = os.path.join(data_dir, "history.json")
-            if os.path.exists(history_file_path):
+            stored_history = load_history_snapshot(extract_sheet_id_from_url(self.sheet_url))
+            if stored_history:
+                self.history_data = stored_history
+            elif os.path.exists(history_file_path):
                 with open(history_file_path, 'r', encoding='utf-8') as f:
                     self.history_data = json.load(f)
             else:
@@ -66,6 +190,7 @@ class SheetsUpdater:
     
     async def navigate_to_sheet(self):
         try:
+            self.reset_selection_cache()
             success = await self.browser_manager.navigate_to_url(self.sheet_url, 5000)
             if success:
                 await self.browser_manager.take_screenshot("original_sheet_loaded", "Original sheet loaded")
@@ -75,192 +200,115 @@ class SheetsUpdater:
         except Exception as e:
             return False
     
-    async def select_cell(self, cell_reference):
-        try:
-            print(f"🎯 Attempting to select cell: {cell_reference}")
-            
-            # Method 1: Try to use name box
-            name_box_selectors = [
-                'input.waffle-name-box',
-                '#t-name-box',
-                'input[class*="waffle-name-box"]',
-                'input[id*="name-box"]',
-                '.jfk-textinput.waffle-name-box',
-                '[data-tooltip*="Name box"]',
-                'input[placeholder*="A1"]',
-                'input[aria-label*="Name box"]',
-                'input[title*="Name box"]'
-            ]
-            
-            name_box = None
-            for selector in name_box_selectors:
-                try:
-                    # Wait for element to exist
-                    element = await self.page.query_selector(selector)
-                    if element:
-                        # Check if element is visible and enabled
-                        is_visible = await element.is_visible()
-                        is_enabled = await element.is_enabled()
-                        if is_visible and is_enabled:
-                            name_box = element
-                            print(f"✅ Found name box with selector: {selector}")
-                            break
-                        else:
-                            print(f"⚠️ Name box found but not usable (visible: {is_visible}, enabled: {is_enabled})")
-                except Exception as e:
-                    print(f"⚠️ Error checking selector {selector}: {e}")
-                    continue
-            
-            if name_box:
-                try:
-                    # Try name box method
-                    await name_box.click()
-                    await self.page.wait_for_timeout(500)
-                    
-                    # Clear existing content
-                    await self.page.keyboard.press('Control+a')
-                    await self.page.wait_for_timeout(200)
-                    
-                    # Type cell reference
-                    await name_box.type(cell_reference)
-                    await self.page.wait_for_timeout(500)
-                    
-                    # Press Enter to navigate
-                    await self.page.keyboard.press('Enter')
-                    await self.page.wait_for_timeout(2000)
-                    
-                    print(f"✅ Selected cell {cell_reference} using name box")
-                    return True
-                    
-                except Exception as e:
-                    print(f"⚠️ Name box method failed: {e}, trying alternative methods...")
-            
-            # Method 2: Try keyboard shortcut (Ctrl+G)
-            try:
-                print("🔄 Trying keyboard shortcut method (Ctrl+G)...")
-                await self.page.keyboard.press('Control+g')
-                await self.page.wait_for_timeout(1000)
-                
-                # Look for "Go to" dialog
-                go_to_selectors = [
-                    'input[placeholder*="Enter"]',
-                    'input[aria-label*="range"]',
-                    'input[type="text"]'
-                ]
-                
-                for selector in go_to_selectors:
-                    input_element = await self.page.query_selector(selector)
-                    if input_element:
-                        try:
-                            await input_element.type(cell_reference)
-                            await self.page.wait_for_timeout(300)
-                            await self.page.keyboard.press('Enter')
-                            await self.page.wait_for_timeout(2000)
-                            print(f"✅ Selected cell {cell_reference} using Ctrl+G")
-                            return True
-                        except:
-                            continue
-                            
-            except Exception as e:
-                print(f"⚠️ Keyboard shortcut method failed: {e}")
-            
-            # Method 3: Try clicking on cell directly (for simple cases)
+    def reset_selection_cache(self):
+        """Forget what select_cell learned; called whenever a page is (re)loaded."""
+        self.select_method = None
+        self.select_method_selectors = {}
+        self.select_method_stats = {method: {"successes": 0, "failures": 0} for method in SELECT_CELL_METHODS}
+        self.dead_select_methods = set()
+        self.name_box = None
+    
+    def _name_box(self):
+        if self.name_box is None or self.name_box.page is not self.page:
+            self.name_box = NameBox(self.page)
+        return self.name_box
+    
+    async def _select_by_name_box(self, cell_reference):
+        return await self._name_box().select(cell_reference)
+    
+    async def _select_by_go_to(self, cell_reference):
+        await self.page.keyboard.press('Control+g')
+        
+        go_to_selectors = [
+            'input[placeholder*="Enter"]',
+            'input[aria-label*="range"]',
+            'input[type="text"]'
+        ]
+        preferred = self.select_method_selectors.get("go_to")
+        selectors = ([preferred] if preferred else []) + [s for s in go_to_selectors if s != preferred]
+        
+        for selector in selectors:
             try:
-                print(f"🔄 Trying direct cell click method for {cell_reference}...")
-                
-                # Parse cell reference (e.g., "E1" -> column E, row 1)
-                if len(cell_reference) >= 2:
-                    column = cell_reference[0].upper()
-                    row = cell_reference[1:]
-                    
-                    # Try to find cell by data attributes or coordinates
-                    cell_selectors = [
-                        f'[data-col="{ord(column) - ord("A")}"][data-row="{int(row) - 1}"]',
-                        f'[aria-label*="{cell_reference}"]',
-                        f'[title*="{cell_reference}"]'
-                    ]
-                    
-                    for selector in cell_selectors:
-                        cell_element = await self.page.query_selector(selector)
-                        if cell_element:
-                            await cell_element.click()
-                            await self.page.wait_for_timeout(1000)
-                            print(f"✅ Selected cell {cell_reference} by direct click")
-                            return True
-                            
-            except Exception as e:
-                print(f"⚠️ Direct click method failed: {e}")
-            
-            # Method 4: Use JavaScript to set active cell
+                input_element = await self.page.wait_for_selector(selector, state='visible', timeout=1000)
+            except Exception:
+                continue
+            await input_element.fill(cell_reference)
+            await self.page.keyboard.press('Enter')
+            self.select_method_selectors["go_to"] = selector
+            return True
+        
+        await self.page.keyboard.press('Escape')
+        return False
+    
+    async def _select_by_direct_click(self, cell_reference):
+        row, col = cell_to_index(cell_reference)
+        cell_selectors = [
+            f'[data-col="{col}"][data-row="{row}"]',
+            f'[aria-label*="{cell_reference}"]',
+            f'[title*="{cell_reference}"]'
+        ]
+        
+        for selector in cell_selectors:
+            cell_element = await self.page.query_selector(selector)
+            if cell_element:
+                await cell_element.click()
+                return True
+        return False
+    
+    async def select_cell(self, cell_reference):
+        """Select a cell, trying the method that worked last first.
+        
+        A method only counts as working once verify_cell_selected agrees, so
+        one that reports success without moving the selection is never
+        pinned. Methods that keep failing without ever succeeding are dropped
+        for the rest of the session, so a selection normally costs a single
+        name box fill + Enter on a cached handle.
+        """
+        methods = {
+            "name_box": self._select_by_name_box,
+            "go_to": self._select_by_go_to,
+            "direct_click": self._select_by_direct_click
+        }
+        order = sorted(
+            (method for method in SELECT_CELL_METHODS if method not in self.dead_select_methods),
+            key=lambda method: method != self.select_method
+        )
+        
+        for method in order:
+            stats = self.select_method_stats[method]
             try:
-                print(f"🔄 Trying JavaScript method for {cell_reference}...")
-                
-                # Try to use Google Sheets internal APIs if available
-                js_code = f"""
-                try {{
-                    // Try different ways to select cell
-                    if (window.google && window.google.sheets) {{
-                        // Google Sheets API method
-                        window.google.sheets.selectRange('{cell_reference}');
-                        return true;
-                    }}
-                    
-                    // Try to find and click name box
-                    const nameBox = document.querySelector('input.waffle-name-box') || 
-                                   document.querySelector('#t-name-box') ||
-                                   document.querySelector('input[class*="waffle-name-box"]');
-                    if (nameBox) {{
-                        nameBox.focus();
-                        nameBox.select();
-                        nameBox.value = '{cell_reference}';
-                        nameBox.dispatchEvent(new Event('input', {{ bubbles: true }}));
-                        nameBox.dispatchEvent(new KeyboardEvent('keydown', {{ key: 'Enter', bubbles: true }}));
-                        return true;
-                    }}
-                    
-                    return false;
-                }} catch (error) {{
-                    console.error('JavaScript selection error:', error);
-                    return false;
-                }}
-                """
-                
-                result = await self.page.evaluate(js_code)
-                if result:
-                    await self.page.wait_for_timeout(2000)
-                    print(f"✅ Selected cell {cell_reference} using JavaScript")
-                    return True
-                    
+                selected = await methods[method](cell_reference)
             except Exception as e:
-                print(f"⚠️ JavaScript method failed: {e}")
-            
-            print(f"❌ All methods failed to select cell {cell_reference}")
-            return False
+                print(f"⚠️ {method} selection of {cell_reference} failed: {e}")
+                selected = False
+            
+            if selected and not await self.verify_cell_selected(cell_reference):
+                print(f"⚠️ {method} did not move the selection to {cell_reference}")
+                selected = False
+            
+            if selected:
+                stats["successes"] += 1
+                if method != self.select_method:
+                    print(f"✅ Selected cell {cell_reference} using {method}")
+                self.select_method = method
+                return True
             
-        except Exception as e:
-            print(f"❌ Critical error selecting cell {cell_reference}: {e}")
-            return False
+            stats["failures"] += 1
+            if not stats["successes"] and stats["failures"] >= SELECT_METHOD_MAX_FAILURES \
+                    and len(self.dead_select_methods) < len(SELECT_CELL_METHODS) - 1:
+                self.dead_select_methods.add(method)
+                print(f"🗑️ Dropping {method} cell selection for this session")
+        
+        print(f"❌ All methods failed to select cell {cell_reference}")
+        return False
     
     async def verify_cell_selected(self, expected_cell):
         """Verify that the correct cell is currently selected"""
         try:
-            # Method 1: Check name box value
-            name_box_selectors = [
-                'input.waffle-name-box',
-                '#t-name-box',
-                'input[class*="waffle-name-box"]'
-            ]
-            
-            for selector in name_box_selectors:
-                name_box = await self.page.query_selector(selector)
-                if name_box:
-                    try:
-                        current_value = await name_box.input_value()
-                        if current_value.upper() == expected_cell.upper():
-                            print(f"✅ Verified cell selection: {current_value}")
-                            return True
-                    except:
-                        continue
+            # Method 1: Check name box value; it names the selected cell, so a mismatch is a failure
+            shows_cell = await self._name_box().shows(expected_cell)
+            if shows_cell is not None:
+                return shows_cell
             
             # Method 2: Check active cell indicators
             try:
@@ -287,33 +335,67 @@ class SheetsUpdater:
             print(f"⚠️ Error verifying cell selection: {e}")
             return True  # Return True to continue execution
     
-    async def update_cell_content(self, content):
-        """Update the content of the currently selected cell"""
+    async def begin_write_ack(self):
+        """Snapshot the save state right before an edit; hand the result to wait_for_write_ack()."""
+        if self.save_tracker is None or self.save_tracker.page is not self.page:
+            self.save_tracker = SaveTracker(self.page)
+        await self.page.evaluate("() => { window.__l4SawUnsaved = false; }")
+        return {"started": time.perf_counter(), "save_sequence": self.save_tracker.started}
+    
+    async def wait_for_write_ack(self, ack, label):
+        """Wait until Sheets has persisted the edits made since begin_write_ack().
+        
+        Whichever comes first counts: the save requests settling, or the
+        save indicator going through "Saving..." back to "All changes saved".
+        """
+        confirmed_by = await first_signal({
+            "save_request": self.save_tracker.wait_saved(ack["save_sequence"]),
+            "saved_indicator": self.page.wait_for_function(
+                SAVED_INDICATOR_JS,
+                arg=[SAVE_INDICATOR_SELECTOR, SAVED_INDICATOR_PATTERN],
+                polling=100,
+                timeout=self.save_timeout_ms
+            )
+        }, self.save_timeout_ms)
+        
+        latency = time.perf_counter() - ack["started"]
+        self.persist_latencies.append({
+            "range": label,
+            "confirmed_by": confirmed_by,
+            "latency_seconds": round(latency, 3)
+        })
+        
+        if confirmed_by:
+            print(f"💾 {label} persisted in {latency:.2f}s ({confirmed_by})")
+            return True
+        print(f"❌ {label} not confirmed saved within {self.save_timeout_ms}ms")
+        return False
+    
+    async def update_cell_content(self, content, label="cell"):
+        """Update the content of the currently selected cell and wait until it is saved"""
         try:
             print(f"✏️ Updating cell content: {content}")
             
-            # Double-click to enter edit mode
+            # Enter edit mode, double-clicking only if F2 did not open the editor
             await self.page.keyboard.press('F2')
-            await self.page.wait_for_timeout(500)
-            
-            # Alternative: Double-click on the cell
             try:
+                await self.page.wait_for_selector('.cell-input[contenteditable="true"]:focus', timeout=1000)
+            except:
                 active_cell = await self.page.query_selector('.active-cell-border')
                 if active_cell:
                     await active_cell.dblclick()
-                    await self.page.wait_for_timeout(500)
-            except:
-                pass
             
-            # Clear existing content and type new content
+            # Clear existing content and insert the new content in one event
             await self.page.keyboard.press('Control+a')
-            await self.page.wait_for_timeout(200)
-            await self.page.keyboard.type(content)
-            await self.page.wait_for_timeout(500)
+            cell_editor = await self.page.query_selector('.cell-input')
+            if not await self.browser_manager.insert_text(content, cell_editor):
+                print(f"⚠️ Cell editor content could not be verified")
             
             # Press Enter to confirm
+            ack = await self.begin_write_ack()
             await self.page.keyboard.press('Enter')
-            await self.page.wait_for_timeout(1000)
+            if not await self.wait_for_write_ack(ack, label):
+                return False
             
             print(f"✅ Updated cell content")
             return True
@@ -322,88 +404,62 @@ class SheetsUpdater:
             print(f"Error updating cell content: {e}")
             return False
     
+    async def select_cell_with_retry(self, cell_reference, attempts=3):
+        for attempt in range(attempts):
+            # select_cell verifies the selection itself
+            if await self.select_cell(cell_reference):
+                return True
+            print(f"⚠️ Selection of {cell_reference} failed, attempt {attempt + 1}")
+            
+            if attempt < attempts - 1:  # Don't wait after last attempt
+                await self.page.wait_for_timeout(1000)
+        
+        print(f"❌ Failed to select {cell_reference} after {attempts} attempts")
+        return False
+    
+    async def write_range(self, top_left, values):
+        """Write a 2D block of values starting at top_left with one selection and one paste.
+        
+        The block is pasted as tab-separated text, so any number of rows and
+        columns lands in a single operation instead of a select/type per cell.
+        """
+        try:
+            if not values:
+                return True
+            
+            rows = len(values)
+            cols = max(len(row) for row in values)
+            row, col = cell_to_index(top_left)
+            range_reference = str(A1Range(row, col, row + rows - 1, col + cols - 1))
+            print(f"📋 Writing {rows}x{cols} block to {range_reference}")
+            
+            if not await self.select_cell_with_retry(top_left):
+                return False
+            
+            ack = await self.begin_write_ack()
+            if not await self.browser_manager.paste_text(values_to_tsv(values)):
+                print(f"❌ Paste into {range_reference} failed")
+                return False
+            
+            if not await self.wait_for_write_ack(ack, range_reference):
+                return False
+            
+            self.written_ranges.append(range_reference)
+            if self.on_range_written:
+                self.on_range_written(self.written_ranges)
+            
+            print(f"✅ Wrote {rows * cols} cell(s) to {range_reference}")
+            return True
+            
+        except Exception as e:
+            print(f"❌ Error writing range at {top_left}: {e}")
+            return False
+    
     async def create_headers_if_needed(self):
         try:
-            headers = {
-                "E1": "Status",
-                "F1": "Send Date", 
-                "G1": "History Content",
-                "H1": "History Date"
-            }
-            
-            # Check and create each header
-            for cell_ref, header_text in headers.items():
-                selection_success = False
-                for attempt in range(3):  # Try up to 3 times
-                    if await self.select_cell(cell_ref):
-                        # Verify selection worked
-                        if await self.verify_cell_selected(cell_ref):
-                            selection_success = True
-                            break
-                        else:
-                            print(f"⚠️ Selection verification failed for {cell_ref}, attempt {attempt + 1}")
-                    
-                    if attempt < 2:  # Don't wait after last attempt
-                        await self.page.wait_for_timeout(1000)
-                
-                if not selection_success:
-                    print(f"❌ Failed to select {cell_ref} after 3 attempts, skipping...")
-                    continue
-                
-                # Check if header already exists
-                try:
-                    current_value = ""
-                    
-                    try:
-                        formula_bar_selectors = [
-                            '#t-formula-bar-input',
-                            '.cell-input',
-                            'input[data-tooltip*="formula"]',
-                            'input[aria-label*="formula"]'
-                        ]
-                        
-                        for selector in formula_bar_selectors:
-                            formula_bar = await self.page.query_selector(selector)
-                            if formula_bar:
-                                try:
-                                    # Check if it's actually an input element before calling input_value
-                                    tag_name = await formula_bar.evaluate('(element) => element.tagName.toLowerCase()')
-                                    if tag_name in ['input', 'textarea']:
-                                        current_value = await formula_bar.input_value()
-                                        if current_value.strip():
-                                            break
-                                    else:
-                                        # Try to get text content instead
-                                        current_value = await formula_bar.text_content()
-                                        if current_value and current_value.strip():
-                                            break
-                                except Exception as inner_e:
-                                    print(f"⚠️ Error getting value from formula bar: {inner_e}")
-                                    continue
-                    except Exception as e:
-                        print(f"⚠️ Error accessing formula bar: {e}")
-                    
-                    # Clean up the current value
-                    current_value = current_value.strip() if current_value else ""
-                    
-                    # Check if header already exists and matches
-                    if current_value == header_text:
-                        print(f"✅ Header {cell_ref} already exists: {current_value}")
-                        continue
-                    elif current_value:
-                        print(f"⚠️ Cell {cell_ref} has different content: '{current_value}' - will update to '{header_text}'")
-                    else:
-                        print(f"📝 Cell {cell_ref} is empty - creating header: {header_text}")
-                    
-                    # Update cell content
-                    await self.update_cell_content(header_text)
-                    await self.browser_manager.take_screenshot(f"header_{cell_ref}_created", f"Header {header_text} created")
-                    await self.page.wait_for_timeout(1000)
-                    
-                except Exception as e:
-                    print(f"⚠️ Error checking {cell_ref} content: {e} - will create header anyway")
-                    await self.update_cell_content(header_text)
-                    await self.page.wait_for_timeout(1000)
+            # Rewriting identical headers is harmless and cheaper than reading them first
+            if not await self.write_range(STATUS_TOP_LEFT, [STATUS_HEADERS]):
+                return False
             
             print("✅ Headers created successfully")
             return True
@@ -412,72 +468,183 @@ class SheetsUpdater:
             await self.browser_manager.take_screenshot("header_creation_error", "Error creating headers")
             return False
 
+    def build_status_row(self):
+        level3_execution = self.email_send_data.get('level3_execution', {})
+        return self.format_status_row(
+            level3_execution.get('success', False),
+            level3_execution.get('timestamp', datetime.now().isoformat())
+        )
+
+    def format_status_row(self, send_success, send_timestamp):
+        """Status values (STATUS_HEADERS order) for one send."""
+        try:
+            send_date = datetime.fromisoformat(send_timestamp.replace('Z', '+00:00'))
+            formatted_send_date = send_date.strftime('%Y-%m-%d %H:%M:%S')
+        except:
+            formatted_send_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+        history_content = self.history_data.get('content_prev', 'No previous content')
+        history_date = self.history_data.get('timestamp_prev', 'No timestamp')
+        
+        return ["✅" if send_success else "❌", formatted_send_date, history_content, history_date]
+
+    def desired_cell_values(self):
+        """Target state of the status block as {A1: value}."""
+        row, col = cell_to_index(STATUS_TOP_LEFT)
+        desired = {}
+        for row_offset, values in enumerate([STATUS_HEADERS, self.build_status_row()]):
+            for col_offset, value in enumerate(values):
+                desired[index_to_cell(row + row_offset, col + col_offset)] = value
+        return desired
+    
+    def read_sheet_grid(self):
+        return read_sheet_grid(extract_sheet_id_from_url(self.sheet_url), extract_gid_from_url(self.sheet_url))
+    
+    def plan_sheet_writes(self):
+        """Diff the desired status block against the sheet's CSV export.
+        
+        Sets pending_writes to the minimal list of blocks to write, which is
+        empty when the sheet already matches. If the export cannot be read,
+        pending_writes stays None and the whole block is written.
+        """
+        try:
+            grid = self.read_sheet_grid()
+        except Exception as e:
+            print(f"⚠️ Could not read sheet export, writing the full status block: {e}")
+            self.pending_writes = None
+            return
+        
+        changed = diff_cell_values(grid, self.desired_cell_values(), self.date_dayfirst)
+        self.pending_writes = group_cells_into_blocks(changed)
+        print(f"🔍 {len(changed)} cell(s) differ from the desired state, "
+              f"{len(self.pending_writes)} range write(s) planned")
+
+    async def write_ranges(self, writes):
+        for top_left, values in writes:
+            if not await self.write_range(top_left, values):
+                await self.browser_manager.take_screenshot("update_error", "Error during row update")
+                return False
+        return True
+
+    async def write_status_rows(self, statuses):
+        """Write {sheet_row: status values} into the status columns.
+        
+        Rows are grouped with group_cells_into_blocks, so consecutive rows go
+        in as one paste.
+        """
+        _, first_col = cell_to_index(STATUS_TOP_LEFT)
+        cells = {}
+        for sheet_row, values in statuses.items():
+            for offset, value in enumerate(values):
+                cells[index_to_cell(sheet_row - 1, first_col + offset)] = value
+        return await self.write_ranges(group_cells_into_blocks(cells))
+
     async def update_sheet_row(self):
         try:
             if not self.email_send_data or not self.history_data:
                 print("Missing required data from previous levels")
                 return False
             
-            if not await self.create_headers_if_needed():
-                print("⚠️ Header creation failed, continuing with data entry...")
-            
-            level3_execution = self.email_send_data.get('level3_execution', {})
-            send_success = level3_execution.get('success', False)
-            send_timestamp = level3_execution.get('timestamp', datetime.now().isoformat())
-            
-            try:
-                send_date = datetime.fromisoformat(send_timestamp.replace('Z', '+00:00'))
-                formatted_send_date = send_date.strftime('%Y-%m-%d %H:%M:%S')
-            except:
-                formatted_send_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            writes = self.pending_writes
+            if writes is None:
+                # Headers and row 2 go in as one E1:H2 block
+                writes = [(STATUS_TOP_LEFT, [STATUS_HEADERS, self.build_status_row()])]
             
-            history_content = self.history_data.get('content_prev', 'No previous content')
-            history_date = self.history_data.get('timestamp_prev', 'No timestamp')
+            print("\n📝 Writing changed status cells...")
+            if not await self.write_ranges(writes):
+                return False
             
-            data_updates = {
-                "E2": ("Status", "✅" if send_success else "❌"),
-                "F2": ("Send Date", formatted_send_date),
-                "G2": ("History Content", history_content),
-                "H2": ("History Date", history_date)
-            }
+            if self.persist_latencies:
+                slowest = max(entry["latency_seconds"] for entry in self.persist_latencies)
+                print(f"💾 {len(self.persist_latencies)} batch(es) persisted, slowest {slowest:.2f}s")
             
-            print("\n📝 Starting row 2 data updates...")
-            for cell_ref, (description, new_value) in data_updates.items():
-                print(f"\n📍 Processing data cell {cell_ref} (expected: '{new_value}')")
-                
-                # Try to select the cell with retry logic
-                selection_success = False
-                for attempt in range(3):  # Try up to 3 times
-                    if await self.select_cell(cell_ref):
-                        # Verify selection worked
-                        if await self.verify_cell_selected(cell_ref):
-                            selection_success = True
-                            break
-                        else:
-                            print(f"⚠️ Selection verification failed for {cell_ref}, attempt {attempt + 1}")
-                    
-                    if attempt < 2:  # Don't wait after last attempt
-                        await self.page.wait_for_timeout(1000)
-                
-                if not selection_success:
-                    print(f"❌ Failed to select {cell_ref} after 3 attempts, skipping...")
-                    continue
-                
             # Take final screenshot
             await self.browser_manager.take_screenshot("row_updated_complete", "Row update completed")
             
-            print("✅ All data entered successfully in row 2")
+            print("✅ Status cells written")
             return True
             
         except Exception as e:
             await self.browser_manager.take_screenshot("update_error", "Error during row update")
             return False
     
+    def verify_written_cells(self):
+        """Re-read the sheet in one export request and compare it with the desired state.
+        
+        Values Sheets reformats (numbers, dates, booleans) count as matching;
+        see sheet_export.values_equivalent. Blocking: run it in a thread.
+        
+        Returns {"checked": n, "mismatches": [{"cell", "expected", "actual"}]},
+        or None when the export cannot be read.
+        """
+        desired = self.desired_cell_values()
+        try:
+            grid = self.read_sheet_grid()
+        except Exception as e:
+            print(f"⚠️ Could not read sheet export for verification: {e}")
+            return None
+        
+        cells, expected, actual = compare_cell_values(grid, desired, self.date_dayfirst)
+        return {
+            "checked": len(desired),
+            "mismatches": [
+                {"cell": cell_reference, "expected": expected_value, "actual": actual_value}
+                for cell_reference, expected_value, actual_value in zip(cells, expected, actual)
+            ]
+        }
+    
+    async def verify_and_repair(self):
+        """Verify the written cells and rewrite only the mismatched ones, a bounded number of times."""
+        for attempt in range(self.verify_retries + 1):
+            report = await asyncio.to_thread(self.verify_written_cells)
+            if report is None:
+                self.save_verification_report({"verified": False, "attempts": attempt + 1})
+                return False
+            
+            mismatches = report["mismatches"]
+            self.save_verification_report({"verified": not mismatches, "attempts": attempt + 1, **report})
+            if not mismatches:
+                print(f"✅ Verified {report['checked']} cell(s) against the sheet export")
+                return True
+            
+            print(f"⚠️ {len(mismatches)}/{report['checked']} cell(s) do not match: "
+                  + ", ".join(mismatch["cell"] for mismatch in mismatches[:10])
+                  + (" ..." if len(mismatches) > 10 else ""))
+            if attempt == self.verify_retries:
+                break
+            
+            retry_writes = group_cells_into_blocks({mismatch["cell"]: mismatch["expected"] for mismatch in mismatches})
+            print(f"🔁 Re-queuing {len(mismatches)} cell(s) in {len(retry_writes)} range write(s)")
+            if not await self.write_ranges(retry_writes):
+                return False
+        
+        print("❌ Sheet still differs from the desired state after retries")
+        return False
+    
+    def save_verification_report(self, report):
+        try:
+            self.verification_report = {"timestamp": datetime.now().isoformat(), **report}
+            
+            current_dir = os.path.dirname(os.path.abspath(__file__))
+            data_dir = os.path.join(os.path.dirname(current_dir), "data")
+            os.makedirs(data_dir, exist_ok=True)
+            
+            with open(os.path.join(data_dir, "level4_verify_report.json"), 'w', encoding='utf-8') as f:
+                json.dump(self.verification_report, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            print(f"⚠️ Could not save verification report: {e}")
+    
     async def execute_sheet_update_process(self):
         try:
-            if not self.load_previous_level_data():
+            # Data handed over in memory (pipeline.py) takes precedence over the level files
+            if (self.email_send_data is None or self.history_data is None) and not self.load_previous_level_data():
                 return False
             
+            await asyncio.to_thread(self.plan_sheet_writes)
+            if self.pending_writes == []:
+                print("✅ Sheet already matches the desired state, nothing to write")
+                return True
+            
             if not await self.setup_browser():
                 return False
             
@@ -487,6 +654,9 @@ class SheetsUpdater:
             if not await self.update_sheet_row():
                 return False
             
+            if not await self.verify_and_repair():
+                return False
+            
             return True
             
         except Exception as e:
@@ -495,7 +665,8 @@ class SheetsUpdater:
             return False
         
         finally:
-            await self.browser_manager.cleanup_browser(keep_browser_open=True)
+            if self.owns_browser:
+                await self.browser_manager.cleanup_browser(keep_browser_open=True)
 
 async def main():
     sheet_url = os.getenv('SHEET_URL', "https://docs.google.com/spreadsheets/d/1lNsIW2A1gmurYZ-DJt65xuX_yEsxyvoqPx84Q2B8rEM/edit?gid=0#gid=0")
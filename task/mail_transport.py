@@ -0,0 +1,218 @@
+import os
+import asyncio
+import smtplib
+from abc import ABC, abstractmethod
+from email.message import EmailMessage
+from typing import Optional, Dict, Any, Tuple
+
+# How L3 hands a rendered message to the outside world. A message is a dict
+# with "to", "subject", a plain-text "body", an optional "html" variant and
+# the L1 "record" it was rendered from.
+
+class MailTransportError(Exception):
+    pass
+
+
+class MailTransport(ABC):
+    """Interface for L3 transports; send() returns (success, error)."""
+
+    name = "base"
+    needs_browser = False
+
+    async def start(self) -> None:
+        pass
+
+    @abstractmethod
+    async def send(self, message: Dict[str, Any], page=None) -> Tuple[bool, Optional[str]]:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class BrowserUITransport(MailTransport):
+    """Drives the Gmail compose UI through GmailAutoSender (the original path)."""
+
+    name = "browser"
+    needs_browser = True
+
+    def __init__(self, sender):
+        self.sender = sender
+
+    async def send(self, message: Dict[str, Any], page=None) -> Tuple[bool, Optional[str]]:
+        return await self.sender.send_to_record(message["record"], page, message)
+
+
+class SMTPTransport(MailTransport):
+    """SMTP submission with a pool of authenticated, reused connections.
+
+    Each pooled connection is used by one send at a time. A connection that
+    drops, or a 4xx reply, is retried on a fresh connection with backoff.
+    Point it at a local stand-in (e.g. `python -m aiosmtpd -n -l localhost:1025`
+    with SMTP_TLS=false) to exercise it without a real mailbox.
+    """
+
+    name = "smtp"
+    needs_browser = False
+
+    def __init__(self, host: str, port: int = 587, username: Optional[str] = None,
+                 password: Optional[str] = None, sender_address: Optional[str] = None,
+                 use_tls: bool = True, use_ssl: bool = False, pool_size: int = 3,
+                 max_retries: int = 3, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender_address = sender_address or username
+        self.use_tls = use_tls
+        self.use_ssl = use_ssl
+        self.pool_size = max(1, pool_size)
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        self.idle_connections: asyncio.Queue = asyncio.Queue()
+        self.open_connections = 0
+        self.pool_lock = asyncio.Lock()
+        self.slot_available = asyncio.Condition(self.pool_lock)
+
+    @classmethod
+    def from_env(cls) -> "SMTPTransport":
+        host = os.getenv('SMTP_HOST')
+        if not host:
+            raise MailTransportError("SMTP_HOST is required for MAIL_TRANSPORT=smtp")
+
+        return cls(
+            host=host,
+            port=int(os.getenv('SMTP_PORT', '587')),
+            username=os.getenv('SMTP_USER') or None,
+            password=os.getenv('SMTP_PASSWORD') or None,
+            sender_address=os.getenv('SMTP_FROM') or None,
+            use_tls=os.getenv('SMTP_TLS', 'true').lower() in ('1', 'true', 'yes'),
+            use_ssl=os.getenv('SMTP_SSL', 'false').lower() in ('1', 'true', 'yes'),
+            pool_size=int(os.getenv('SMTP_POOL_SIZE', '3'))
+        )
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.use_ssl:
+            connection = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+
+        try:
+            if not self.use_ssl:
+                connection.ehlo()
+                if self.use_tls:
+                    connection.starttls()
+                    connection.ehlo()
+
+            if self.username and self.password:
+                connection.login(self.username, self.password)
+        except Exception:
+            # A failed handshake or login must not leave the socket open
+            connection.close()
+            raise
+        return connection
+
+    @staticmethod
+    def _disconnect(connection: smtplib.SMTP) -> None:
+        try:
+            connection.quit()
+        except Exception:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    async def _acquire(self) -> smtplib.SMTP:
+        async with self.pool_lock:
+            while True:
+                if not self.idle_connections.empty():
+                    return self.idle_connections.get_nowait()
+                if self.open_connections < self.pool_size:
+                    self.open_connections += 1
+                    break
+                await self.slot_available.wait()
+
+        try:
+            return await asyncio.to_thread(self._connect)
+        except Exception:
+            await self._discard(None)
+            raise
+
+    async def _release(self, connection: smtplib.SMTP) -> None:
+        async with self.pool_lock:
+            self.idle_connections.put_nowait(connection)
+            self.slot_available.notify()
+
+    async def _discard(self, connection: Optional[smtplib.SMTP]) -> None:
+        if connection is not None:
+            await asyncio.to_thread(self._disconnect, connection)
+        async with self.pool_lock:
+            self.open_connections -= 1
+            self.slot_available.notify()
+
+    def build_email_message(self, message: Dict[str, Any]) -> EmailMessage:
+        email_message = EmailMessage()
+        email_message["From"] = self.sender_address or ""
+        email_message["To"] = message["to"]
+        email_message["Subject"] = message["subject"]
+        email_message.set_content(message["body"])
+        if message.get("html"):
+            email_message.add_alternative(message["html"], subtype="html")
+        return email_message
+
+    async def send(self, message: Dict[str, Any], page=None) -> Tuple[bool, Optional[str]]:
+        email_message = self.build_email_message(message)
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(min(0.5 * 2 ** (attempt - 1), 5))
+
+            try:
+                connection = await self._acquire()
+            except (OSError, smtplib.SMTPException) as e:
+                last_error = f"connect failed: {e}"
+                continue
+
+            # The connection goes back to the pool only when it is known to be
+            # usable; anything else, including cancellation, discards it
+            reusable = False
+            try:
+                await asyncio.to_thread(connection.send_message, email_message)
+                reusable = True
+                return True, None
+            except smtplib.SMTPResponseException as e:
+                last_error = f"{e.smtp_code} {e.smtp_error!r}"
+                if not 400 <= e.smtp_code < 500:
+                    return False, last_error
+            except smtplib.SMTPRecipientsRefused as e:
+                reusable = True
+                return False, f"recipient refused: {e.recipients}"
+            except smtplib.SMTPServerDisconnected as e:
+                last_error = f"connection lost: {e}"
+            except smtplib.SMTPException as e:
+                # e.g. SMTPNotSupportedError; retrying will not help
+                return False, f"send failed: {e}"
+            except OSError as e:
+                last_error = f"connection lost: {e}"
+            finally:
+                if reusable:
+                    await self._release(connection)
+                else:
+                    await self._discard(connection)
+
+        return False, last_error
+
+    async def close(self) -> None:
+        while not self.idle_connections.empty():
+            await self._discard(self.idle_connections.get_nowait())
+
+
+def create_transport(sender, name: Optional[str] = None) -> MailTransport:
+    name = (name or os.getenv('MAIL_TRANSPORT', 'browser')).lower()
+    if name == "browser":
+        return BrowserUITransport(sender)
+    if name == "smtp":
+        return SMTPTransport.from_env()
+    raise MailTransportError(f"Unknown mail transport '{name}' (available: browser, smtp)")
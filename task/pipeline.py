@@ -0,0 +1,588 @@
+import os
+import sys
+import asyncio
+import importlib.util
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+from dotenv import load_dotenv
+from browser_manager import BrowserManager
+from sheet_export import extract_sheet_id_from_url
+from stage_graph import StageGraph
+from row_stream import new_queue, close_queue, drain, drain_batches
+from run_checkpoints import RunCheckpoints, RowIntervals, CheckpointError
+
+load_dotenv()
+
+# Runs L1-L4 as stages of one asyncio process. The levels share a single
+# BrowserManager (one CDP connection) and hand their results to the next stage
+# in memory; each level's output is also checkpointed under
+# data/runs/<run_id>/ (see run_checkpoints.py). Stages are scheduled by their
+# inputs (see build_graph), so the L1 CSV fetch, L2 history capture and Gmail
+# pre-loading overlap. PIPELINE_MODE=stream switches to StreamingPipeline,
+# which mail-merges the sheet row by row instead of level by level.
+# Usage: python task/pipeline.py
+#        python task/pipeline.py resume <run_id>
+
+LEVEL_SCRIPTS = {
+    "level1": "l1-read-sheets.py",
+    "level2": "l2-sheets-ui-edit-history.py",
+    "level3": "l3-gmail-send.py",
+    "level4": "l4-update-sheet.py",
+}
+
+class PipelineError(Exception):
+    pass
+
+
+def load_level_module(name):
+    """Import a level script by name; the hyphenated file names rule out a plain import."""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    spec = importlib.util.spec_from_file_location(f"{name}_script", os.path.join(current_dir, LEVEL_SCRIPTS[name]))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class SheetRecords:
+    """L1 output: every recipient record, plus the first row used by the single-send path."""
+
+    def __init__(self, records: List[Dict[str, str]], first_record: Optional[Dict[str, str]]):
+        self.records = records
+        self.first_record = first_record
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"records": self.records, "first_record": self.first_record}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SheetRecords":
+        return cls(data["records"], data["first_record"])
+
+
+class HistorySnapshot:
+    """L2 output: the history.json payload (legacy D2/D7 fields plus "cells")."""
+
+    def __init__(self, history_data: Dict[str, Any]):
+        self.history_data = history_data
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"history_data": self.history_data}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HistorySnapshot":
+        return cls(data["history_data"])
+
+
+class SendOutcome:
+    """L3 output: whether sending succeeded and the level3_execution report L4 consumes."""
+
+    def __init__(self, success: bool, report: Dict[str, Any]):
+        self.success = success
+        self.report = report
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"success": self.success, "report": self.report}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SendOutcome":
+        return cls(data["success"], data["report"])
+
+
+class SheetUpdateOutcome:
+    """L4 output: whether the status block is written and verified."""
+
+    def __init__(self, success: bool, persist_latencies: List[Dict[str, Any]],
+                 verification_report: Optional[Dict[str, Any]], written_ranges: Optional[List[str]] = None):
+        self.success = success
+        self.persist_latencies = persist_latencies
+        self.verification_report = verification_report
+        self.written_ranges = written_ranges or []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "success": self.success,
+            "persist_latencies": self.persist_latencies,
+            "verification_report": self.verification_report,
+            "written_ranges": self.written_ranges
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SheetUpdateOutcome":
+        return cls(data["success"], data["persist_latencies"], data["verification_report"], data.get("written_ranges"))
+
+
+# Stage outputs that are checkpointed, and restored by `resume`
+CHECKPOINT_TYPES = {
+    "level1": SheetRecords,
+    "level2": HistorySnapshot,
+    "level3": SendOutcome,
+    "level4": SheetUpdateOutcome,
+}
+
+# Environment settings that decide what a run does. They are recorded in the
+# manifest and put back by `resume`, so a resumed run sends the same template
+# through the same transport even if .env has changed since. Credentials and
+# per-machine settings (SMTP_USER/SMTP_PASSWORD, CDP_PORT) are left out.
+RUN_SETTINGS = (
+    "HISTORY_CELLS", "HISTORY_TABS", "HISTORY_REVISIONS", "HISTORY_MAX_DEPTH", "HISTORY_SINCE",
+    "HISTORY_CACHE", "HISTORY_CACHE_TTL_HOURS", "HISTORY_BACKEND", "HISTORY_SNAPSHOT_FETCH",
+    "GMAIL_URL", "LAUNCH_PROFILE", "MAIL_MERGE_CONCURRENCY", "GMAIL_SEND_RATE_PER_MINUTE",
+    "GMAIL_SEND_BURST", "GMAIL_DAILY_QUOTA", "GMAIL_SEND_CONFIRM_DEADLINE_MS",
+    "GMAIL_VERIFY_SENT_FOLDER", "GMAIL_PREWARM_COMPOSE", "EMAIL_TEMPLATE",
+    "MAIL_TRANSPORT", "SMTP_HOST", "SMTP_PORT", "SMTP_FROM", "SMTP_TLS", "SMTP_SSL", "SMTP_POOL_SIZE",
+    "SEND_LEDGER", "SEND_LEDGER_PATH", "SEND_LEDGER_CHECK_SENT_FOLDER", "SEND_LEDGER_RELEASE_UNCONFIRMED",
+    "SHEETS_SAVE_TIMEOUT_MS", "SHEETS_VERIFY_RETRIES", "SHEETS_DATE_DAYFIRST",
+    "STREAM_QUEUE_SIZE", "STREAM_CHUNK_SIZE", "STREAM_STATUS_BATCH", "STREAM_STATUS_BATCH_WAIT_SECONDS",
+)
+
+
+def restore_run_settings(settings: Dict[str, Optional[str]]) -> None:
+    """Put back the environment a run was started with; unset ones are unset again."""
+    changed = []
+    for name, value in settings.items():
+        if os.environ.get(name) == value:
+            continue
+        changed.append(name)
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+    if changed:
+        print(f"⚙️ Using the run's recorded settings for: {', '.join(changed)}")
+
+
+class Pipeline:
+    mode = "stages"
+
+    def __init__(self, sheet_url: str, cdp_port: int = 9222, mail_merge: Optional[bool] = None,
+                 checkpoints: Optional[RunCheckpoints] = None):
+        self.sheet_url = sheet_url
+        self.sheet_id = extract_sheet_id_from_url(sheet_url)
+        self.cdp_port = cdp_port
+        if mail_merge is None:
+            mail_merge = os.getenv('MAIL_MERGE', '').lower() in ('1', 'true', 'yes')
+        self.mail_merge = mail_merge
+
+        self.browser_manager = BrowserManager(cdp_port, debug=True)
+        self.levels = {name: load_level_module(name) for name in LEVEL_SCRIPTS}
+        self.graph = None
+        self.gmail_page = None
+
+        self.checkpoints = checkpoints or RunCheckpoints.create(self.run_config())
+        print(f"🗂️ Run {self.checkpoints.run_id}: {self.checkpoints.run_dir}")
+
+    def run_config(self) -> Dict[str, Any]:
+        """What `resume` needs to rebuild this pipeline."""
+        return {
+            "mode": self.mode,
+            "sheet_url": self.sheet_url,
+            "cdp_port": self.cdp_port,
+            "mail_merge": self.mail_merge,
+            "settings": {name: os.environ.get(name) for name in RUN_SETTINGS}
+        }
+
+    def save_checkpoint(self, stage: str, output) -> None:
+        if not hasattr(output, "to_dict"):
+            return
+        # A level that ran but did not succeed is redone on resume
+        state = "complete" if getattr(output, "success", True) else "failed"
+        self.checkpoints.save(stage, output.to_dict(), state)
+
+    def restore_outputs(self) -> Dict[str, Any]:
+        """Outputs of the stages this run already completed.
+
+        A stage is only restored if every checkpointed stage it takes input
+        from was restored too: level4 still runs after a failed level3, and
+        its "complete" status write is stale once level3 is redone.
+        """
+        inputs = {name: stage.inputs for name, stage in self.build_graph({}).stages.items()}
+        provided = {}
+        # CHECKPOINT_TYPES lists the stages in dependency order
+        for stage in CHECKPOINT_TYPES:
+            if self.checkpoints.state(stage) != "complete":
+                continue
+            redone = [name for name in inputs.get(stage, []) if name in CHECKPOINT_TYPES and name not in provided]
+            if redone:
+                print(f"🔁 Rerunning {stage}: it used the output of {', '.join(redone)}, which is redone")
+                continue
+            provided[stage] = CHECKPOINT_TYPES[stage].from_dict(self.checkpoints.load(stage))
+        return provided
+
+    def finished(self, provided: Dict[str, Any]) -> bool:
+        return all(stage in provided for stage in CHECKPOINT_TYPES)
+
+    # Stage functions: each parameter is named after the stage whose output it takes
+
+    def run_level1(self) -> SheetRecords:
+        """Blocking CSV read; runs in a worker thread."""
+        level1 = self.levels["level1"]
+        df = level1.read_google_sheet_with_pandas(self.sheet_id)
+        if df is None:
+            raise PipelineError("Could not read the sheet through the CSV export")
+
+        records = SheetRecords(level1.extract_all_records_with_pandas(df), level1.extract_specific_data_with_pandas(df))
+        if not records.first_record:
+            raise PipelineError("The sheet has no data rows")
+
+        print(f"📄 {len(records.records)} recipient record(s)")
+        return records
+
+    async def prepare_gmail(self):
+        """Create the L3 sender and, for the browser transport, load Gmail in its own tab."""
+        sender = self.levels["level3"].GmailAutoSender(self.cdp_port, browser_manager=self.browser_manager)
+        if not sender.load_email_template():
+            raise PipelineError("The email template could not be loaded")
+        if not sender.transport.needs_browser:
+            return sender
+
+        try:
+            await self.browser_manager.setup_browser()
+            self.gmail_page = await self.browser_manager.new_page()
+            sender.gmail_page = self.gmail_page
+            await sender.navigate_to_gmail(self.gmail_page)
+        except Exception as e:
+            # L3 navigates on its own if the tab is not ready
+            print(f"⚠️ Could not pre-load Gmail: {e}")
+        return sender
+
+    async def run_level2(self) -> HistorySnapshot:
+        level2 = self.levels["level2"]
+        capture = level2.SheetsEditHistoryCapture(
+            self.sheet_url, self.cdp_port, browser_manager=self.browser_manager
+        )
+
+        await level2.capture_history(capture)
+
+        if not capture.history_data:
+            raise PipelineError("No edit history captured")
+
+        # The history store is what later standalone runs read
+        await asyncio.to_thread(capture.save_history_data)
+        return HistorySnapshot(capture.history_data)
+
+    async def run_level3(self, level1: SheetRecords, level2: HistorySnapshot, gmail) -> SendOutcome:
+        # On resume the send ledger skips whatever an earlier attempt already sent
+        sender = gmail
+        sender.recipient_contact_data = level1.first_record
+        sender.email_content_data = level2.history_data
+
+        if self.mail_merge:
+            sender.recipient_records = level1.records
+            success = await sender.send_mail_merge_workflow()
+        else:
+            success = await sender.send_email_workflow()
+
+        if not success:
+            print("⚠️ Sending failed; L4 still records the failed status")
+        return SendOutcome(success, sender.build_send_report(success))
+
+    async def run_level4(self, level2: HistorySnapshot, level3: SendOutcome) -> SheetUpdateOutcome:
+        level4 = self.levels["level4"]
+        updater = level4.SheetsUpdater(self.sheet_url, self.cdp_port, browser_manager=self.browser_manager)
+        updater.email_send_data = level3.report
+        updater.history_data = level2.history_data
+
+        # Ranges are checkpointed as they land; a rerun diffs against the sheet anyway
+        previous = self.checkpoints.load("level4") or {}
+        if previous.get("written_ranges"):
+            print(f"📋 Ranges written by the previous attempt: {', '.join(previous['written_ranges'])}")
+        updater.on_range_written = lambda ranges: self.checkpoints.save(
+            "level4", {"written_ranges": ranges}, state="partial"
+        )
+
+        success = await updater.execute_sheet_update_process()
+        return SheetUpdateOutcome(success, updater.persist_latencies, updater.verification_report, updater.written_ranges)
+
+    def build_graph(self, provided: Dict[str, Any]) -> StageGraph:
+        graph = StageGraph(on_stage_complete=self.save_checkpoint)
+        graph.add("level1", self.run_level1, in_thread=True)
+        if "level3" not in provided:
+            graph.add("gmail", self.prepare_gmail)
+        graph.add("level2", self.run_level2)
+        graph.add("level3", self.run_level3, inputs=["level1", "level2", "gmail"])
+        graph.add("level4", self.run_level4, inputs=["level2", "level3"])
+        return graph
+
+    def succeeded(self, results) -> bool:
+        return results["level3"].success and results["level4"].success
+
+    async def run(self) -> bool:
+        provided = self.restore_outputs()
+        if provided:
+            print(f"♻️ Resuming run {self.checkpoints.run_id}; restored: {', '.join(provided)}")
+        if self.finished(provided):
+            print("✅ Every stage of this run is already complete")
+            return True
+
+        self.graph = self.build_graph(provided)
+        try:
+            results = await self.graph.run(provided)
+            return self.succeeded(results)
+
+        except PipelineError as e:
+            print(f"❌ Pipeline stopped: {e}")
+            return False
+
+        finally:
+            if self.gmail_page is not None:
+                try:
+                    await self.gmail_page.close()
+                except Exception:
+                    pass
+            await self.browser_manager.cleanup_browser(keep_browser_open=True)
+            self.graph.print_report()
+
+
+class StreamingPipeline(Pipeline):
+    """Mail merge with rows flowing through the levels one at a time.
+
+    read (L1 CSV chunks) -> enrich (render against the L2 history, skip
+    ledger-confirmed sends) -> send (MAIL_MERGE_CONCURRENCY workers) ->
+    status (L4 writes in batches of adjacent rows). The stages are joined by
+    bounded queues of STREAM_QUEUE_SIZE, so sending starts with the first
+    parsed row once the history is in, and memory does not grow with the
+    sheet. Per-recipient results still stream to the mail merge report.
+
+    Progress is checkpointed as the sheet rows whose ✅ status is written;
+    resume skips those rows and writes the status of rows the ledger shows
+    were sent before the interruption.
+    """
+
+    mode = "stream"
+
+    def __init__(self, sheet_url: str, cdp_port: int = 9222, mail_merge: Optional[bool] = None,
+                 checkpoints: Optional[RunCheckpoints] = None):
+        super().__init__(sheet_url, cdp_port, True, checkpoints)
+        self.queue_size = int(os.getenv('STREAM_QUEUE_SIZE', '50'))
+        self.chunk_size = int(os.getenv('STREAM_CHUNK_SIZE', '200'))
+        self.status_batch_size = int(os.getenv('STREAM_STATUS_BATCH', '25'))
+        self.status_batch_wait = float(os.getenv('STREAM_STATUS_BATCH_WAIT_SECONDS', '5'))
+
+        self.rows = new_queue(self.queue_size)
+        self.messages = new_queue(self.queue_size)
+        self.statuses = new_queue(self.queue_size)
+        self.counts = {"read": 0, "done": 0, "skipped": 0, "held": 0, "sent": 0, "failed": 0,
+                       "status_written": 0, "status_failed": 0}
+
+        # Rows whose send and ✅ status were both completed by this run
+        self.done_rows = RowIntervals((self.checkpoints.load("status") or {}).get("written_rows"))
+
+    def finished(self, provided: Dict[str, Any]) -> bool:
+        return self.checkpoints.state("status") == "complete"
+
+    def save_status_progress(self, state: str = "partial") -> None:
+        self.checkpoints.save("status", {"written_rows": self.done_rows.to_list(), "counts": self.counts}, state)
+
+    async def read_rows(self):
+        """Yield (sheet_row, record) as each CSV chunk is parsed; parsing runs in a worker thread."""
+        chunks = self.levels["level1"].iter_record_chunks(self.sheet_id, self.chunk_size)
+        while True:
+            batch = await asyncio.to_thread(next, chunks, None)
+            if batch is None:
+                return
+            for item in batch:
+                yield item
+
+    async def run_read(self) -> int:
+        async for item in self.read_rows():
+            self.counts["read"] += 1
+            if item[0] in self.done_rows:
+                self.counts["done"] += 1
+                continue
+            await self.rows.put(item)
+        await close_queue(self.rows)
+        print(f"📄 {self.counts['read']} recipient record(s) read"
+              + (f", {self.counts['done']} already done in this run" if self.counts["done"] else ""))
+        return self.counts["read"]
+
+    async def run_enrich(self, level2: HistorySnapshot, gmail) -> int:
+        """Render messages in whatever batches are queued; a rerun skips confirmed sends in one lookup per batch."""
+        sender = gmail
+        sender.email_content_data = level2.history_data
+        async for batch in drain_batches(self.rows, self.chunk_size):
+            records = [record for _, record in batch]
+            problems = sender.email_template.validate(records, sender.email_content_data)
+            for problem in problems:
+                sheet_row, _ = batch[problem["index"]]
+                print(f"❌ Row {sheet_row} ({problem['email'] or 'no email'}): "
+                      f"missing {', '.join(problem['missing'])} for template '{sender.email_template.name}'")
+                self.counts["failed"] += 1
+                await self.statuses.put((sheet_row, False, datetime.now().isoformat()))
+
+            invalid = {problem["index"] for problem in problems}
+
+            valid = [item for index, item in enumerate(batch) if index not in invalid]
+            messages = sender.build_messages([record for _, record in valid])
+            entries = sender.ledger.lookup(sender.message_key(message) for message in messages) \
+                if sender.ledger else {}
+            confirmed = {key: row["confirmed_at"] for key, row in entries.items() if row["status"] == "confirmed"}
+
+            for (sheet_row, _), message in zip(valid, messages):
+                key = sender.message_key(message)
+                if key in entries and entries[key]["status"] == "attempted" and not sender.release_unconfirmed:
+                    # May have gone out before an interruption; see GmailAutoSender.unsent_records
+                    self.counts["held"] += 1
+                    print(f"⏸️ Row {sheet_row} ({message['to']}): earlier send never confirmed, held")
+                    continue
+                if key in confirmed:
+                    self.counts["skipped"] += 1
+                    # Sent before the interruption, status not yet written
+                    if self.checkpoints.resumed:
+                        await self.statuses.put((sheet_row, True, confirmed[key] or datetime.now().isoformat()))
+                    continue
+                await self.messages.put((sheet_row, message))
+
+        # One END for however many send workers open_merge_pages managed to start
+        await close_queue(self.messages)
+        if self.counts["skipped"]:
+            print(f"⏭️ Skipped {self.counts['skipped']} record(s) already confirmed in the send ledger")
+        return self.counts["skipped"]
+
+    async def _send_worker(self, sender, page, bucket, report_file, in_flight):
+        async for sheet_row, message in drain(self.messages, shared=True):
+            key = sender.message_key(message)
+            # Duplicate rows: one send, whichever comes first
+            if key in in_flight or (sender.ledger and sender.ledger.is_confirmed(key)):
+                self.counts["skipped"] += 1
+                continue
+
+            in_flight.add(key)
+            try:
+                result = await sender.send_merge_message(sheet_row - 2, message, page, bucket)
+            finally:
+                in_flight.discard(key)
+
+            self.counts["sent" if result["success"] else "failed"] += 1
+            sender.report_merge_result(result, report_file)
+            await self.statuses.put((sheet_row, result["success"], result["timestamp"]))
+
+    async def run_send(self, level2: HistorySnapshot, gmail) -> dict:
+        sender = gmail
+        await sender.transport.start()
+        pages = []
+        try:
+            if sender.transport.needs_browser and not sender.on_gmail():
+                # The main page is L4's, so Gmail always gets a tab of its own
+                await self.browser_manager.setup_browser()
+                if sender.gmail_page is None:
+                    self.gmail_page = sender.gmail_page = await self.browser_manager.new_page()
+                if not await sender.navigate_to_gmail():
+                    raise PipelineError("Could not open Gmail")
+
+            pages = await sender.open_merge_pages(max(1, sender.merge_concurrency))
+            bucket = sender.new_send_bucket()
+            sender.load_quota_usage()
+            report_path = sender.merge_report_path()
+            os.makedirs(os.path.dirname(report_path), exist_ok=True)
+
+            in_flight = set()
+            with open(report_path, 'a', encoding='utf-8') as report_file:
+                await asyncio.gather(*[
+                    self._send_worker(sender, page, bucket, report_file, in_flight)
+                    for page in pages
+                ])
+        finally:
+            await sender.close_merge_pages(pages)
+            await sender.transport.close()
+
+        await close_queue(self.statuses)
+        print(f"📊 {self.counts['sent']} sent, {self.counts['failed']} failed")
+        return {"sent": self.counts["sent"], "failed": self.counts["failed"]}
+
+    async def run_status(self, level2: HistorySnapshot) -> dict:
+        """Write status rows in batches.
+
+        A failed batch is reported and the stream goes on: the status queue
+        keeps draining so sending is never held up by the sheet.
+        """
+        updater = self.levels["level4"].SheetsUpdater(self.sheet_url, self.cdp_port, browser_manager=self.browser_manager)
+        updater.history_data = level2.history_data
+        ready = False
+
+        async for batch in drain_batches(self.statuses, self.status_batch_size, self.status_batch_wait):
+            statuses = {
+                sheet_row: updater.format_status_row(success, timestamp)
+                for sheet_row, success, timestamp in batch
+            }
+
+            if not ready:
+                ready = (await updater.setup_browser() and await updater.navigate_to_sheet()
+                         and await updater.create_headers_if_needed())
+
+            if ready and await updater.write_status_rows(statuses):
+                self.counts["status_written"] += len(statuses)
+                for sheet_row, success, _ in batch:
+                    if success:
+                        self.done_rows.add(sheet_row)
+                self.save_status_progress()
+            else:
+                self.counts["status_failed"] += len(statuses)
+                print(f"❌ Status write failed for row(s) {', '.join(str(row) for row in sorted(statuses))}")
+
+        failed = self.counts["failed"] or self.counts["status_failed"] or self.counts["held"]
+        self.save_status_progress("failed" if failed else "complete")
+        return {"written": self.counts["status_written"], "failed": self.counts["status_failed"]}
+
+    def build_graph(self, provided: Dict[str, Any]) -> StageGraph:
+        graph = StageGraph(on_stage_complete=self.save_checkpoint)
+        graph.add("read", self.run_read)
+        graph.add("gmail", self.prepare_gmail)
+        graph.add("level2", self.run_level2)
+        graph.add("enrich", self.run_enrich, inputs=["level2", "gmail"])
+        graph.add("send", self.run_send, inputs=["level2", "gmail"])
+        graph.add("status", self.run_status, inputs=["level2"])
+        return graph
+
+    def succeeded(self, results) -> bool:
+        print(f"📊 Stream totals: {self.counts}")
+        if self.counts["held"]:
+            print(f"⏸️ {self.counts['held']} row(s) held: their earlier send was never confirmed. Check the Sent "
+                  f"folder, or set SEND_LEDGER_RELEASE_UNCONFIRMED=true and resume to send them again.")
+        return not self.counts["failed"] and not self.counts["status_failed"] and not self.counts["held"]
+
+
+PIPELINE_CLASSES = {
+    Pipeline.mode: Pipeline,
+    StreamingPipeline.mode: StreamingPipeline,
+}
+
+
+def resume_pipeline(run_id: str) -> Pipeline:
+    """Rebuild the pipeline of an earlier run from its manifest."""
+    checkpoints = RunCheckpoints.open(run_id)
+    config = checkpoints.config
+    pipeline_class = PIPELINE_CLASSES.get(config.get("mode"))
+    if pipeline_class is None:
+        raise CheckpointError(f"Run '{run_id}' has unknown pipeline mode {config.get('mode')!r}")
+    # Before construction: the levels read their settings when they are built
+    restore_run_settings(config.get("settings", {}))
+    return pipeline_class(config["sheet_url"], config.get("cdp_port", 9222), config.get("mail_merge"), checkpoints)
+
+
+async def main():
+    sheet_url = os.getenv('SHEET_URL', "https://docs.google.com/spreadsheets/d/1lNsIW2A1gmurYZ-DJt65xuX_yEsxyvoqPx84Q2B8rEM/edit?gid=0#gid=0")
+
+    if len(sys.argv) > 1:
+        if sys.argv[1] != "resume" or len(sys.argv) != 3:
+            print("Usage: python task/pipeline.py [resume <run_id>]")
+            return
+        try:
+            pipeline = resume_pipeline(sys.argv[2])
+        except CheckpointError as e:
+            print(f"❌ {e}")
+            return
+    else:
+        mode = os.getenv('PIPELINE_MODE', 'stages').lower()
+        pipeline = PIPELINE_CLASSES.get(mode, Pipeline)(sheet_url)
+
+    success = await pipeline.run()
+    if success:
+        print("\n✅ Pipeline completed successfully!")
+    else:
+        print("\nPipeline completed with errors")
+        print(f"Resume with: python task/pipeline.py resume {pipeline.checkpoints.run_id}")
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nPipeline interrupted")
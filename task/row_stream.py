@@ -0,0 +1,70 @@
+import asyncio
+from typing import Any, AsyncIterator, List
+
+# Bounded queues between streaming pipeline stages. A producer blocks on put()
+# while its queue is full, so a slow stage (usually sending) holds back the
+# ones before it and memory stays at roughly the queue sizes, however long
+# the sheet is. END marks the end of a stream: once per consumer, or once in
+# total when the consumers drain with shared=True.
+
+END = object()
+
+
+def new_queue(maxsize: int) -> asyncio.Queue:
+    return asyncio.Queue(maxsize=max(1, maxsize))
+
+
+async def close_queue(queue: asyncio.Queue, consumers: int = 1) -> None:
+    for _ in range(consumers):
+        await queue.put(END)
+
+
+async def drain(queue: asyncio.Queue, shared: bool = False) -> AsyncIterator[Any]:
+    """Yield items until END.
+
+    With shared=True the consumer puts END back before it stops, so a single
+    END ends every consumer of the queue, however many there are.
+    """
+    while True:
+        item = await queue.get()
+        if item is END:
+            if shared:
+                # The slot END came from is still free: nothing is queued after END
+                queue.put_nowait(END)
+            return
+        yield item
+
+
+async def drain_batches(queue: asyncio.Queue, size: int, max_wait: float = 0) -> AsyncIterator[List[Any]]:
+    """Yield lists of up to size items until END.
+
+    A batch starts with the next item to arrive and then takes whatever else
+    arrives within max_wait seconds (0: only what is already queued), so a
+    quiet stream never holds an item back for long.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await queue.get()
+        if item is END:
+            return
+
+        batch = [item]
+        deadline = loop.time() + max_wait
+        ended = False
+        while len(batch) < size:
+            remaining = deadline - loop.time()
+            try:
+                if remaining > 0:
+                    item = await asyncio.wait_for(queue.get(), remaining)
+                else:
+                    item = queue.get_nowait()
+            except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                break
+            if item is END:
+                ended = True
+                break
+            batch.append(item)
+
+        yield batch
+        if ended:
+            return
@@ -0,0 +1,185 @@
+import os
+import json
+import bisect
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+# Per-run checkpoints for pipeline.py, under data/runs/<run_id>/.
+#
+# Each save writes a new <stage>.v<N>.json (temp file, fsync, rename) and then
+# swaps manifest.json the same way, so a crash at any point leaves the
+# manifest pointing at a complete earlier version. A stage's state is
+# "complete", "failed" (it ran but did not succeed) or "partial" (progress
+# saved while it runs). `pipeline.py resume <run_id>` restores the complete
+# stages and reruns the rest.
+
+CHECKPOINT_FORMAT = 1
+
+# Older versions of a stage are pruned beyond this many
+KEEP_VERSIONS = 3
+
+
+class CheckpointError(Exception):
+    pass
+
+
+def default_runs_dir():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(current_dir), "data", "runs")
+
+
+def fsync_directory(path: str) -> None:
+    """Make renames and new entries in a directory durable."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        # Windows cannot open a directory; NTFS journals the rename itself
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(path: str, payload: Any) -> None:
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    fsync_directory(os.path.dirname(os.path.abspath(path)))
+
+
+class RowIntervals:
+    """A set of sheet rows kept as sorted, merged [start, end] intervals.
+
+    Status writes mostly land on runs of adjacent rows, so this stays a
+    handful of intervals even for very long sheets.
+    """
+
+    def __init__(self, intervals: Optional[List[List[int]]] = None):
+        self.intervals: List[List[int]] = []
+        for start, end in intervals or []:
+            self._fill(start, end)
+
+    def _fill(self, start: int, end: int) -> None:
+        # Merge everything overlapping or adjacent to [start, end] into one interval
+        merged = [start, end]
+        kept = []
+        for interval in self.intervals:
+            if interval[1] < merged[0] - 1 or interval[0] > merged[1] + 1:
+                kept.append(interval)
+            else:
+                merged = [min(merged[0], interval[0]), max(merged[1], interval[1])]
+        bisect.insort(kept, merged)
+        self.intervals = kept
+
+    def add(self, row: int) -> None:
+        if row in self:
+            return
+        self._fill(row, row)
+
+    def __contains__(self, row: int) -> bool:
+        index = bisect.bisect_right(self.intervals, [row, float('inf')]) - 1
+        return index >= 0 and self.intervals[index][0] <= row <= self.intervals[index][1]
+
+    def __len__(self) -> int:
+        return sum(end - start + 1 for start, end in self.intervals)
+
+    def to_list(self) -> List[List[int]]:
+        return [list(interval) for interval in self.intervals]
+
+
+class RunCheckpoints:
+    def __init__(self, run_id: str, runs_dir: Optional[str] = None):
+        self.run_id = run_id
+        self.run_dir = os.path.join(runs_dir or default_runs_dir(), run_id)
+        self.manifest_path = os.path.join(self.run_dir, "manifest.json")
+        self.manifest: Dict[str, Any] = {}
+
+        # True when opened by `resume`, i.e. this run already did some work
+        self.resumed = False
+
+    @classmethod
+    def create(cls, config: Dict[str, Any], runs_dir: Optional[str] = None) -> "RunCheckpoints":
+        runs_dir = runs_dir or default_runs_dir()
+        run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        suffix = 1
+        while os.path.exists(os.path.join(runs_dir, run_id)):
+            suffix += 1
+            run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{suffix}"
+
+        checkpoints = cls(run_id, runs_dir)
+        os.makedirs(checkpoints.run_dir)
+        fsync_directory(runs_dir)
+        checkpoints.manifest = {
+            "format": CHECKPOINT_FORMAT,
+            "run_id": run_id,
+            "created_at": datetime.now().isoformat(),
+            "config": config,
+            "stages": {}
+        }
+        checkpoints._write_manifest()
+        return checkpoints
+
+    @classmethod
+    def open(cls, run_id: str, runs_dir: Optional[str] = None) -> "RunCheckpoints":
+        checkpoints = cls(run_id, runs_dir)
+        try:
+            with open(checkpoints.manifest_path, 'r', encoding='utf-8') as f:
+                checkpoints.manifest = json.load(f)
+        except FileNotFoundError:
+            raise CheckpointError(f"No run '{run_id}' in {os.path.dirname(checkpoints.run_dir)}")
+        except ValueError as e:
+            raise CheckpointError(f"Unreadable manifest for run '{run_id}': {e}")
+
+        if checkpoints.manifest.get("format") != CHECKPOINT_FORMAT:
+            raise CheckpointError(f"Run '{run_id}' uses checkpoint format {checkpoints.manifest.get('format')}, "
+                                  f"expected {CHECKPOINT_FORMAT}")
+        checkpoints.resumed = True
+        return checkpoints
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        return self.manifest.get("config", {})
+
+    def _write_manifest(self) -> None:
+        self.manifest["updated_at"] = datetime.now().isoformat()
+        atomic_write_json(self.manifest_path, self.manifest)
+
+    def save(self, stage: str, data: Dict[str, Any], state: str = "complete") -> int:
+        """Write a new version of a stage's checkpoint; returns the version number."""
+        version = self.manifest["stages"].get(stage, {}).get("version", 0) + 1
+        filename = f"{stage}.v{version}.json"
+        saved_at = datetime.now().isoformat()
+
+        atomic_write_json(os.path.join(self.run_dir, filename), {
+            "format": CHECKPOINT_FORMAT,
+            "run_id": self.run_id,
+            "stage": stage,
+            "version": version,
+            "state": state,
+            "saved_at": saved_at,
+            "data": data
+        })
+        self.manifest["stages"][stage] = {"version": version, "file": filename, "state": state, "saved_at": saved_at}
+        self._write_manifest()
+
+        stale = os.path.join(self.run_dir, f"{stage}.v{version - KEEP_VERSIONS}.json")
+        if version > KEEP_VERSIONS and os.path.exists(stale):
+            os.remove(stale)
+        return version
+
+    def state(self, stage: str) -> Optional[str]:
+        return self.manifest["stages"].get(stage, {}).get("state")
+
+    def load(self, stage: str) -> Optional[Dict[str, Any]]:
+        entry = self.manifest["stages"].get(stage)
+        if not entry:
+            return None
+        with open(os.path.join(self.run_dir, entry["file"]), 'r', encoding='utf-8') as f:
+            return json.load(f)["data"]
+
+    def completed(self) -> List[str]:
+        return [stage for stage, entry in self.manifest["stages"].items() if entry["state"] == "complete"]
@@ -0,0 +1,148 @@
+import os
+import sqlite3
+import hashlib
+from datetime import datetime
+from typing import Optional, Iterable, Set, Dict, Any
+
+# Durable record of every L3 send. A message is identified by a hash of
+# recipient, subject and body, so a rerun can skip whatever was already
+# confirmed with an indexed lookup instead of opening the browser again.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sends (
+    message_key TEXT PRIMARY KEY,
+    recipient TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    transport TEXT NOT NULL DEFAULT '',
+    first_attempt_at TEXT,
+    last_attempt_at TEXT,
+    confirmed_at TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sends_status ON sends (status);
+CREATE TABLE IF NOT EXISTS send_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    message_key TEXT NOT NULL,
+    event TEXT NOT NULL,
+    at TEXT NOT NULL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_send_events_key ON send_events (message_key);
+"""
+
+# SQLite's default limit on bound parameters is 999
+LOOKUP_CHUNK_SIZE = 500
+
+def default_ledger_path():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(current_dir), "data", "send_ledger.sqlite3")
+
+
+class SendLedger:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or default_ledger_path()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self.connection = sqlite3.connect(self.path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    @staticmethod
+    def message_key(recipient: str, subject: str, body: str) -> str:
+        digest = hashlib.sha256()
+        for part in (recipient.strip().lower(), subject, body):
+            digest.update(part.encode('utf-8'))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def lookup(self, keys: Iterable[str]) -> Dict[str, sqlite3.Row]:
+        """{key: row} for the keys the ledger knows, in chunked IN queries."""
+        keys = list(keys)
+        found = {}
+        for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+            chunk = keys[start:start + LOOKUP_CHUNK_SIZE]
+            rows = self.connection.execute(
+                f"SELECT * FROM sends WHERE message_key IN ({', '.join('?' for _ in chunk)})",
+                chunk
+            )
+            found.update((row["message_key"], row) for row in rows)
+        return found
+
+    def confirmed_times(self, keys: Iterable[str]) -> Dict[str, str]:
+        """{key: confirmed_at} for the keys whose send is already confirmed."""
+        return {
+            key: row["confirmed_at"]
+            for key, row in self.lookup(keys).items()
+            if row["status"] == "confirmed"
+        }
+
+    def confirmed_keys(self, keys: Iterable[str]) -> Set[str]:
+        """Subset of keys whose send is already confirmed."""
+        return set(self.confirmed_times(keys))
+
+    def is_confirmed(self, key: str) -> bool:
+        return bool(self.confirmed_keys([key]))
+
+    def record_attempt(self, key: str, recipient: str, subject: str, transport: str = "") -> None:
+        now = datetime.now().isoformat()
+        with self.connection:
+            self.connection.execute(
+                """
+                INSERT INTO sends (message_key, recipient, subject, status, attempts, transport,
+                                   first_attempt_at, last_attempt_at)
+                VALUES (?, ?, ?, 'attempted', 1, ?, ?, ?)
+                ON CONFLICT (message_key) DO UPDATE SET
+                    status = CASE WHEN status = 'confirmed' THEN status ELSE 'attempted' END,
+                    attempts = attempts + 1,
+                    transport = excluded.transport,
+                    last_attempt_at = excluded.last_attempt_at
+                """,
+                (key, recipient, subject, transport, now, now)
+            )
+            self.connection.execute(
+                "INSERT INTO send_events (message_key, event, at, detail) VALUES (?, 'attempt', ?, ?)",
+                (key, now, transport)
+            )
+
+    def record_result(self, key: str, success: bool, error: Optional[str] = None) -> None:
+        now = datetime.now().isoformat()
+        with self.connection:
+            if success:
+                self.connection.execute(
+                    "UPDATE sends SET status = 'confirmed', confirmed_at = ?, error = NULL WHERE message_key = ?",
+                    (now, key)
+                )
+            else:
+                self.connection.execute(
+                    "UPDATE sends SET status = 'failed', error = ? "
+                    "WHERE message_key = ? AND status != 'confirmed'",
+                    (error, key)
+                )
+            self.connection.execute(
+                "INSERT INTO send_events (message_key, event, at, detail) VALUES (?, ?, ?, ?)",
+                (key, "confirmed" if success else "failed", now, error)
+            )
+
+    def confirmed_since(self, since: datetime) -> int:
+        """Number of sends confirmed at or after since."""
+        row = self.connection.execute(
+            "SELECT COUNT(*) AS count FROM sends WHERE status = 'confirmed' AND confirmed_at >= ?",
+            (since.isoformat(),)
+        ).fetchone()
+        return row["count"]
+
+    def summary(self) -> Dict[str, Any]:
+        rows = self.connection.execute("SELECT status, COUNT(*) AS count FROM sends GROUP BY status")
+        return {row["status"]: row["count"] for row in rows}
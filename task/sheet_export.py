@@ -0,0 +1,137 @@
+import io
+import re
+import warnings
+import urllib.request
+import numpy as np
+import pandas as pd
+from a1_notation import cell_to_index
+
+# Cheap read path shared by the levels: the sheet's CSV export, one HTTP
+# request for the whole grid, no browser involved.
+
+def extract_sheet_id_from_url(url):
+    start = url.find('/d/') + 3
+    end = url.find('/edit')
+    if start != -1 and end != -1:
+        return url[start:end]
+    return None
+
+def extract_gid_from_url(url, default="0"):
+    match = re.search(r'gid=(\d+)', url or "")
+    return match.group(1) if match else default
+
+def sheet_csv_url(sheet_id, gid="0"):
+    return f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv&gid={gid}"
+
+def open_sheet_csv_stream(sheet_id, gid="0", timeout=60):
+    """The CSV export as a text stream read straight off the HTTP response.
+
+    pandas given a URL downloads the whole body before parsing; given this
+    stream with chunksize it parses while the export is still arriving.
+    """
+    response = urllib.request.urlopen(sheet_csv_url(sheet_id, gid), timeout=timeout)
+    return io.TextIOWrapper(response, encoding='utf-8', newline='')
+
+def read_sheet_grid(sheet_id, gid="0"):
+    """Read the whole sheet as a grid of strings.
+
+    Unlike the L1 DataFrame there is no header row, so grid.iat[row - 1, col - 1]
+    is the displayed value of A1 cell (row, col). Empty cells are "", and an
+    empty sheet is an empty grid.
+    """
+    try:
+        return pd.read_csv(
+            sheet_csv_url(sheet_id, gid),
+            header=None,
+            dtype=str,
+            keep_default_na=False
+        )
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame(dtype=str)
+
+def get_cell_values(grid, cells):
+    """Look up displayed values for A1 cells; cells outside the grid are ""."""
+    values = {}
+    for cell_reference in cells:
+        row, col = cell_to_index(cell_reference)
+        if row < grid.shape[0] and col < grid.shape[1]:
+            values[cell_reference] = grid.iat[row, col]
+        else:
+            values[cell_reference] = ""
+    return values
+
+_NUMBER_RE = re.compile(r"^[-+]?(\d+|\d{1,3}(,\d{3})+)(\.\d+)?$")
+_DATE_HINT_RE = re.compile(r"\d[-/.:]\d|\d[-/.]\w")
+
+def _parse_date(text, dayfirst):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            return pd.Timestamp(pd.to_datetime(text, dayfirst=dayfirst)).to_pydatetime()
+        except (ValueError, OverflowError, TypeError):
+            return None
+
+def _parsed_form(value, dayfirst=False):
+    """The typed value Sheets parses a displayed or pasted string into, or None.
+
+    Forms are tagged by type so TRUE never matches 1. A date is read with the
+    sheet locale's day/month order only, and one that would read differently
+    in the other order (01/02/2025, 1-2) is ambiguous: no form, so it only
+    matches the identical string.
+    """
+    text = value.strip()
+    if text.upper() in ("TRUE", "FALSE"):
+        return ("bool", text.upper() == "TRUE")
+    if _NUMBER_RE.match(text):
+        return ("num", float(text.replace(",", "")))
+    if _DATE_HINT_RE.search(text):
+        parsed = _parse_date(text, dayfirst)
+        if parsed is None or _parse_date(text, not dayfirst) != parsed:
+            return None
+        return ("date", parsed)
+    return None
+
+def values_equivalent(expected, actual, dayfirst=False):
+    """Whether the export's displayed value is what Sheets shows for expected.
+
+    Sheets parses pasted text: "007" displays as 7, "1,234" as 1234, dates
+    and booleans in its own format. Strings that are not equal are still
+    equivalent when both parse to the same number, boolean or date/time.
+    dayfirst is the sheet locale's date order (SHEETS_DATE_DAYFIRST).
+    """
+    expected, actual = str(expected).strip(), str(actual).strip()
+    if expected == actual:
+        return True
+    form = _parsed_form(expected, dayfirst)
+    return form is not None and form == _parsed_form(actual, dayfirst)
+
+def compare_cell_values(grid, desired, dayfirst=False):
+    """Vectorized check of desired ({A1: value}) against the displayed grid.
+
+    Returns (cells, expected, actual) for the cells that differ. Cells are
+    compared as stripped strings, and string mismatches are then rechecked
+    with values_equivalent so values Sheets reformats do not count. Cells
+    outside the grid read as "".
+    """
+    cells = list(desired)
+    if not cells:
+        return [], [], []
+
+    indices = np.array([cell_to_index(cell_reference) for cell_reference in cells])
+    rows, cols = indices[:, 0], indices[:, 1]
+    values = grid.to_numpy(dtype=object)
+
+    inside = (rows < values.shape[0]) & (cols < values.shape[1])
+    actual = np.full(len(cells), "", dtype=object)
+    actual[inside] = values[rows[inside], cols[inside]]
+
+    expected = np.array(["" if value is None else str(value) for value in desired.values()], dtype=object)
+    differs = np.char.strip(actual.astype(str)) != np.char.strip(expected.astype(str))
+
+    changed = [i for i in np.nonzero(differs)[0] if not values_equivalent(expected[i], actual[i], dayfirst)]
+    return [cells[i] for i in changed], expected[changed].tolist(), actual[changed].tolist()
+
+def diff_cell_values(grid, desired, dayfirst=False):
+    """Cells of desired ({A1: value}) whose displayed value in grid differs."""
+    cells, _, _ = compare_cell_values(grid, desired, dayfirst)
+    return {cell_reference: desired[cell_reference] for cell_reference in cells}
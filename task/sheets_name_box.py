@@ -0,0 +1,77 @@
+from typing import Optional
+
+# The Sheets name box (the cell reference field left of the formula bar),
+# shared by L2 and L4: jumping to a cell is a fill + Enter on it.
+
+# In priority order: the input itself first, the tooltip wrapper (whose input
+# is looked up inside it) and looser matches last
+NAME_BOX_SELECTORS = [
+    'input.waffle-name-box',
+    '#t-name-box',
+    'input[class*="waffle-name-box"]',
+    'input[id*="name-box"]',
+    '.jfk-textinput.waffle-name-box',
+    'input[aria-label*="Name box"]',
+    'input[title*="Name box"]',
+    'input[placeholder*="A1"]',
+    '[data-tooltip*="Name box"]'
+]
+
+# Whether the name box shows the target cell (possibly as Sheet!A1 or A1:B2)
+SHOWS_CELL_JS = "([box, cell]) => box.value.toUpperCase().split('!').pop().split(':')[0] === cell"
+
+# ... and Sheets has taken focus back, i.e. it followed the jump
+SELECTED_JS = f"([box, cell]) => document.activeElement !== box && ({SHOWS_CELL_JS})([box, cell])"
+
+
+class NameBox:
+    """A page's name box, found once and reused.
+
+    The selector that matched is tried first next time, and the handle is
+    kept until it stops being visible (e.g. after a reload).
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.element = None
+        self.selector: Optional[str] = None
+
+    async def find(self):
+        try:
+            if self.element and await self.element.is_visible():
+                return self.element
+        except Exception:
+            pass
+
+        self.element = None
+        selectors = ([self.selector] if self.selector else []) + [s for s in NAME_BOX_SELECTORS if s != self.selector]
+        for selector in selectors:
+            element = await self.page.query_selector(selector)
+            if element and await element.evaluate("el => el.tagName !== 'INPUT'"):
+                element = await element.query_selector('input')
+            if element and await element.is_visible() and await element.is_enabled():
+                self.element = element
+                self.selector = selector
+                return element
+        return None
+
+    async def select(self, cell_reference: str, timeout: int = 3000) -> bool:
+        """Jump to a cell; True once the name box shows it. Raises if Sheets does not follow."""
+        element = await self.find()
+        if not element:
+            return False
+
+        await element.fill(cell_reference)
+        await element.press('Enter')
+        await self.page.wait_for_function(SELECTED_JS, arg=[element, cell_reference.upper()], timeout=timeout)
+        return True
+
+    async def shows(self, cell_reference: str) -> Optional[bool]:
+        """Whether the name box shows this cell; None when it cannot be read."""
+        try:
+            element = await self.find()
+            if not element:
+                return None
+            return await self.page.evaluate(SHOWS_CELL_JS, [element, cell_reference.upper()])
+        except Exception:
+            return None
@@ -0,0 +1,177 @@
+import os
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+from dotenv import load_dotenv
+from history_store import build_history_payload
+from a1_notation import cell_to_index, index_to_cell
+from sheet_export import extract_sheet_id_from_url, extract_gid_from_url, read_sheet_grid
+
+# Alternative L2 backend that never opens the blame view. It keeps periodic CSV
+# snapshots of the sheet (taken through the L1 export path) and derives cell
+# history by diffing consecutive snapshots: the value a cell had before it
+# changed and the snapshot time at which the change was detected.
+
+SNAPSHOT_TIME_FORMAT = "%Y%m%d_%H%M%S_%f"
+
+
+def _padded(grid: pd.DataFrame, rows: int, cols: int) -> np.ndarray:
+    values = np.full((rows, cols), "", dtype=object)
+    values[:grid.shape[0], :grid.shape[1]] = grid.to_numpy(dtype=object)
+    return values
+
+
+def diff_grids(previous: pd.DataFrame, current: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Vectorized cell diff of two snapshots.
+
+    Returns (rows, cols, previous_values, current_values) for every changed
+    cell, as zero-based indices. Grids of different size are padded with "".
+    """
+    rows = max(previous.shape[0], current.shape[0])
+    cols = max(previous.shape[1], current.shape[1])
+
+    previous_values = _padded(previous, rows, cols)
+    current_values = _padded(current, rows, cols)
+
+    changed_rows, changed_cols = np.nonzero(previous_values != current_values)
+    return (
+        changed_rows,
+        changed_cols,
+        previous_values[changed_rows, changed_cols],
+        current_values[changed_rows, changed_cols]
+    )
+
+
+class SnapshotHistoryBackend:
+    def __init__(self, sheet_url: str, snapshot_dir: Optional[str] = None, max_entries_per_cell: int = 20):
+        self.sheet_url = sheet_url
+        self.sheet_id = extract_sheet_id_from_url(sheet_url)
+        self.sheet_gid = extract_gid_from_url(sheet_url)
+        self.max_entries_per_cell = max_entries_per_cell
+
+        if snapshot_dir is None:
+            current_dir = os.path.dirname(os.path.abspath(__file__))
+            snapshot_dir = os.path.join(os.path.dirname(current_dir), "data", "snapshots", self.sheet_id or "unknown")
+        self.snapshot_dir = snapshot_dir
+
+    def save_snapshot(self, grid: pd.DataFrame, taken_at: Optional[datetime] = None) -> str:
+        taken_at = taken_at or datetime.now()
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+
+        path = os.path.join(self.snapshot_dir, f"{taken_at.strftime(SNAPSHOT_TIME_FORMAT)}.csv")
+        grid.to_csv(path, header=False, index=False, encoding='utf-8')
+        return path
+
+    def take_snapshot(self) -> str:
+        """Fetch the sheet through the CSV export and store it as a new snapshot.
+
+        An export identical to the latest snapshot is not stored again; its
+        path is returned instead.
+        """
+        grid = read_sheet_grid(self.sheet_id, self.sheet_gid)
+        snapshots = self.list_snapshots()
+        if snapshots and self.load_snapshot(snapshots[-1][1]).equals(grid):
+            print(f"📸 Sheet unchanged since {snapshots[-1][0]:%Y-%m-%d %H:%M:%S}, no new snapshot")
+            return snapshots[-1][1]
+
+        path = self.save_snapshot(grid)
+        print(f"📸 Snapshot saved: {path}")
+        return path
+
+    def list_snapshots(self) -> List[Tuple[datetime, str]]:
+        if not os.path.isdir(self.snapshot_dir):
+            return []
+
+        snapshots = []
+        for filename in os.listdir(self.snapshot_dir):
+            name, extension = os.path.splitext(filename)
+            if extension != ".csv":
+                continue
+            try:
+                taken_at = datetime.strptime(name, SNAPSHOT_TIME_FORMAT)
+            except ValueError:
+                continue
+            snapshots.append((taken_at, os.path.join(self.snapshot_dir, filename)))
+
+        return sorted(snapshots)
+
+    @staticmethod
+    def load_snapshot(path: str) -> pd.DataFrame:
+        try:
+            return pd.read_csv(path, header=None, dtype=str, keep_default_na=False)
+        except pd.errors.EmptyDataError:
+            # Snapshot of an empty sheet
+            return pd.DataFrame(dtype=str)
+
+    def compute_cell_results(self, cells: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Cell-keyed results in the SheetsEditHistoryCapture shape, fully offline.
+
+        Only two snapshots are held in memory at a time. With cells given,
+        only those cells are reported, including the ones that never changed.
+        """
+        wanted = None
+        if cells:
+            wanted = {cell_to_index(cell_reference): cell_reference.upper() for cell_reference in cells}
+
+        results: Dict[str, Dict[str, Any]] = {}
+        snapshots = self.list_snapshots()
+
+        previous = None
+        for taken_at, path in snapshots:
+            current = self.load_snapshot(path)
+            if previous is not None:
+                detected_at = taken_at.strftime("%Y-%m-%d %H:%M:%S")
+                changed_rows, changed_cols, old_values, new_values = diff_grids(previous, current)
+
+                for row, col, old_value, new_value in zip(
+                    changed_rows.tolist(), changed_cols.tolist(), old_values.tolist(), new_values.tolist()
+                ):
+                    if wanted is not None:
+                        cell_reference = wanted.get((row, col))
+                        if cell_reference is None:
+                            continue
+                    else:
+                        cell_reference = index_to_cell(row, col)
+
+                    change = {"timestamp": detected_at, "content": old_value, "current": new_value}
+                    result = results.setdefault(cell_reference, {"author": "", "entries": [], "error": None})
+                    result.update(change)
+                    result["entries"].insert(0, change)
+                    del result["entries"][self.max_entries_per_cell:]
+            previous = current
+
+        if wanted is not None:
+            for cell_reference in wanted.values():
+                results.setdefault(cell_reference, {
+                    "content": "",
+                    "timestamp": "",
+                    "author": "",
+                    "entries": [],
+                    "error": "No change detected between snapshots" if len(snapshots) > 1 else "Need at least two snapshots"
+                })
+
+        return results
+
+    def compute_history(self, cells: Optional[List[str]] = None) -> Dict[str, Any]:
+        """history.json payload built from snapshot diffs instead of the blame view."""
+        return build_history_payload(
+            self.compute_cell_results(cells),
+            "snapshot_diff",
+            self.sheet_url,
+            datetime.now().strftime("%Y%m%d_%H%M%S")
+        )
+
+
+def main():
+    # Run on its own by a scheduler, so it loads .env itself
+    load_dotenv()
+    sheet_url = os.getenv('SHEET_URL', "https://docs.google.com/spreadsheets/d/1lNsIW2A1gmurYZ-DJt65xuX_yEsxyvoqPx84Q2B8rEM/edit?gid=0#gid=0")
+    backend = SnapshotHistoryBackend(sheet_url)
+
+    # Meant to run on a schedule: python task/snapshot_history.py
+    backend.take_snapshot()
+    print(f"📚 {len(backend.list_snapshots())} snapshot(s) stored in {backend.snapshot_dir}")
+
+if __name__ == "__main__":
+    main()
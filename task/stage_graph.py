@@ -0,0 +1,167 @@
+import time
+import asyncio
+import inspect
+from typing import Optional, Dict, Any, List, Callable, Iterable
+
+# Small dependency-graph scheduler for pipeline stages. A stage names the
+# outputs it needs; it starts as soon as they exist, so independent stages
+# overlap on the event loop (or in worker threads for blocking work). After a
+# run, critical_path() shows the chain of stages that bounded the wall time.
+
+class StageGraphError(Exception):
+    pass
+
+
+class Stage:
+    def __init__(self, name: str, func: Callable, inputs: Iterable[str] = (), in_thread: bool = False):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.in_thread = in_thread
+
+        # Offsets from the start of the run, in seconds
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def duration(self) -> float:
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+
+class StageGraph:
+    """Stages keyed by name; a stage's output is available to others under that name."""
+
+    def __init__(self, on_stage_complete: Optional[Callable[[str, Any], None]] = None):
+        self.stages: Dict[str, Stage] = {}
+        self.results: Dict[str, Any] = {}
+        self.total_seconds = 0.0
+
+        # Stages whose output was provided to run() instead of computed
+        self.restored: List[str] = []
+
+        # Called with (name, output) as each stage finishes, e.g. to checkpoint it
+        self.on_stage_complete = on_stage_complete
+
+    def add(self, name: str, func: Callable, inputs: Iterable[str] = (), in_thread: bool = False) -> "StageGraph":
+        """Register func(**{input: value}) as a stage; coroutine functions run on the loop."""
+        if name in self.stages:
+            raise StageGraphError(f"Duplicate stage '{name}'")
+        self.stages[name] = Stage(name, func, inputs, in_thread)
+        return self
+
+    def validate(self, provided: Iterable[str] = ()) -> None:
+        provided = set(provided)
+        available = provided | set(self.stages)
+        for stage in self.stages.values():
+            if stage.name in provided:
+                continue
+            missing = [name for name in stage.inputs if name not in available]
+            if missing:
+                raise StageGraphError(f"Stage '{stage.name}' needs unknown input(s): {', '.join(missing)}")
+
+        # Depth-first search for cycles
+        state: Dict[str, str] = {}
+
+        def visit(name, path):
+            if state.get(name) == "done" or name not in self.stages or name in provided:
+                return
+            if state.get(name) == "visiting":
+                raise StageGraphError(f"Dependency cycle: {' -> '.join(path + [name])}")
+            state[name] = "visiting"
+            for dependency in self.stages[name].inputs:
+                visit(dependency, path + [name])
+            state[name] = "done"
+
+        for name in self.stages:
+            visit(name, [])
+
+    async def _run_stage(self, stage: Stage, run_started: float) -> Any:
+        kwargs = {name: self.results[name] for name in stage.inputs}
+        stage.started_at = time.perf_counter() - run_started
+        try:
+            if stage.in_thread:
+                return await asyncio.to_thread(stage.func, **kwargs)
+            result = stage.func(**kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        finally:
+            stage.finished_at = time.perf_counter() - run_started
+
+    async def run(self, provided: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Run every stage once its inputs exist; returns all outputs by name.
+
+        The first stage to fail cancels the ones still running and its
+        exception is re-raised.
+        """
+        self.validate(provided or {})
+        self.results = dict(provided or {})
+        self.restored = [name for name in self.stages if name in self.results]
+        run_started = time.perf_counter()
+
+        waiting = {name: stage for name, stage in self.stages.items() if name not in self.results}
+        running: Dict[asyncio.Task, Stage] = {}
+
+        try:
+            while waiting or running:
+                for name, stage in list(waiting.items()):
+                    if all(dependency in self.results for dependency in stage.inputs):
+                        running[asyncio.ensure_future(self._run_stage(stage, run_started))] = stage
+                        del waiting[name]
+
+                if not running:
+                    raise StageGraphError(f"Stages can never start: {', '.join(waiting)}")
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    stage = running.pop(task)
+                    self.results[stage.name] = task.result()
+                    print(f"⏱️ {stage.name} finished in {stage.duration:.2f}s")
+                    if self.on_stage_complete:
+                        self.on_stage_complete(stage.name, self.results[stage.name])
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            self.total_seconds = time.perf_counter() - run_started
+
+        return self.results
+
+    def critical_path(self) -> List[Stage]:
+        """The chain that bounded the run: from the last stage to finish, back
+        through whichever of its inputs finished last."""
+        finished = [stage for stage in self.stages.values() if stage.finished_at is not None]
+        if not finished:
+            return []
+
+        path = [max(finished, key=lambda stage: stage.finished_at)]
+        while True:
+            dependencies = [
+                self.stages[name] for name in path[-1].inputs
+                if name in self.stages and self.stages[name].finished_at is not None
+            ]
+            if not dependencies:
+                break
+            path.append(max(dependencies, key=lambda stage: stage.finished_at))
+        return list(reversed(path))
+
+    def print_report(self) -> None:
+        critical = {stage.name for stage in self.critical_path()}
+        chain_seconds = sum(stage.duration for stage in self.stages.values() if stage.name in critical)
+
+        print("\n⏱️ STAGE TIMINGS:")
+        print("=" * 60)
+        print(f"{'stage':<14} {'start':>8} {'end':>8} {'duration':>9}")
+        for stage in sorted(self.stages.values(), key=lambda stage: stage.started_at or 0):
+            if stage.started_at is None:
+                status = "restored" if stage.name in self.restored else "not run"
+                print(f"{stage.name:<14} {'-':>8} {'-':>8} {status:>9}")
+                continue
+            marker = "  ◀ critical" if stage.name in critical else ""
+            print(f"{stage.name:<14} {stage.started_at:7.2f}s {stage.finished_at:7.2f}s {stage.duration:8.2f}s{marker}")
+        print("-" * 60)
+        print(f"critical path: {' -> '.join(stage.name for stage in self.critical_path())} "
+              f"({chain_seconds:.2f}s of {self.total_seconds:.2f}s wall time)")
+        print("=" * 60)